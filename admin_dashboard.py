@@ -1,5 +1,5 @@
 # admin_dashboard.py
-from flask import Blueprint, render_template, jsonify, request, redirect, url_for, flash
+from flask import Blueprint, render_template, jsonify, request, redirect, url_for, flash, Response
 import os
 import datetime
 from functools import wraps
@@ -16,6 +16,10 @@ from utils.analytics import (
     get_user_activity_over_time,
     get_popular_chat_topics
 )
+from utils.llm import get_cache_stats, get_coalescing_stats
+from utils.hedging import get_hedging_stats
+from utils.response_cache import get_response_cache_stats
+from utils import metrics
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -143,6 +147,54 @@ def api_chat_topics():
         logger.error(f"Error in chat topics API: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@admin.route('/api/llm-cache')
+@admin_required
+def api_llm_cache():
+    try:
+        return jsonify(get_cache_stats())
+    except Exception as e:
+        logger.error(f"Error in LLM cache stats API: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@admin.route('/api/llm-coalescing')
+@admin_required
+def api_llm_coalescing():
+    try:
+        return jsonify(get_coalescing_stats())
+    except Exception as e:
+        logger.error(f"Error in LLM coalescing stats API: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@admin.route('/api/llm-hedging')
+@admin_required
+def api_llm_hedging():
+    try:
+        return jsonify(get_hedging_stats())
+    except Exception as e:
+        logger.error(f"Error in LLM hedging stats API: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+@admin.route('/api/response-cache')
+@admin_required
+def api_response_cache():
+    try:
+        return jsonify(get_response_cache_stats())
+    except Exception as e:
+        logger.error(f"Error in response cache stats API: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+# Prometheus scrape target; scrapers cannot follow the login redirect, so the
+# admin password is also accepted as a bearer token and failures get a 401
+@admin.route('/metrics')
+def prometheus_metrics():
+    admin_password = os.environ.get('ADMIN_PASSWORD')
+    if not admin_password:
+        return "Admin password not configured", 500
+    if (request.cookies.get('admin_auth') != admin_password
+            and request.headers.get('Authorization') != f"Bearer {admin_password}"):
+        return "Unauthorized", 401, {'WWW-Authenticate': 'Bearer'}
+    return Response(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # Database connection test route
 @admin.route('/api/db-status')
 @admin_required
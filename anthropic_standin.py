@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Anthropic Messages API.
+
+Serves POST /v1/messages, streaming and not, so app.py and api/*.py can be
+benchmarked offline and deterministically. Point the app at it with
+ANTHROPIC_BASE_URL (the SDK reads it; any sk- key works):
+
+    python anthropic_standin.py --profile typical                # synthetic replies
+    python anthropic_standin.py --record recordings.jsonl        # proxy to the real API and save
+    python anthropic_standin.py --replay recordings.jsonl        # serve the saved responses
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8787 python app.py
+
+Recordings are keyed by a hash of the request body (without `stream`), so a
+request recorded once can be replayed streamed or not. Replayed and synthetic
+replies are paced by a latency profile: time to first token, then one token
+per 1/tokens_per_second. Recording passes the upstream timing through as is.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from collections import Counter, deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_PORT = 8787
+DEFAULT_UPSTREAM = 'https://api.anthropic.com'
+DEFAULT_REPLY = "Brooks builds small tools for the people around him."
+# Request bodies kept for inspection by checks
+RECEIVED_KEPT = 100
+
+# Seconds to first token and tokens per second (0 sends everything at once)
+PROFILES = {
+    'instant': {'first_token_latency': 0.0, 'tokens_per_second': 0.0},
+    'fast': {'first_token_latency': 0.3, 'tokens_per_second': 150.0},
+    'typical': {'first_token_latency': 0.8, 'tokens_per_second': 60.0},
+    'slow': {'first_token_latency': 2.5, 'tokens_per_second': 20.0},
+}
+
+# Headers passed through to the real API when recording
+FORWARDED_HEADERS = ('x-api-key', 'authorization', 'anthropic-version', 'anthropic-beta')
+
+
+def request_key(body):
+    """Hash identifying a Messages request, streamed or not"""
+    canonical = {k: v for k, v in body.items() if k != 'stream'}
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+def split_tokens(text):
+    """Word-sized pieces that join back to exactly the original text"""
+    return re.findall(r'\s*\S+|\s+', text) or ['']
+
+
+class Recordings:
+    """Recorded responses by request key, appended to a JSON Lines file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._responses = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._responses[entry['key']] = entry['response']
+
+    def __len__(self):
+        return len(self._responses)
+
+    def get(self, key):
+        with self._lock:
+            return self._responses.get(key)
+
+    def add(self, key, body, response, elapsed):
+        entry = {
+            'key': key,
+            'model': body.get('model'),
+            'recorded_at': datetime.now(timezone.utc).isoformat(),
+            'upstream_s': round(elapsed, 3),
+            'response': response,
+        }
+        with self._lock:
+            self._responses[key] = response
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+
+
+class StandinServer(ThreadingHTTPServer):
+    """
+    The stand-in's HTTP server
+
+    Args:
+        mode: 'synthetic', 'replay' or 'record'
+        recordings: Recordings to replay from or record into
+        first_token_latency: Seconds before the first token
+        tokens_per_second: Token rate after that (0: all at once)
+        jitter: Each delay varies by up to this fraction either way
+        reply: Text of synthetic replies
+        strict: In replay mode, answer unrecorded requests with an error
+            instead of a synthetic reply
+        upstream: Base URL of the real API, for record mode
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, mode='synthetic', recordings=None, first_token_latency=0.0,
+                 tokens_per_second=0.0, jitter=0.0, reply=DEFAULT_REPLY, strict=False, upstream=DEFAULT_UPSTREAM):
+        super().__init__(address, StandinHandler)
+        self.mode = mode
+        self.recordings = recordings
+        self.first_token_latency = first_token_latency
+        self.tokens_per_second = tokens_per_second
+        self.jitter = jitter
+        self.reply = reply
+        self.strict = strict
+        self.upstream = upstream.rstrip('/')
+        self.stats = Counter()
+        # Most recent request bodies, newest last
+        self.received = deque(maxlen=RECEIVED_KEPT)
+        self._stats_lock = threading.Lock()
+        self._sequence = 0
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, event):
+        with self._stats_lock:
+            self.stats[event] += 1
+            if event == 'synthetic':
+                self._sequence += 1
+            return self._sequence
+
+    def delay(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    def synthetic_message(self, body):
+        """A reply to any request, cut short at max_tokens like the real API"""
+        sequence = self.count('synthetic')
+        tokens = split_tokens(self.reply)
+        max_tokens = body.get('max_tokens') or len(tokens)
+        text = ''.join(tokens[:max_tokens])
+        return {
+            'id': f"msg_standin_{sequence:06d}", 'type': 'message', 'role': 'assistant',
+            'model': body.get('model', 'claude-standin'), 'stop_sequence': None,
+            'stop_reason': 'end_turn' if len(tokens) <= max_tokens else 'max_tokens',
+            'content': [{'type': 'text', 'text': text}],
+            'usage': {'input_tokens': len(json.dumps(body.get('messages', []))) // 4,
+                      'output_tokens': min(len(tokens), max_tokens)},
+        }
+
+    def call_upstream(self, body, headers):
+        """Send the request, unstreamed, to the real API; returns (status, response JSON)"""
+        forwarded = {name: headers[name] for name in FORWARDED_HEADERS if headers.get(name)}
+        forwarded.setdefault('x-api-key', os.environ.get('ANTHROPIC_API_KEY', ''))
+        forwarded.setdefault('anthropic-version', '2023-06-01')
+        forwarded['content-type'] = 'application/json'
+        payload = json.dumps(dict(body, stream=False)).encode()
+        request = urllib.request.Request(f"{self.upstream}/v1/messages", data=payload, headers=forwarded,
+                                         method='POST')
+        try:
+            with urllib.request.urlopen(request, timeout=600) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read() or b'{}')
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    server: StandinServer
+
+    def do_POST(self):
+        if self.path.split('?')[0].rstrip('/') != '/v1/messages':
+            return self.send_error_json(404, 'not_found_error', f"{self.path} is not served by the stand-in")
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        except ValueError:
+            return self.send_error_json(400, 'invalid_request_error', "Request body is not valid JSON")
+
+        server = self.server
+        server.received.append(body)
+        key = request_key(body)
+        paced = True
+        if server.mode == 'record':
+            started = time.monotonic()
+            status, message = server.call_upstream(body, self.headers)
+            if status != 200:
+                server.count('upstream_errors')
+                return self.send_json(status, message)
+            server.recordings.add(key, body, message, time.monotonic() - started)
+            server.count('recorded')
+            # The upstream call already took its real time
+            paced = False
+        elif server.mode == 'replay' and server.recordings.get(key) is not None:
+            message = server.recordings.get(key)
+            server.count('replayed')
+        elif server.mode == 'replay' and server.strict:
+            server.count('missed')
+            return self.send_error_json(404, 'not_found_error', f"No recording for request {key[:12]}")
+        else:
+            if server.mode == 'replay':
+                server.count('missed')
+            message = server.synthetic_message(body)
+
+        if body.get('stream'):
+            self.send_stream(message, paced)
+        else:
+            if paced:
+                server.delay(server.first_token_latency)
+                server.delay(self.token_interval() * message['usage']['output_tokens'])
+            self.send_json(200, message)
+
+    def token_interval(self):
+        return 1.0 / self.server.tokens_per_second if self.server.tokens_per_second else 0.0
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('request-id', 'req_standin')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_error_json(self, status, error_type, message):
+        self.send_json(status, {'type': 'error', 'error': {'type': error_type, 'message': message}})
+
+    def send_event(self, event, data):
+        self.wfile.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode())
+        self.wfile.flush()
+
+    def send_stream(self, message, paced):
+        """Server-sent events as the Messages API streams them"""
+        server = self.server
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+
+        usage = message.get('usage', {})
+        start = dict(message, content=[], stop_reason=None, stop_sequence=None,
+                     usage=dict(usage, output_tokens=1))
+        if paced:
+            server.delay(server.first_token_latency)
+        self.send_event('message_start', {'type': 'message_start', 'message': start})
+        for index, block in enumerate(message.get('content', [])):
+            if block.get('type') != 'text':
+                # Tool use and other blocks are sent whole
+                self.send_event('content_block_start', {'type': 'content_block_start', 'index': index,
+                                                        'content_block': block})
+                self.send_event('content_block_stop', {'type': 'content_block_stop', 'index': index})
+                continue
+            self.send_event('content_block_start', {'type': 'content_block_start', 'index': index,
+                                                    'content_block': {'type': 'text', 'text': ''}})
+            for i, token in enumerate(split_tokens(block.get('text', ''))):
+                if paced and i:
+                    server.delay(self.token_interval())
+                self.send_event('content_block_delta', {'type': 'content_block_delta', 'index': index,
+                                                        'delta': {'type': 'text_delta', 'text': token}})
+            self.send_event('content_block_stop', {'type': 'content_block_stop', 'index': index})
+        self.send_event('message_delta', {
+            'type': 'message_delta',
+            'delta': {'stop_reason': message.get('stop_reason'), 'stop_sequence': message.get('stop_sequence')},
+            'usage': {'output_tokens': usage.get('output_tokens', 0)},
+        })
+        self.send_event('message_stop', {'type': 'message_stop'})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_standin(mode='synthetic', recordings_path=None, port=0, profile='instant', **options):
+    """
+    Run the stand-in on a background thread
+
+    Args:
+        mode: 'synthetic', 'replay' or 'record'
+        recordings_path: JSON Lines file for replay/record
+        port: Port to listen on (0 picks a free one)
+        profile: Name of a PROFILES entry; options override its values
+        **options: Other StandinServer arguments
+
+    Returns:
+        StandinServer: Call shutdown() when done; its url goes in ANTHROPIC_BASE_URL
+    """
+    settings = dict(PROFILES[profile], **options)
+    recordings = Recordings(recordings_path) if mode != 'synthetic' else None
+    server = StandinServer(('127.0.0.1', port), mode=mode, recordings=recordings, **settings)
+    threading.Thread(target=server.serve_forever, name='anthropic-standin', daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Anthropic Messages API")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--replay', metavar='FILE', help="serve responses recorded in FILE")
+    source.add_argument('--record', metavar='FILE', help="proxy to the real API and append responses to FILE")
+    parser.add_argument('--strict', action='store_true', help="with --replay, fail requests that were not recorded")
+    parser.add_argument('--upstream', default=DEFAULT_UPSTREAM, help="real API base URL for --record")
+    parser.add_argument('--profile', choices=sorted(PROFILES), default='instant', help="latency profile")
+    parser.add_argument('--first-token-latency', type=float, help="seconds to first token (overrides profile)")
+    parser.add_argument('--tokens-per-second', type=float, help="token rate (overrides profile)")
+    parser.add_argument('--jitter', type=float, default=0.0, help="vary each delay by up to this fraction")
+    parser.add_argument('--reply', default=DEFAULT_REPLY, help="text of synthetic replies")
+    args = parser.parse_args()
+
+    mode = 'replay' if args.replay else 'record' if args.record else 'synthetic'
+    options = {k: v for k, v in (('first_token_latency', args.first_token_latency),
+                                 ('tokens_per_second', args.tokens_per_second)) if v is not None}
+    server = start_standin(mode, args.replay or args.record, port=args.port, profile=args.profile,
+                           jitter=args.jitter, reply=args.reply, strict=args.strict, upstream=args.upstream,
+                           **options)
+    loaded = f", {len(server.recordings)} recordings" if server.recordings is not None else ''
+    print(f"Anthropic stand-in ({mode}{loaded}) on {server.url}")
+    print(f"  export ANTHROPIC_BASE_URL={server.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        print(f"\n{dict(server.stats) or 'No requests served'}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,6 +12,7 @@ from datetime import datetime
 import time
 import traceback
 import html
+import types
 
 # Common carrier email-to-SMS gateways
 CARRIER_GATEWAYS = {
@@ -27,9 +28,10 @@ CARRIER_GATEWAYS = {
 # Import your system prompt
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from prompts.system_prompt import get_system_prompt
-from utils.personal_profile import PERSONAL_PROFILE
-from utils.investment_philosophy import INVESTMENT_PHILOSOPHY
+from prompts.system_prompt import get_base_prompt, get_profile
+from utils.llm import cached_system_prompt, create_message
+from utils.admission import admit, AdmissionRejected
+from utils.db import get_user_identifier
 
 # SMS notification functions
 def send_sms_via_email(message, phone_number=None, carrier=None):
@@ -162,8 +164,10 @@ def cleanup_inactive_sessions():
 # Improved email formatting with better styling
 # Replace your current send_conversation_email function with this one:
 
-def send_conversation_email(conversation_id, messages, email_to=PERSONAL_PROFILE.get("email"), subject=None):
+def send_conversation_email(conversation_id, messages, email_to=None, subject=None):
     try:
+        # Read at send time so an edited profile is picked up, as it is for the prompt
+        email_to = email_to or get_profile().get("email")
         email_from = os.environ.get('EMAIL_SENDER')
         email_password = os.environ.get('EMAIL_PASSWORD')
         
@@ -289,7 +293,27 @@ class Handler(BaseHTTPRequestHandler):
         # Parse request
         content_length = int(self.headers['Content-Length'])
         post_data = self.rfile.read(content_length)
-        
+
+        # Shed the request up front if this visitor is over their rate or we are at capacity
+        visitor = types.SimpleNamespace(remote_addr=self.client_address[0] if self.client_address else None,
+                                        headers=self.headers)
+        try:
+            slot = admit('api_chat', get_user_identifier(visitor))
+        except AdmissionRejected as e:
+            self.send_response(e.status)
+            self.send_header('Content-type', 'application/json')
+            self.send_header('Access-Control-Allow-Origin', '*')
+            self.send_header('Retry-After', str(e.retry_after))
+            self.end_headers()
+            self.wfile.write(json.dumps({'error': e.reason}).encode('utf-8'))
+            return
+
+        try:
+            self._handle_chat(post_data)
+        finally:
+            slot.release()
+
+    def _handle_chat(self, post_data):
         try:
             data = json.loads(post_data)
             user_input = data.get('user_input', '')
@@ -304,16 +328,11 @@ class Handler(BaseHTTPRequestHandler):
             # Initialize Claude client
             client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
             
-            # Get system prompt
-            enriched_profile = PERSONAL_PROFILE.copy()
-            inv_phil = INVESTMENT_PHILOSOPHY.copy()
-            if "core_principles" in inv_phil:
-                inv_phil["key_principles"] = [p["name"] for p in inv_phil["core_principles"]]
-            enriched_profile["investment_philosophy"] = inv_phil
+            # Get the precompiled base system prompt
+            base_prompt = get_base_prompt()
+            user_context = ""
             
             # Enhance system prompt with user data if available
-            system_prompt = get_system_prompt(enriched_profile)
-            
             if user_data:
                 # Add user context section to system prompt
                 user_context = "\n\n# User Context\n"
@@ -351,18 +370,18 @@ class Handler(BaseHTTPRequestHandler):
                 user_context += "- For mobile users: Keep responses concise\n"
                 user_context += "- For desktop users: More detailed responses are appropriate\n"
                 
-                # Append user context to system prompt
-                system_prompt += user_context
-                
                 # Log that we're using enhanced prompt
                 logger.info(f"Using enhanced system prompt with user data")
             
             # Call Claude API
             messages = [{"role": "user", "content": user_input}]
             
-            response = client.messages.create(
+            # The base prompt carries a cache breakpoint; user context follows it
+            # Identical requests already in flight share one upstream call
+            response = create_message(
+                client, 'api_chat',
                 model="claude-3-5-sonnet-20241022",
-                system=system_prompt,
+                system=cached_system_prompt(base_prompt.text, user_context),
                 messages=messages,
                 max_tokens=4000,
                 temperature=0.7
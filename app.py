@@ -1,86 +1,47 @@
-from flask import Flask, render_template, request, jsonify, session, send_from_directory, redirect, url_for, render_template_string, make_response
+from flask import Flask, render_template, request, jsonify, session, send_from_directory, redirect, url_for, render_template_string, make_response, Response, stream_with_context, after_this_request, g
 from flask_cors import CORS
-import anthropic
-from anthropic.types import MessageParam, ContentBlock
-from typing import Literal
+from typing import Literal, TYPE_CHECKING
 import os
-from datetime import datetime, timedelta
+import json
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlparse
 from typing import List, Dict, Any, Union, Optional
-from utils.personal_profile import PERSONAL_PROFILE
-from prompts.system_prompt import get_system_prompt
-from utils.investment_philosophy import INVESTMENT_PHILOSOPHY
-from utils.s3_utils import s3_image_url
-from authlib.integrations.flask_client import OAuth
+
+# anthropic and authlib are imported by the factories that first need them, so
+# a cold start does not pay for them before the first Claude or OAuth request
+if TYPE_CHECKING:
+    from anthropic.types import MessageParam
+from prompts.system_prompt import get_base_prompt
+from utils.llm import cached_system_prompt, with_history_breakpoint, create_message, get_resilience_stats
+from utils.hedging import hedged_stream, hedged_create, fallback_request, get_hedging_stats
+from utils.conversation import (
+    window_history, history_budget, clip_to_tokens, SECTION_ALLOWANCES,
+    get_summary, schedule_compaction, summary_section
+)
+from utils.s3_utils import s3_image_url, is_s3_available
+from utils.response_cache import first_turn_cache, record_bypass, RESPONSE_CACHE_ENABLED
 import secrets
-from pymongo.mongo_client import MongoClient
-from pymongo.server_api import ServerApi
-from utils.db import MONGO_URI, get_or_create_user, store_platform_token, get_user_interests, log_chat_interaction
+from functools import wraps
+from utils.admission import admit, hand_off, AdmissionRejected, get_admission_stats
+from utils.env import load_environment, ENV_FILE_PATH
+from utils.lazy import Lazy, LazyProxy
+from utils import mongo, memory_store, metrics
+from utils.migrations import get_schema_status
+from utils.db import MONGO_URI, get_user_identifier, get_or_create_user, store_platform_token, get_user_interests, log_chat_interaction, log_feedback
 from utils.platform_data import process_platform_data
 from admin_dashboard import admin
 
-# Environment variables for configuration
-env_loaded = False
-
-# Create a new MongoDB client and connect to the server
-mongodb_client = MongoClient(MONGO_URI, server_api=ServerApi('1'))
-
-# Send a ping to confirm a successful connection
-try:
-    mongodb_client.admin.command('ping')
-    print("Pinged your deployment. You successfully connected to MongoDB!")
-except Exception as e:
-    print(f"MongoDB connection error: {e}")
-    # Set to None if connection fails
-    mongodb_client = None
-
-# Define the absolute path to the .env file
-ENV_FILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
-print(f"Looking for .env file at: {ENV_FILE_PATH}")
-
-# First try to install dotenv if it's missing
-try:
-    import importlib.metadata
-    importlib.metadata.version('python-dotenv')
-except (ImportError, importlib.metadata.PackageNotFoundError):
-    print("python-dotenv not found, attempting to install...")
-    try:
-        import subprocess
-        subprocess.check_call(["pip", "install", "python-dotenv"])
-        print("python-dotenv installed successfully")
-    except Exception as e:
-        print(f"Error installing python-dotenv: {str(e)}")
-
-# Now try to load the .env file using the absolute path
-try:
-    # More explicit import to help linters/IDE
-    import dotenv
-    from dotenv import load_dotenv
-    # Load environment variables from the absolute path to .env file
-    env_loaded = load_dotenv(dotenv_path=ENV_FILE_PATH, verbose=True)
-    if env_loaded:
-        print(f"Environment variables loaded from {ENV_FILE_PATH} using dotenv {dotenv.__file__}")
-    else:
-        print(f"No variables loaded from {ENV_FILE_PATH}")
-except ImportError:
-    print("dotenv package not available, using default environment variables")
-except Exception as e:
-    print(f"Error loading environment variables: {str(e)}")
-
-# Manual load from .env file using the absolute path if dotenv fails
-if not env_loaded:
-    try:
-        print(f"Attempting manual load from {ENV_FILE_PATH}")
-        with open(ENV_FILE_PATH, 'r') as f:
-            for line in f:
-                if '=' in line:
-                    key, value = line.strip().split('=', 1)
-                    key = key.strip()
-                    value = value.strip().strip("'").strip('"')
-                    os.environ[key] = value
-                    print(f"Manually loaded {key} environment variable")
-        print("Manually loaded environment variables from .env file")
-    except Exception as e:
-        print(f"Error manually loading .env file: {str(e)}")
+# Load .env once; utils.db has usually done this already
+env_loaded = load_environment()
+
+
+def get_mongodb_client():
+    """The process-wide MongoDB client, shared with utils.db; None if unreachable"""
+    return mongo.get_client()
 
 
 def configure_sessions(app):
@@ -91,7 +52,8 @@ def configure_sessions(app):
     
     # Configure Flask-Session for MongoDB storage
     app.config['SESSION_TYPE'] = 'mongodb'
-    app.config['SESSION_MONGODB'] = mongodb_client
+    # Resolved on first session access; sessions live in memory while Atlas is unreachable
+    app.config['SESSION_MONGODB'] = LazyProxy(lambda: get_mongodb_client() or memory_store.get_client())
     app.config['SESSION_MONGODB_DB'] = 'aboutBrooks'
     app.config['SESSION_MONGODB_COLLECT'] = 'sessions'  # String, not a collection object
     app.config['SESSION_PERMANENT'] = True
@@ -108,10 +70,38 @@ def configure_sessions(app):
         from flask_session import Session
         from flask_session.sessions import MongoDBSessionInterface
 
-        # Fix the save_session method for pymongo 4.x compatibility
-        from flask.helpers import want_bytes
+        # Fix the open/save_session methods for pymongo 4.x compatibility;
+        # Flask 2.3 no longer re-exports want_bytes from flask.helpers
+        from itsdangerous import want_bytes, BadSignature
         original_save_session = MongoDBSessionInterface.save_session
         
+        def patched_open_session(self, app, request):
+            sid = request.cookies.get(app.config["SESSION_COOKIE_NAME"])
+            if not sid:
+                return self.session_class(sid=self._generate_sid(), permanent=self.permanent)
+            if self.use_signer:
+                try:
+                    sid = self._get_signer(app).unsign(sid).decode()
+                except BadSignature:
+                    return self.session_class(sid=self._generate_sid(), permanent=self.permanent)
+
+            store_id = self.key_prefix + sid
+            document = self.store.find_one({'id': store_id})
+            # Flask 2.3 computes expirations in aware UTC; PyMongo hands back naive UTC
+            expiration = document.get('expiration') if document else None
+            if expiration is not None and expiration.tzinfo is not None:
+                expiration = expiration.astimezone(timezone.utc).replace(tzinfo=None)
+            if expiration is not None and expiration <= datetime.utcnow():
+                # Use delete_one for pymongo 4.x
+                self.store.delete_one({'id': store_id})
+                document = None
+            if document is not None:
+                try:
+                    return self.session_class(self.serializer.loads(want_bytes(document['val'])), sid=sid)
+                except Exception:
+                    pass
+            return self.session_class(sid=sid, permanent=self.permanent)
+
         def patched_save_session(self, app, session, response):
             domain = self.get_cookie_domain(app)
             path = self.get_cookie_path(app)
@@ -119,7 +109,7 @@ def configure_sessions(app):
             if not session:
                 if session.modified:
                     # Use delete_one for pymongo 4.x
-                    self.store.delete_one({'id': session.sid})
+                    self.store.delete_one({'id': self.key_prefix + session.sid})
                     response.delete_cookie(app.config['SESSION_COOKIE_NAME'],
                                           domain=domain, path=path)
                 return
@@ -133,13 +123,14 @@ def configure_sessions(app):
             expires = self.get_expiration_time(app, session)
             val = self.serializer.dumps(dict(session))
             
-            # Use update_one instead of update for pymongo 4.x
-            store_id = session.sid
-            self.store.update_one(
-                {'id': store_id},
-                {'$set': {'id': store_id, 'val': val, 'expiration': expires}},
-                upsert=True
-            )
+            # Use update_one instead of update for pymongo 4.x; the key matches open_session's
+            store_id = self.key_prefix + session.sid
+            with metrics.timer('chat_stage_seconds', stage='session_save'):
+                self.store.update_one(
+                    {'id': store_id},
+                    {'$set': {'id': store_id, 'val': val, 'expiration': expires}},
+                    upsert=True
+                )
             
             # Set the cookie
             if self.use_signer:
@@ -152,6 +143,7 @@ def configure_sessions(app):
                                **conditional_cookie_kwargs)
 
         # Apply the monkey patch
+        MongoDBSessionInterface.open_session = patched_open_session
         MongoDBSessionInterface.save_session = patched_save_session
         
         # Initialize the session with our patched method
@@ -186,9 +178,6 @@ CORS(app, resources={
     }
 })
 
-# Initialize OAuth
-oauth = OAuth(app)
-
 # Platform configurations (replace with your actual client IDs/secrets)
 PLATFORMS = {
     'x': {
@@ -261,22 +250,83 @@ PLATFORMS = {
     }
 }
 
-# Register OAuth clients
-for platform, config in PLATFORMS.items():
-    client_kwargs = {
-        'scope': ' '.join(config['scopes']),
-        'token_endpoint_auth_method': config.get('token_endpoint_auth_method', 'client_secret_basic')
-    }
-    if config.get('pkce'):
-        client_kwargs['code_challenge_method'] = 'S256'
-    oauth.register(
-        name=platform,
-        client_id=config['client_id'],
-        client_secret=config['client_secret'],
-        authorize_url=config['authorize_url'],
-        access_token_url=config['token_url'],
-        client_kwargs=client_kwargs
-    )
+def create_oauth_registry():
+    from authlib.integrations.flask_client import OAuth
+    return OAuth(app)
+
+
+class LazyOAuth:
+    """OAuth registry that loads authlib and sets up a platform's client the first time it is asked for"""
+
+    def __init__(self, platforms):
+        self._registry = Lazy(create_oauth_registry)
+        self._platforms = platforms
+        self._unregistered = set(platforms)
+        self._register_lock = threading.RLock()
+
+    def create_client(self, name):
+        registry = self._registry.get()
+        with self._register_lock:
+            if name in self._unregistered:
+                self._unregistered.discard(name)
+                config = self._platforms[name]
+                client_kwargs = {
+                    'scope': ' '.join(config['scopes']),
+                    'token_endpoint_auth_method': config.get('token_endpoint_auth_method', 'client_secret_basic')
+                }
+                if config.get('pkce'):
+                    client_kwargs['code_challenge_method'] = 'S256'
+                registry.register(
+                    name=name,
+                    client_id=config['client_id'],
+                    client_secret=config['client_secret'],
+                    authorize_url=config['authorize_url'],
+                    access_token_url=config['token_url'],
+                    client_kwargs=client_kwargs
+                )
+        return registry.create_client(name)
+
+
+# Initialize OAuth; authlib and the clients are set up on first use
+oauth = LazyOAuth(PLATFORMS)
+
+def admission_control(endpoint):
+    """Rate-limit a chat route per visitor and hold an in-flight LLM slot until its response closes
+
+    Shed requests get a 429 (visitor over their rate) or 503 (at capacity)
+    with a Retry-After header instead of queueing behind Claude.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if request.method == 'OPTIONS':
+                return view(*args, **kwargs)
+            try:
+                g.admission_slot = admit(endpoint, get_user_identifier(request))
+            except AdmissionRejected as e:
+                message = ("You're sending messages too quickly. Please wait a moment and try again."
+                           if e.status == 429 else
+                           "The assistant is busy right now. Please try again in a few seconds.")
+                response = jsonify({'response': message, 'error': e.reason})
+                response.status_code = e.status
+                response.headers['Retry-After'] = str(e.retry_after)
+                return response
+            try:
+                response = make_response(view(*args, **kwargs))
+            except Exception:
+                slot = g.pop('admission_slot', None)
+                if slot is not None:
+                    slot.release()
+                raise
+            # Gone if the view handed its stream (and slot) over to asgi.py
+            slot = g.pop('admission_slot', None)
+            if slot is not None:
+                # Streamed replies keep the slot until the stream finishes or the client leaves
+                response.call_on_close(slot.release)
+            return response
+        return wrapped
+    return decorator
+
 
 # Add debug routes to check if backend is responding
 @app.route('/api/debug', methods=['GET'])
@@ -294,6 +344,7 @@ def debug_route():
     })
         
 @app.route('/api/simple-chat', methods=['POST', 'OPTIONS'])
+@admission_control('api_simple_chat')
 def simple_chat():
     """Simple chat endpoint for fallback functionality"""
     if request.method == 'OPTIONS':
@@ -315,6 +366,7 @@ def simple_chat():
             return jsonify({"error": "API key not configured"}), 500
 
         # Initialize Claude client
+        import anthropic
         client = anthropic.Anthropic(api_key=api_key)
         
         # Use a simpler system prompt
@@ -333,7 +385,8 @@ def simple_chat():
         # Call Claude API
         messages = [{"role": "user", "content": user_input}]
         
-        response = client.messages.create(
+        response = create_message(
+            client, 'api_simple_chat',
             model="claude-3-5-sonnet-20241022",
             system=simple_system,
             messages=messages,
@@ -376,25 +429,12 @@ def feedback():
         message = data.get('message', '')
         feedback = data.get('feedback', '')
         
-        # Log feedback to MongoDB
+        # Log feedback to MongoDB (written in the background)
         user_id, _ = get_or_create_user(request)
-        
-        # Get the database reference
-        db = mongodb_client.aboutBrooks if mongodb_client else None
-        
-        if db:
-            # Store feedback in chat_interactions collection
-            db.chat_interactions.insert_one({
-                'user_id': user_id,
-                'timestamp': datetime.now(),
-                'message': message,
-                'feedback': feedback,
-                'type': 'feedback'
-            })
-            
+        if log_feedback(user_id, message, feedback):
             logger.info(f"Feedback recorded: {feedback} for message from user {user_id[:8]}")
         else:
-            logger.warning("Cannot store feedback: MongoDB not available")
+            logger.warning("Cannot store feedback: write queue full")
         
         return jsonify({'status': 'success'})
     except Exception as e:
@@ -439,29 +479,10 @@ def s3_images():
             }
         }), 500
 
-# Get API key from environment variable
+# Get API key from environment variable (.env has already been loaded)
 ANTHROPIC_API_KEY = os.environ.get('ANTHROPIC_API_KEY')
 print(f"Checking for API key in environment variables: {'Found' if ANTHROPIC_API_KEY else 'Not found'}")
 
-# Fallback to check directly from .env file if environment variable is not set
-if not ANTHROPIC_API_KEY:
-    try:
-        print(f"Attempting to directly read API key from {ENV_FILE_PATH}")
-        with open(ENV_FILE_PATH, 'r') as f:
-            content = f.read()
-            import re
-            match = re.search(
-                r'ANTHROPIC_API_KEY\s*=\s*[\'"]?(sk-[^\'"]+)', content)
-            if match:
-                ANTHROPIC_API_KEY = match.group(1)
-                print("Retrieved API key directly from .env file")
-                # Also set it in environment for other imports
-                os.environ['ANTHROPIC_API_KEY'] = ANTHROPIC_API_KEY
-            else:
-                print("API key pattern not found in .env file content")
-    except Exception as e:
-        print(f"Failed to retrieve API key from .env file: {str(e)}")
-
 # Last check - validate and report on the API key
 if not ANTHROPIC_API_KEY or not ANTHROPIC_API_KEY.startswith('sk-'):
     print("WARNING: Valid ANTHROPIC_API_KEY not found. API calls will fail.")
@@ -474,42 +495,30 @@ else:
     else:
         print("Valid API key found but too short to safely display")
 
-# Initialize Anthropic client as None first
-anthropic_client = None
 
-try:
-    # Print key info for debugging
-    if ANTHROPIC_API_KEY != "MISSING_API_KEY" and len(ANTHROPIC_API_KEY) > 8:
-        print(f"Initializing Anthropic client with API key: {ANTHROPIC_API_KEY[:8]}...")
-    
-    # Force re-read of environment variable in case it was updated
-    env_api_key = os.environ.get('ANTHROPIC_API_KEY', '')
-    if env_api_key:
-        key_preview = env_api_key[:8] if len(env_api_key) > 8 else env_api_key
-        print(f"Using API key from environment: {key_preview}...")
-        anthropic_client = anthropic.Anthropic(api_key=os.environ.get('ANTHROPIC_API_KEY'))
-    else:
-        anthropic_client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-    
-    # Test if client was successfully initialized
-    if hasattr(anthropic_client, 'api_key'):
+def create_anthropic_client():
+    """Build the shared Anthropic client; None if it cannot be created"""
+    try:
+        import anthropic
+        client = anthropic.Anthropic(api_key=os.environ.get('ANTHROPIC_API_KEY') or ANTHROPIC_API_KEY)
         print("Successfully initialized Anthropic client")
-    else:
-        print("Warning: Client initialized but may not have proper configuration")
-        
-except Exception as e:
-    print(f"Error initializing Anthropic client: {str(e)}")
-    import traceback
-    traceback.print_exc()
-    anthropic_client = None
+        if os.environ.get('ANTHROPIC_BASE_URL'):
+            # e.g. anthropic_standin.py for offline benchmarks; the SDK reads the variable itself
+            print(f"Anthropic requests go to {client.base_url} (ANTHROPIC_BASE_URL)")
+        return client
+    except Exception as e:
+        print(f"Error initializing Anthropic client: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return None
 
 
-def truncate_history(history, max_messages=20):
-    """Truncate conversation history to avoid token limits"""
-    if len(history) > max_messages:
-        # Keep the most recent messages
-        return history[-max_messages:]
-    return history
+# Created by the first request that calls Claude
+_anthropic_client = Lazy(create_anthropic_client)
+
+
+def get_anthropic_client():
+    return _anthropic_client.get()
 
 
 def enhance_prompt_with_user_data(user_id, system_prompt):
@@ -545,6 +554,12 @@ def enhance_prompt_with_user_data(user_id, system_prompt):
         return system_prompt  # Return the original prompt on error
 
 
+# Per-call HTTP timeout for platform API calls
+PLATFORM_API_TIMEOUT = 10
+# Monotonic time by which the current platform lookup must finish (set per pooled lookup)
+platform_call_deadline = contextvars.ContextVar('platform_call_deadline', default=None)
+
+
 def safe_api_call(client, url, token, headers=None, params=None):
     """Make an API call with robust error handling and logging
     
@@ -562,13 +577,22 @@ def safe_api_call(client, url, token, headers=None, params=None):
         # Combine headers if provided
         call_headers = headers or {}
         
-        # Add timeout for all API calls
-        start_time = datetime.now()
-        response = client.get(url, token=token, headers=call_headers, params=params, timeout=10)
-        elapsed = (datetime.now() - start_time).total_seconds()
+        # Add timeout for all API calls, cut short by the lookup's deadline so
+        # a slow platform frees its pool worker when the turn stops waiting
+        timeout = PLATFORM_API_TIMEOUT
+        deadline = platform_call_deadline.get()
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+            if timeout <= 0:
+                print(f"Skipping API call to {url.split('?')[0]}: lookup deadline passed")
+                return False, None, 408, "Lookup deadline passed"
+        start_time = time.perf_counter()
+        response = client.get(url, token=token, headers=call_headers, params=params, timeout=timeout)
+        elapsed = time.perf_counter() - start_time
         
         # Log API call details
         status = response.status_code
+        metrics.observe('platform_api_seconds', elapsed, host=urlparse(url).netloc, status=status)
         log_prefix = f"API call to {url.split('?')[0]}"
         
         if status == 200:
@@ -604,14 +628,18 @@ def safe_api_call(client, url, token, headers=None, params=None):
         print(f"Error calling {url}: {error_type} - {error_msg}")
         
         # Classify error for better logging
+        host = urlparse(url).netloc
         if "timeout" in error_msg.lower() or error_type == "Timeout":
             print(f"API call to {url} timed out")
+            metrics.increment('platform_api_errors_total', host=host, reason='timeout')
             return False, None, 408, "Request timed out"
         elif "connection" in error_msg.lower():
             print(f"Connection error to {url}")
+            metrics.increment('platform_api_errors_total', host=host, reason='connection')
             return False, None, 503, "Connection error"
         else:
             print(f"Unknown error calling {url}: {error_type} - {error_msg}")
+            metrics.increment('platform_api_errors_total', host=host, reason='exception')
             return False, None, 500, f"{error_type}: {error_msg}"
 
 
@@ -848,41 +876,90 @@ def fetch_platform_data(platform, client, token):
         return f"  - Connected to {platform.capitalize()} (error: {error_type})\n"
 
 
-def get_all_connected_platforms_data(session_data, oauth_instance):
+# Bounded pool shared by every request for third-party platform lookups
+PLATFORM_FETCH_WORKERS = int(os.environ.get('PLATFORM_FETCH_WORKERS', 8))
+# Overall time budget for all of a visitor's platform lookups in one chat turn
+PLATFORM_FETCH_DEADLINE = float(os.environ.get('PLATFORM_FETCH_DEADLINE', 3.0))
+platform_fetch_pool = ThreadPoolExecutor(max_workers=PLATFORM_FETCH_WORKERS,
+                                         thread_name_prefix='platform-fetch')
+
+
+def fetch_platform_data_by(deadline, platform, client, token):
+    """Run fetch_platform_data on a pool worker with every API call bounded by deadline"""
+    reset = platform_call_deadline.set(deadline)
+    try:
+        return fetch_platform_data(platform, client, token)
+    finally:
+        platform_call_deadline.reset(reset)
+
+
+def get_all_connected_platforms_data(session_data, oauth_instance, deadline=PLATFORM_FETCH_DEADLINE):
     """Fetch data from all connected social platforms for a user
     
+    Lookups run concurrently on the shared platform fetch pool. Platforms that
+    have not answered when the deadline passes are dropped from the result, and
+    their API calls time out at the deadline rather than holding a worker.
+    
     Args:
         session_data: The Flask session containing OAuth tokens
         oauth_instance: The OAuth instance for creating clients
+        deadline: Seconds to wait for all platforms combined
         
     Returns:
         String with formatted data from all connected platforms
     """
-    # Initialize result
-    social_data = "\n\n# User Social Data\n"
-    
     # Check if user has any connected platforms
     if 'connected_platforms' not in session_data or not session_data['connected_platforms']:
         return ""
     
-    # Fetch data for each connected platform
+    # Start a lookup for each connected platform; clients are created here
+    # because the OAuth registry lives on the request thread's app
+    lookups = []
+    lookup_deadline = time.monotonic() + deadline
     for platform in session_data['connected_platforms']:
-        if f'{platform}_token' in session_data:
-            social_data += f"- Connected to {platform.capitalize()}\n"
-            
-            # Fetch platform-specific data
+        if f'{platform}_token' not in session_data:
+            continue
+        try:
+            client = oauth_instance.create_client(platform)
+            if client is None:
+                lookups.append((platform, f"  - Error: OAuth client not found for {platform}\n"))
+                continue
+            token = session_data[f'{platform}_token']
+            lookups.append((platform, platform_fetch_pool.submit(fetch_platform_data_by, lookup_deadline,
+                                                                       platform, client, token)))
+        except Exception as e:
+            print(f"Error setting up client for {platform}: {str(e)}")
+            lookups.append((platform, f"  - Error connecting to {platform}\n"))
+    
+    if not lookups:
+        return ""
+    
+    # Wait for all platforms together, never longer than the deadline
+    pending = [result for _, result in lookups if isinstance(result, Future)]
+    wait(pending, timeout=deadline)
+    
+    # Assemble results in the order the platforms were connected
+    social_data = "\n\n# User Social Data\n"
+    for platform, result in lookups:
+        if isinstance(result, Future):
+            if not result.done():
+                # Only stops a lookup still queued for a worker; one already
+                # running ends on its own once its HTTP timeout hits the deadline
+                result.cancel()
+                print(f"Dropping {platform} data: lookup missed the {deadline:.1f}s deadline")
+                metrics.increment('platform_fetch_dropped_total', platform=platform, reason='deadline')
+                continue
             try:
-                client = oauth_instance.create_client(platform)
-                if client is None:
-                    social_data += f"  - Error: OAuth client not found for {platform}\n"
-                    continue
-                token = session_data[f'{platform}_token']
-                platform_data = fetch_platform_data(platform, client, token)
-                if platform_data:
-                    social_data += platform_data
+                platform_data = result.result()
             except Exception as e:
-                print(f"Error setting up client for {platform}: {str(e)}")
-                social_data += f"  - Error connecting to {platform}\n"
+                print(f"Error fetching social data for {platform}: {str(e)}")
+                metrics.increment('platform_fetch_dropped_total', platform=platform, reason='error')
+                continue
+        else:
+            platform_data = result
+        social_data += f"- Connected to {platform.capitalize()}\n"
+        if platform_data:
+            social_data += platform_data
     
     return social_data if social_data != "\n\n# User Social Data\n" else ""
 
@@ -1287,7 +1364,186 @@ def set_consent():
     session.modified = True
     return {'status': 'success'}
 
+def merge_streamed_turn(history):
+    """Drop a streamed question whose reply never reached the stored session
+
+    A streamed turn saves the visitor's question with the session and marks it
+    pending; StreamedTurn.finish appends the reply to the stored session record
+    and clears the mark. A mark that is still set means the reply was lost (or
+    sessions are not stored server-side), so the unanswered question goes too.
+    """
+    if not session.pop('pending_stream_turn', None):
+        return history
+    if history and history[-1]['role'] == 'user':
+        return history[:-1]
+    return history
+
+
+def store_streamed_reply(sid, turn_id, reply):
+    """Append a finished streamed reply to the visitor's stored session
+
+    Returns:
+        bool: Whether the session record was updated
+    """
+    interface = app.session_interface
+    store = getattr(interface, 'store', None)
+    if store is None or sid is None:
+        return False
+    try:
+        from itsdangerous import want_bytes
+        store_id = interface.key_prefix + sid
+        document = store.find_one({'id': store_id})
+        if document is None:
+            return False
+        data = interface.serializer.loads(want_bytes(document['val']))
+        # The visitor has already moved on from this turn
+        if data.get('pending_stream_turn') != turn_id:
+            return False
+        data.pop('pending_stream_turn')
+        data['history'] = data.get('history', []) + [{'role': 'assistant', 'content': reply}]
+        # Only if no other request rewrote the session in the meantime
+        result = store.update_one({'id': store_id, 'val': document['val']},
+                                  {'$set': {'val': interface.serializer.dumps(data)}})
+        return result.modified_count == 1
+    except Exception as e:
+        print(f"Error saving streamed reply to session: {str(e)}")
+        return False
+
+
+def format_sse(event, payload):
+    """Format a payload as a single server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+
+# Set by asgi.py for the requests it serves: streamed replies are handed to the
+# event loop instead of being generated on the worker thread
+async_handoff = contextvars.ContextVar('async_handoff', default=None)
+
+
+class StreamedTurn:
+    """One streamed /chat reply: the Claude requests and what happens once it ends"""
+
+    def __init__(self, user_id, user_input, turn_id, primary, fallback=None, on_complete=None, sid=None):
+        self.user_id = user_id
+        self.user_input = user_input
+        self.turn_id = turn_id
+        # Server-side session the reply is appended to
+        self.sid = sid
+        self.primary = primary
+        self.fallback = fallback
+        self.on_complete = on_complete
+        # In-flight slot, when the event loop took it over from admission_control
+        self.admission = None
+        self.started = time.perf_counter()
+
+    def finish(self, chunks, completed, failed):
+        """Save the reply to the visitor's stored session and log it
+
+        Runs on completion, on error and when the client disconnects mid-stream.
+
+        Returns:
+            list: Closing server-sent events, if the client is still there to get them
+        """
+        # Until the last token, or the disconnect, whichever came first
+        metrics.observe('chat_stage_seconds', time.perf_counter() - self.started, stage='llm_stream')
+        error_response = None
+        if failed:
+            metrics.increment('chat_errors_total', endpoint='chat', stage='llm_stream')
+        if failed and not chunks:
+            metrics.increment('chat_fallbacks_total', endpoint='chat', reason='llm_error')
+            error_response = "I'm sorry, there was an error processing your request. Please try again later."
+        assistant_response = error_response or ''.join(chunks)
+        store_streamed_reply(self.sid, self.turn_id, assistant_response)
+        log_chat_interaction(self.user_id, self.user_input, assistant_response)
+        if completed and self.on_complete and chunks:
+            self.on_complete(assistant_response)
+        if self.admission is not None:
+            self.admission.release()
+
+        events = []
+        if error_response:
+            events.append(format_sse('error', {'response': error_response}))
+        events.append(format_sse('done', {'response': assistant_response}))
+        return events
+
+
+def stream_chat_response(user_id, user_input, system_prompt, messages, on_complete=None, fallback=None):
+    """Stream a /chat reply to the browser as server-sent events
+
+    Emits a `delta` event for every text chunk from Claude, then a `done` event
+    carrying the full response. The MongoDB log is written once the stream has
+    finished, and the reply is appended to the stored session history then; the
+    caller saves the question with the session before the stream starts.
+    If the primary model is slow to start, the reply may come from the fallback.
+    Under asgi.py the body is streamed by the event loop with AsyncAnthropic.
+
+    Args:
+        user_id: Hashed user identifier for MongoDB logging
+        user_input: The visitor's message for this turn
+        system_prompt: System prompt content blocks for this turn
+        messages: Message list for the Anthropic API, ending with the new user message
+        on_complete: Optional callback given the full response once it streamed without error
+        fallback: Optional trimmed request for the hedge model
+
+    Returns:
+        Response: A streaming text/event-stream response
+    """
+    # The session is saved with the response headers, before the reply is known,
+    # so the question is marked pending until the reply is appended to the record
+    turn_id = secrets.token_urlsafe(12)
+    session['pending_stream_turn'] = turn_id
+    turn = StreamedTurn(user_id, user_input, turn_id, dict(
+        model="claude-3-5-sonnet-20241022",
+        system=system_prompt,
+        messages=messages,
+        max_tokens=4000,
+        temperature=0.7
+    ), fallback, on_complete, sid=getattr(session, 'sid', None))
+
+    handoff = async_handoff.get()
+    stream_slot = hand_off(g.get('admission_slot')) if handoff is not None else None
+    if stream_slot is not None:
+        # This response only carries the headers and session cookie; the event
+        # loop streams the body and releases the stream slot when it is done
+        g.pop('admission_slot', None)
+        turn.admission = stream_slot
+        handoff['turn'] = turn
+        return event_stream_response([])
+    # Otherwise (WSGI, or the event loop's streams are at capacity) the reply
+    # streams on this thread and keeps its thread slot
+
+    @stream_with_context
+    def generate():
+        chunks = []
+        completed = failed = False
+        try:
+            if get_anthropic_client() is None:
+                raise RuntimeError("Anthropic client is not initialized")
+
+            for text in hedged_stream(get_anthropic_client(), 'chat', turn.primary, turn.fallback):
+                chunks.append(text)
+                yield format_sse('delta', {'text': text})
+            completed = True
+        except Exception as e:
+            print(f"Error streaming from Anthropic API: {str(e)}")
+            failed = True
+        finally:
+            closing = turn.finish(chunks, completed, failed)
+        yield from closing
+
+    return event_stream_response(generate())
+
+
+def event_stream_response(body):
+    response = Response(body, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop proxies (nginx, Vercel edge) from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @app.route('/chat', methods=['POST'])
+@admission_control('chat')
 def chat():
     try:
         # Initialize session if not already set
@@ -1296,13 +1552,27 @@ def chat():
             session['history'] = []
 
         # Get user ID from request for MongoDB
-        user_id, user = get_or_create_user(request)
+        with metrics.timer('chat_stage_seconds', stage='user_lookup'):
+            user_id, user = get_or_create_user(request)
         
         data = request.get_json()
         user_input = data.get('user_input', '')
-
-        # Get and truncate history to manage token count
-        history = truncate_history(session.get('history', []))
+        # Clients opt into token streaming with {"stream": true} or an SSE Accept header
+        wants_stream = bool(data.get('stream')) or 'text/event-stream' in request.headers.get('Accept', '')
+
+        # Keep only the most recent turns that fit in the history token budget
+        conversation_id = session.setdefault('conversation_id', secrets.token_urlsafe(12))
+        history, dropped = window_history(merge_streamed_turn(session.get('history', [])),
+                                          history_budget(user_input))
+
+        # Turns leaving the window are folded into the rolling summary once the
+        # response has been sent
+        if dropped:
+            @after_this_request
+            def compact_dropped_turns(response):
+                response.call_on_close(
+                    lambda: schedule_compaction(get_anthropic_client(), conversation_id, user_id, dropped))
+                return response
 
         # Handle first message - auto-generate a welcome message
         if len(history) == 0 and user_input.lower() in [
@@ -1326,39 +1596,31 @@ def chat():
 
         # Search the photo database for relevant photos based on user input
         # Import the search_photos function
-        from utils.photo_database import search_photos
+        from utils.photo_database import search_photos, PHOTO_URLS
         # Search for up to 3 matching photos
-        relevant_photos = search_photos(user_input, limit=3)
+        with metrics.timer('chat_stage_seconds', stage='photo_search'):
+            relevant_photos = search_photos(user_input, limit=3)
+
+        # Everything from here to the Claude call builds the prompt, apart from
+        # the stages timed on their own
+        prompt_build = metrics.StageTimer('chat_stage_seconds', stage='prompt_build')
 
         # Format the photo information to include in the API call
         photo_context = ""
+        s3_enabled = False
         if relevant_photos:
             photo_context = "Here are some relevant photos you can reference in your response:\n"
             for photo in relevant_photos:
                 photo_context += f"- {photo['title']}: {photo['description']}. Filename: {photo['filename']}\n"
-            # Get S3 bucket name from environment variable
+            # Use S3 links only while the background probe reports the bucket
+            # reachable; URLs were computed when the photo database loaded
             s3_bucket = os.environ.get('AWS_S3_BUCKET')
-            s3_enabled = False
-            
-            # Check if S3 is properly configured
-            try:
-                if s3_bucket:
-                    from utils.s3_utils import get_s3_client
-                    s3_client = get_s3_client()
-                    if s3_client:
-                        # Test connection
-                        s3_client.list_objects_v2(Bucket=s3_bucket, MaxKeys=1)
-                        s3_enabled = True
-            except Exception as e:
-                print(f"S3 connection test failed: {str(e)}")
-                s3_enabled = False
+            s3_enabled = bool(PHOTO_URLS) and is_s3_available(s3_bucket)
                 
             if s3_enabled:
                 photo_context += f"\nIf relevant, include a photo link by saying exactly: 'You can see a photo of it here: {{s3_url}}' where {{s3_url}} is the full S3 URL I'll provide for each image."
-                # Generate S3 URLs for each photo
                 for photo in relevant_photos:
-                    filename = photo['filename']
-                    s3_url = s3_image_url(s3_bucket, f"images/{filename}")
+                    s3_url = PHOTO_URLS.get(photo['filename']) or s3_image_url(s3_bucket, f"images/{photo['filename']}")
                     photo_context += f"\nFor image '{photo['title']}', use: {s3_url}"
             else:
                 photo_context += "\nIf relevant, include a photo link by saying exactly: 'You can see a photo of it here: /static/images/{filename}' where {filename} is the EXACT filename from above, already URL encoded."
@@ -1377,83 +1639,67 @@ def chat():
         # Add the new user message
         messages.append({"role": "user", "content": user_input})
 
-        # Add investment philosophy to the personal profile
-        enriched_profile = PERSONAL_PROFILE.copy()
-        
-        # Ensure the INVESTMENT_PHILOSOPHY has the key_principles field that system_prompt.py expects
-        inv_phil = INVESTMENT_PHILOSOPHY.copy()
-        # Map core_principles to key_principles for compatibility
-        if "core_principles" in inv_phil:
-            inv_phil["key_principles"] = [p["name"] for p in inv_phil["core_principles"]]
-        
-        enriched_profile["investment_philosophy"] = inv_phil
-        
-        # Get the base system prompt
-        system_prompt = get_system_prompt(enriched_profile)
+        # Get the precompiled base system prompt (profile + investment philosophy);
+        # the per-request sections below are sent after it so the base stays cacheable
+        base_prompt = get_base_prompt()
+        request_sections = ""
         
-        # Add photo context to the system prompt dynamically
+        # Add photo context to the system prompt dynamically; each section is
+        # clipped to its fixed token allowance
         if photo_context:
-            system_prompt += f"\n\n# Relevant Photos for This Query\n{photo_context}\n"
+            photo_context = clip_to_tokens(photo_context, SECTION_ALLOWANCES['photo_context'])
+            request_sections += f"\n\n# Relevant Photos for This Query\n{photo_context}\n"
         
         # Enhance the prompt with user data from MongoDB
-        system_prompt = enhance_prompt_with_user_data(user_id, system_prompt)
-
-        # Add social platform data if available
-        social_data = ""
-        # Check if we're using a connected social platform
-        if 'connected_platforms' in session and session['connected_platforms']:
-            social_data = "\n\n# User Social Data\n"
-            for platform in session['connected_platforms']:
-                if f'{platform}_token' in session:
-                    social_data += f"- Connected to {platform.capitalize()}\n"
-                    # Fetch platform-specific data
-                    try:
-                        client = oauth.create_client(platform)
-                        if client is None:
-                            logger.error(f"Failed to create OAuth client for platform: {platform}")
-                            social_data += f"  - Error: OAuth client not found for {platform}\n"
-                            continue
-                        token = session[f'{platform}_token']
-                        
-                        if platform == 'x':
-                            # Get X (Twitter) data if connected
-                            resp = client.get('https://api.twitter.com/2/users/me', token=token)
-                            if resp.status_code == 200:
-                                twitter_data = resp.json().get('data', {})
-                                social_data += f"  - X Username: @{twitter_data.get('username', 'unknown')}\n"
-                        
-                        elif platform == 'spotify':
-                            # Get Spotify data if connected
-                            resp = client.get('https://api.spotify.com/v1/me/player/recently-played', token=token)
-                            if resp.status_code == 200:
-                                spotify_data = resp.json().get('items', [])
-                                if spotify_data:
-                                    track = spotify_data[0]['track']
-                                    social_data += f"  - Recently played: {track.get('name', 'unknown')} by {track.get('artists', [{}])[0].get('name', 'unknown')}\n"
-                        
-                        elif platform == 'reddit':
-                            # Get Reddit data if connected
-                            resp = client.get('https://oauth.reddit.com/api/v1/me', token=token, headers={'User-Agent': 'BrooksChatbot/1.0 (by /u/yourusername)'})
-                            if resp.status_code == 200:
-                                user_data = resp.json()
-                                social_data += f"  - Reddit Username: u/{user_data.get('name', 'unknown')}\n"
-                                social_data += f"  - Karma: {user_data.get('total_karma', 0)}\n"
-                        
-                        elif platform == 'discord':
-                            # Get Discord data if connected
-                            resp = client.get('https://discord.com/api/users/@me', token=token)
-                            if resp.status_code == 200:
-                                user_data = resp.json()
-                                social_data += f"  - Discord Username: {user_data.get('username', 'unknown')}\n"
-                                if 'discriminator' in user_data and user_data['discriminator'] != '0':
-                                    social_data += f"  - Discord Tag: #{user_data.get('discriminator', '0000')}\n"
-                    
-                    except Exception as e:
-                        print(f"Error fetching social data for {platform}: {str(e)}")
-            
-            # If we have platform data, include it in the system prompt
-            if social_data:
-                system_prompt += social_data
+        with prompt_build.paused(), metrics.timer('chat_stage_seconds', stage='interest_enrichment'):
+            interest_section = enhance_prompt_with_user_data(user_id, "")
+        request_sections += clip_to_tokens(interest_section, SECTION_ALLOWANCES['user_interests'])
+
+        # Opening questions from visitors we know nothing about get the same answer,
+        # so they are served from the first-turn cache; personalized turns opt out
+        summary = get_summary(conversation_id)
+        cache_version = None
+        if RESPONSE_CACHE_ENABLED and not history and not dropped and not summary:
+            if interest_section or session.get('connected_platforms'):
+                record_bypass('personalized')
+            else:
+                cache_version = f"{base_prompt.version}:{'s3' if s3_enabled else 'static'}"
+                cached_response = first_turn_cache.get(user_input, cache_version)
+                if cached_response is not None:
+                    history.append({'role': 'user', 'content': user_input})
+                    history.append({'role': 'assistant', 'content': cached_response})
+                    session['history'] = history
+                    prompt_build.observe()
+                    log_chat_interaction(user_id, user_input, cached_response)
+                    return jsonify({
+                        'response': cached_response,
+                    })
+
+        # Add social platform data if available; lookups run concurrently under a
+        # shared deadline and platforms that miss it are left out of this turn
+        with prompt_build.paused(), metrics.timer('chat_stage_seconds', stage='social_fetch'):
+            social_data = get_all_connected_platforms_data(session, oauth)
+        if social_data:
+            request_sections += clip_to_tokens(social_data, SECTION_ALLOWANCES['social_data'])
+
+        # Summary of earlier turns that no longer fit in the history window
+        request_sections += summary_section(summary)
+
+        # Cache breakpoints on the static persona prefix and on the conversation so far
+        system_prompt = cached_system_prompt(base_prompt.text, request_sections)
+        messages = with_history_breakpoint(messages)
+        # Raced against the primary if its first token is late
+        hedge_request = fallback_request(system_prompt, history, user_input)
+        prompt_build.observe()
+
+        # Stream tokens back as they arrive; history and logging happen when the stream ends
+        cache_answer = None
+        if cache_version:
+            cache_answer = lambda text: first_turn_cache.put(user_input, cache_version, text)
+        if wants_stream:
+            session['history'] = history + [{'role': 'user', 'content': user_input}]
+            return stream_chat_response(user_id, user_input, system_prompt, messages,
+                                        on_complete=cache_answer, fallback=hedge_request)
 
         # Call Claude API
         try:
@@ -1478,7 +1724,7 @@ def chat():
             error_occurred = False
             default_response = ""
             
-            if anthropic_client is not None:
+            if get_anthropic_client() is not None:
                 try:
                     # Ensure messages are properly typed
                     # Only convert if messages is a list of dicts and not already MessageParam objects
@@ -1491,29 +1737,39 @@ def chat():
                                 # Cast to allowed roles
                                 if role not in ('user', 'assistant'):
                                     role = 'user' if role == 'human' else 'assistant'
-                                typed_messages.append(MessageParam(role=role, content=msg["content"]))
+                                typed_messages.append({"role": role, "content": msg["content"]})
                             else:
                                 # Skip invalid messages
                                 continue
                     else:
                         typed_messages = messages
                         
-                    response = anthropic_client.messages.create(
-                        model="claude-3-5-sonnet-20241022",  # Updated to newer model
-                        system=system_prompt,
-                        messages=typed_messages,
-                        max_tokens=4000,  # Increased from 1500 to 4000
-                        temperature=0.7
-                    )
+                    # Identical requests already in flight share one upstream call;
+                    # a slow primary is hedged to the faster model
+                    with metrics.timer('chat_stage_seconds', stage='llm'):
+                        response = hedged_create(
+                            get_anthropic_client(), 'chat',
+                            dict(
+                                model="claude-3-5-sonnet-20241022",  # Updated to newer model
+                                system=system_prompt,
+                                messages=typed_messages,
+                                max_tokens=4000,  # Increased from 1500 to 4000
+                                temperature=0.7
+                            ),
+                            hedge_request
+                        )
                     print("\nAPI call successful!")
                 except Exception as e:
                     print(f"Error calling Anthropic API: {str(e)}")
                     error_occurred = True
+                    metrics.increment('chat_errors_total', endpoint='chat', stage='llm')
+                    metrics.increment('chat_fallbacks_total', endpoint='chat', reason='llm_error')
                     # Set a default error response
                     default_response = "I'm sorry, there was an error processing your request. Please try again later."
             else:
                 print("Anthropic client is not initialized")
                 error_occurred = True
+                metrics.increment('chat_fallbacks_total', endpoint='chat', reason='llm_unavailable')
                 # Set a default error response
                 default_response = "I'm sorry, the AI service is currently unavailable. Please try again later."
             
@@ -1557,8 +1813,13 @@ def chat():
 
             # Log the chat interaction in MongoDB
             log_chat_interaction(user_id, user_input, assistant_response)
+
+            if cache_answer and not error_occurred and assistant_response:
+                cache_answer(assistant_response)
                 
         except Exception as e:
+            metrics.increment('chat_errors_total', endpoint='chat', stage='response')
+            metrics.increment('chat_fallbacks_total', endpoint='chat', reason='response_error')
             print("\n======== API ERROR DEBUG ========")
             print(f"Error type: {type(e).__name__}")
             print(f"Error message: {str(e)}")
@@ -1618,6 +1879,7 @@ def chat():
         error_str = str(e).lower()
         error_type = type(e).__name__
         print(f"Error type: {error_type}")
+        metrics.increment('chat_errors_total', endpoint='chat', stage='unhandled')
 
         user_error_message = "I encountered an error. Please try again or reset the conversation."
 
@@ -1763,7 +2025,7 @@ def health_check():
 
     try:
         # Just do a simple API check
-        models = anthropic_client.models.list() if anthropic_client else None
+        models = get_anthropic_client().models.list() if get_anthropic_client() else None
         model_names = [
             model.id for model in models.data] if models and hasattr(
             models, 'data') else []
@@ -1780,6 +2042,10 @@ def health_check():
         "api_status": api_status,
         "api_key_check": api_key_masked,
         "available_models": model_names,
+        "anthropic_resilience": get_resilience_stats(),
+        "hedging": get_hedging_stats(),
+        "admission": get_admission_stats(),
+        "schema": get_schema_status(),
         "env_vars": {k: "***" for k in os.environ if k.startswith("ANTHROPIC") or k == "SECRET_KEY"}
     })
 
@@ -1810,13 +2076,13 @@ def check_api():
             print(f"WARNING: API key appears invalid. Key format: {key_preview}...")
         
         # Check client initialization
-        print(f"Client type: {type(anthropic_client)}")
-        print(f"Client API base URL: {anthropic_client.base_url if anthropic_client and hasattr(anthropic_client, 'base_url') else 'unknown'}")
+        print(f"Client type: {type(get_anthropic_client())}")
+        print(f"Client API base URL: {get_anthropic_client().base_url if get_anthropic_client() and hasattr(get_anthropic_client(), 'base_url') else 'unknown'}")
         
         # Make API call
         print("Making test API call...")
         response = None
-        if anthropic_client is not None:
+        if get_anthropic_client() is not None:
             # Ensure messages are properly typed
             # Only convert if messages is a list of dicts and not already MessageParam objects
             if messages and isinstance(messages, list) and isinstance(messages[0], dict):
@@ -1828,14 +2094,14 @@ def check_api():
                         # Cast to allowed roles
                         if role not in ('user', 'assistant'):
                             role = 'user' if role == 'human' else 'assistant'
-                        typed_messages.append(MessageParam(role=role, content=msg["content"]))
+                        typed_messages.append({"role": role, "content": msg["content"]})
                     else:
                         # Skip invalid messages
                         continue
             else:
                 typed_messages = messages
                 
-            response = anthropic_client.messages.create(
+            response = get_anthropic_client().messages.create(
                 model="claude-3-5-sonnet-20241022",  # Updated model
                 system="Please respond with only the word 'Connected'",
                 messages=typed_messages,
@@ -1957,6 +2223,7 @@ def check_api():
 
 
 @app.route('/simple-chat', methods=['POST'])
+@admission_control('simple_chat')
 def simple_chat_endpoint():
     """Simplified chat endpoint for testing without sessions"""
     try:
@@ -2002,14 +2269,14 @@ def simple_chat_endpoint():
             print(f"Simple system prompt: {simple_system}")
             
             # Verify client is properly initialized
-            print(f"Client instance type: {type(anthropic_client)}")
+            print(f"Client instance type: {type(get_anthropic_client())}")
             # Safely get client attributes
-            client_attrs = dir(anthropic_client) if anthropic_client else []
+            client_attrs = dir(get_anthropic_client()) if get_anthropic_client() else []
             attr_preview = client_attrs[:10] if client_attrs else []
             print(f"Client attributes: {attr_preview}...")
             
             response = None
-            if anthropic_client is not None:
+            if get_anthropic_client() is not None:
                 # Ensure messages are properly typed
                 # Only convert if messages is a list of dicts and not already MessageParam objects
                 if messages and isinstance(messages, list) and isinstance(messages[0], dict):
@@ -2021,14 +2288,15 @@ def simple_chat_endpoint():
                             # Cast to allowed roles
                             if role not in ('user', 'assistant'):
                                 role = 'user' if role == 'human' else 'assistant'
-                            typed_messages.append(MessageParam(role=role, content=msg["content"]))
+                            typed_messages.append({"role": role, "content": msg["content"]})
                         else:
                             # Skip invalid messages
                             continue
                 else:
                     typed_messages = messages
                 
-                response = anthropic_client.messages.create(
+                response = create_message(
+                    get_anthropic_client(), 'simple_chat',
                     model="claude-3-5-sonnet-20241022",
                     system=simple_system,
                     messages=typed_messages,
@@ -2176,11 +2444,11 @@ def diagnose_api():
     
     # 2. Check Anthropic client initialization
     client_initialized = False
-    client_type = str(type(anthropic_client)) if anthropic_client is not None else "NoneType"
+    client_type = str(type(get_anthropic_client())) if get_anthropic_client() is not None else "NoneType"
     try:
-        if anthropic_client is not None:
-            client_attrs = dir(anthropic_client)
-            client_initialized = "messages" in client_attrs and hasattr(anthropic_client, "api_key")
+        if get_anthropic_client() is not None:
+            client_attrs = dir(get_anthropic_client())
+            client_initialized = "messages" in client_attrs and hasattr(get_anthropic_client(), "api_key")
         else:
             client_error = "Anthropic client is None"
     except Exception as e:
@@ -2194,9 +2462,9 @@ def diagnose_api():
     
     # Also check MongoDB client
     mongodb_initialized = False
-    mongodb_type = str(type(mongodb_client)) if mongodb_client is not None else "NoneType"
+    mongodb_type = str(type(get_mongodb_client())) if get_mongodb_client() is not None else "NoneType"
     try:
-        if mongodb_client is not None:
+        if get_mongodb_client() is not None:
             mongodb_initialized = True
             mongodb_status = "Connected"
         else:
@@ -2255,7 +2523,7 @@ def diagnose_api():
         
         # Attempt API call but catch all errors
         response = None
-        if anthropic_client is not None:
+        if get_anthropic_client() is not None:
             # Convert messages to the correct type - role must be 'user' or 'assistant'
             typed_messages = []
             for msg in test_messages:
@@ -2263,9 +2531,9 @@ def diagnose_api():
                 # Cast to allowed roles
                 if role not in ('user', 'assistant'):
                     role = 'user' if role == 'human' else 'assistant'
-                typed_messages.append(MessageParam(role=role, content=msg["content"]))
+                typed_messages.append({"role": role, "content": msg["content"]})
             
-            response = anthropic_client.messages.create(
+            response = get_anthropic_client().messages.create(
                 model="claude-3-5-sonnet-20241022",
                 system="Test",
                 messages=typed_messages,
@@ -2354,10 +2622,6 @@ def serve_css():
 def serve_js():
     return send_from_directory('static', 'script.js')
 
-@app.route('/privacy')
-def privacy_policy():
-    return send_from_directory('static', 'PrivacyStatement.html')
-
 
 # For local development
 # Using port 5001 to avoid conflict with AirPlay Receiver
@@ -0,0 +1,132 @@
+"""
+ASGI entry point, served alongside wsgi.py
+
+    uvicorn asgi:app --workers 1
+
+Routes are the Flask app's, run through asgiref's WSGI adapter. Streamed /chat
+replies are where requests spend their time, so the Claude stream for those is
+run on the event loop with AsyncAnthropic instead of holding a worker thread:
+the Flask view still builds the prompt, sets the session cookie and is
+admitted as usual, then hands the turn back here. The turn trades its
+LLM_MAX_IN_FLIGHT thread slot for one of ASGI_LLM_MAX_IN_FLIGHT stream slots,
+so one process can keep hundreds of slow conversations open at once while
+the requests that still block a thread stay capped.
+"""
+import os
+import asyncio
+
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi
+
+from app import app as flask_app, async_handoff, format_sse, ANTHROPIC_API_KEY
+from utils.hedging import async_hedged_stream
+from utils.lazy import Lazy
+
+# Flask views running at once. asgiref runs WSGI apps thread_sensitive, which
+# outside a ThreadSensitiveContext means every view in the process on one
+# shared thread, one request at a time
+WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 32))
+
+
+class ConcurrentWsgiToAsgi(WsgiToAsgi):
+    """WsgiToAsgi giving each request its own thread, at most max_threads at once"""
+
+    def __init__(self, wsgi_application, max_threads=WSGI_THREADS):
+        super().__init__(wsgi_application)
+        self.threads = asyncio.Semaphore(max_threads)
+
+    async def __call__(self, scope, receive, send):
+        async with self.threads, ThreadSensitiveContext():
+            await super().__call__(scope, receive, send)
+
+
+def create_async_client():
+    """AsyncAnthropic for streamed replies, or None without a valid key
+
+    app.py leaves a placeholder in ANTHROPIC_API_KEY when no valid key is set.
+    """
+    if not ANTHROPIC_API_KEY.startswith('sk-'):
+        return None
+    import anthropic
+    return anthropic.AsyncAnthropic(api_key=ANTHROPIC_API_KEY)
+
+
+# Created by the first streamed reply, like the sync client in app.py
+_async_client = Lazy(create_async_client)
+
+
+async def relay_turn(turn, send):
+    """Stream one handed-off turn to the browser as server-sent events"""
+    chunks = []
+    completed = failed = False
+    try:
+        async_client = _async_client.get()
+        if async_client is None:
+            raise RuntimeError("Anthropic client is not initialized")
+        async for text in async_hedged_stream(async_client, 'chat', turn.primary, turn.fallback):
+            chunks.append(text)
+            await send({'type': 'http.response.body', 'body': format_sse('delta', {'text': text}).encode(),
+                        'more_body': True})
+        completed = True
+    except Exception as e:
+        print(f"Error streaming from Anthropic API: {str(e)}")
+        failed = True
+    finally:
+        # Saving the reply to the session is a MongoDB round trip, so it runs off the loop
+        closing = await asyncio.to_thread(turn.finish, chunks, completed, failed)
+    await send({'type': 'http.response.body', 'body': ''.join(closing).encode(), 'more_body': False})
+
+
+async def wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+class AsyncChatMiddleware:
+    """Serve the WSGI app, taking over streamed /chat bodies it hands off"""
+
+    def __init__(self, wsgi_app):
+        self.app = ConcurrentWsgiToAsgi(wsgi_app)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        # Copied into the worker thread that runs the Flask view
+        handoff = {}
+        token = async_handoff.set(handoff)
+        response_start = None
+
+        async def intercept(message):
+            nonlocal response_start
+            if 'turn' not in handoff:
+                await send(message)
+            elif message['type'] == 'http.response.start':
+                response_start = message
+            # The handed-off response's own (empty) body is dropped
+
+        try:
+            await self.app(scope, receive, intercept)
+        finally:
+            async_handoff.reset(token)
+
+        turn = handoff.get('turn')
+        if turn is None:
+            return
+        # Flask measured the handed-off (empty) body, and servers enforce Content-Length
+        response_start = dict(response_start, headers=[
+            (name, value) for name, value in response_start['headers'] if name.lower() != b'content-length'])
+        await send(response_start)
+        relay = asyncio.ensure_future(relay_turn(turn, send))
+        disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+        await asyncio.wait({relay, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        if not relay.done():
+            # Browser went away: cancelling closes the upstream stream(s)
+            relay.cancel()
+        disconnect.cancel()
+        await asyncio.gather(relay, disconnect, return_exceptions=True)
+
+
+app = AsyncChatMiddleware(flask_app)
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Load test for the chat endpoints.
+
+Serves app.py and api/chat.py's Handler on local ports, with Claude answered
+by anthropic_standin.py (configurable latency and token rate, or replayed
+recordings) and MongoDB by the in-memory store, then drives each endpoint in turn with a pool of
+virtual visitors for a fixed time:
+
+    python benchmark_load.py
+    python benchmark_load.py --concurrency 32 --duration 30 --llm-latency 1.5 --llm-tokens-per-second 40
+    python benchmark_load.py --endpoints chat,api-chat --stream --output after.json
+    python benchmark_load.py --replay recordings.jsonl
+    python benchmark_load.py --asgi --endpoints chat,simple-chat
+
+Visitors' questions are seeded, so a run recorded through the stand-in
+(--record) replays request for request.
+
+Reports throughput, p50/p95/p99 latency, and error and shed (429/503) rates
+per endpoint. With --asgi the app is served through asgi.py under uvicorn
+instead of werkzeug's threaded server. Visitors get generous per-visitor rate limits unless
+--keep-rate-limits is given; the process-wide LLM_MAX_IN_FLIGHT cap stays as
+configured, so overload shows up as shed requests.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import threading
+import contextlib
+import importlib.util
+import urllib.error
+import urllib.request
+import http.cookiejar
+from collections import Counter
+from http.server import ThreadingHTTPServer
+from datetime import datetime, timezone
+
+from anthropic_standin import start_standin
+from benchmark_startup import PROJECT_ROOT, child_environment, git_commit
+
+ENDPOINTS = ['chat', 'simple-chat', 'feedback', 'api-chat']
+QUESTIONS = [
+    "What kind of projects does Brooks work on?",
+    "Where did Brooks grow up?",
+    "What does Brooks do for fun?",
+    "Tell me about the workshop.",
+    "What is Brooks reading lately?",
+    "How did Brooks get into fishing?",
+]
+REQUEST_TIMEOUT = 60
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(p / 100.0 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class VirtualVisitor:
+    """One browser: its own identity, cookies and question sequence"""
+
+    def __init__(self, index, base_urls, stream):
+        self.index = index
+        self.base_urls = base_urls
+        self.stream = stream
+        self.sent = 0
+        self.random = random.Random(index)
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        self.headers = {
+            'Content-Type': 'application/json',
+            # Distinct visitors for get_user_identifier and the rate limiter
+            'User-Agent': f"benchmark-load/{index}",
+            'X-Forwarded-For': f"10.0.{index // 250}.{index % 250 + 1}",
+        }
+
+    def question(self):
+        self.sent += 1
+        # Unique per request, so identical in-flight calls are not coalesced
+        return f"{self.random.choice(QUESTIONS)} (visitor {self.index}, message {self.sent})"
+
+    def request(self, endpoint):
+        """Send one request; returns its HTTP status (0 for a connection error)"""
+        if endpoint == 'chat':
+            url, body = self.base_urls['app'] + '/chat', {'user_input': self.question(), 'stream': self.stream}
+        elif endpoint == 'simple-chat':
+            url, body = self.base_urls['app'] + '/simple-chat', {'user_input': self.question()}
+        elif endpoint == 'feedback':
+            url, body = self.base_urls['app'] + '/api/feedback', {'message': self.question(),
+                                                                  'feedback': self.random.choice(['up', 'down'])}
+        else:
+            url, body = self.base_urls['api'], {'user_input': self.question(),
+                                                'user_data': {'basic': {'deviceType': 'desktop'}}}
+        req = urllib.request.Request(url, data=json.dumps(body).encode(), headers=self.headers, method='POST')
+        try:
+            with self.opener.open(req, timeout=REQUEST_TIMEOUT) as response:
+                # Read to the end, so streamed replies are timed to their last token
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+        except OSError:
+            return 0
+
+
+def run_phase(endpoint, visitors, duration):
+    """Drive one endpoint with every visitor until the duration is up"""
+    results = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def loop(visitor):
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            status = visitor.request(endpoint)
+            elapsed = time.perf_counter() - started
+            with lock:
+                results.append((status, elapsed))
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=loop, args=(v,), daemon=True) for v in visitors]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return summarize_phase(results, time.monotonic() - started)
+
+
+def summarize_phase(results, elapsed):
+    statuses = Counter(status for status, _ in results)
+    ok = sorted(latency * 1000 for status, latency in results if 200 <= status < 300)
+    total = len(results)
+    shed = statuses[429] + statuses[503]
+    errors = total - len(ok) - shed
+
+    def rounded(value):
+        return round(value, 1) if value is not None else None
+
+    return {
+        'requests': total,
+        'throughput_rps': round(len(ok) / elapsed, 2) if elapsed else 0,
+        'latency_ms': {'p50': rounded(percentile(ok, 50)), 'p95': rounded(percentile(ok, 95)),
+                       'p99': rounded(percentile(ok, 99)), 'max': rounded(ok[-1] if ok else None)},
+        'error_rate': round(errors / total, 4) if total else 0,
+        'shed_rate': round(shed / total, 4) if total else 0,
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+
+def load_api_handler():
+    """api/chat.py as Vercel loads it: a standalone module exposing Handler"""
+    spec = importlib.util.spec_from_file_location('api_chat', os.path.join(PROJECT_ROOT, 'api', 'chat.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    class QuietHandler(module.Handler):
+        def log_message(self, format, *args):
+            pass
+
+    return QuietHandler
+
+
+def serve_in_thread(server):
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class UvicornThread:
+    """An ASGI app under uvicorn on a local port, with the werkzeug server's shutdown()"""
+
+    def __init__(self, app):
+        import uvicorn
+        self.socket = socket.socket()
+        self.socket.bind(('127.0.0.1', 0))
+        self.server_port = self.socket.getsockname()[1]
+        self.server = uvicorn.Server(uvicorn.Config(app, lifespan='off', log_level='warning', access_log=False))
+        threading.Thread(target=self.server.run, kwargs={'sockets': [self.socket]}, daemon=True).start()
+        while not self.server.started:
+            time.sleep(0.01)
+
+    def shutdown(self):
+        self.server.should_exit = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the chat endpoints against local stand-ins")
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS),
+                        help=f"comma-separated subset of {', '.join(ENDPOINTS)}")
+    parser.add_argument('--concurrency', type=int, default=16, help="virtual visitors per endpoint")
+    parser.add_argument('--duration', type=float, default=15, help="seconds per endpoint")
+    parser.add_argument('--llm-latency', type=float, default=0.5, help="stand-in seconds to first token")
+    parser.add_argument('--llm-tokens-per-second', type=float, default=60, help="stand-in token rate (0: instant)")
+    parser.add_argument('--llm-reply-tokens', type=int, default=80, help="synthetic reply length in tokens")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--replay', metavar='FILE', help="answer from responses recorded in FILE")
+    source.add_argument('--record', metavar='FILE',
+                        help="send Claude calls to the real API (needs a real key) and record them to FILE")
+    parser.add_argument('--stream', action='store_true', help="ask /chat for a streamed reply")
+    parser.add_argument('--asgi', action='store_true', help="serve the app through asgi.py under uvicorn")
+    parser.add_argument('--keep-rate-limits', action='store_true', help="leave per-visitor rate limits as configured")
+    parser.add_argument('--output', help="also write the report as JSON")
+    args = parser.parse_args()
+
+    endpoints = [e.strip() for e in args.endpoints.split(',') if e.strip()]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+
+    words = "Brooks likes building things by hand and talking about them".split()
+    real_key = os.environ.get('ANTHROPIC_API_KEY')
+    standin = start_standin(
+        'replay' if args.replay else 'record' if args.record else 'synthetic', args.replay or args.record,
+        first_token_latency=args.llm_latency, tokens_per_second=args.llm_tokens_per_second,
+        reply=' '.join(words[i % len(words)] for i in range(args.llm_reply_tokens)))
+
+    # The app reads its configuration at import, so the stand-ins go in first
+    os.environ.update(child_environment(standin.url))
+    if args.record:
+        # Recording forwards the app's key to the real API
+        os.environ['ANTHROPIC_API_KEY'] = real_key or ''
+
+    os.environ['SERVERLESS'] = '1'  # keep api/chat.py's conversation log on the console
+    if not args.keep_rate_limits:
+        os.environ['CHAT_RATE_PER_MINUTE'] = '1000000'
+        os.environ['CHAT_RATE_BURST'] = '1000000'
+    sys.path.insert(0, PROJECT_ROOT)
+
+    from werkzeug.serving import make_server
+    import logging
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        if args.asgi:
+            from asgi import app as asgi_app
+            app_server = UvicornThread(asgi_app)
+        else:
+            from app import app
+            app_server = serve_in_thread(make_server('127.0.0.1', 0, app, threaded=True))
+        api_server = serve_in_thread(ThreadingHTTPServer(('127.0.0.1', 0), load_api_handler()))
+    api_server.daemon_threads = True
+    # Per-request logging would dominate the measurement
+    logging.disable(logging.WARNING)
+
+    base_urls = {'app': f"http://127.0.0.1:{app_server.server_port}",
+                 'api': f"http://127.0.0.1:{api_server.server_address[1]}"}
+    report = {
+        'commit': git_commit(),
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'config': {'concurrency': args.concurrency, 'duration_s': args.duration, 'stream': args.stream,
+                   'server': 'asgi' if args.asgi else 'wsgi',
+                   'llm_latency_s': args.llm_latency, 'llm_tokens_per_second': args.llm_tokens_per_second,
+                   'llm_reply_tokens': args.llm_reply_tokens, 'rate_limited': args.keep_rate_limits,
+                   'llm_max_in_flight': int(os.environ.get('LLM_MAX_IN_FLIGHT', 8)),
+                   'replay': args.replay, 'record': args.record},
+        'endpoints': {},
+    }
+    try:
+        for endpoint in endpoints:
+            print(f"{endpoint}: {args.concurrency} visitors for {args.duration:g}s ...", flush=True)
+            visitors = [VirtualVisitor(i, base_urls, args.stream) for i in range(args.concurrency)]
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                report['endpoints'][endpoint] = run_phase(endpoint, visitors, args.duration)
+    finally:
+        app_server.shutdown()
+        api_server.shutdown()
+        standin.shutdown()
+    report['standin'] = dict(standin.stats)
+
+    print(f"\n{'endpoint':<12} {'requests':>8} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'errors':>7} {'shed':>7}")
+    for endpoint, stats in report['endpoints'].items():
+        latency = {k: f"{v:.0f}" if v is not None else '-' for k, v in stats['latency_ms'].items()}
+        print(f"{endpoint:<12} {stats['requests']:>8} {stats['throughput_rps']:>8.1f} {latency['p50']:>9} "
+              f"{latency['p95']:>9} {latency['p99']:>9} {stats['error_rate']:>7.1%} {stats['shed_rate']:>7.1%}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"\nReport written to {args.output}")
+    if args.replay and standin.stats['missed']:
+        print(f"{standin.stats['missed']} Claude calls had no recording and got a synthetic reply")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
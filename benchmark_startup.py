@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the Flask app.
+
+Each run is a fresh Python process that imports app and sends the first
+request to /test, /chat and /admin, so module-level work is paid every time.
+External services are stood in for: Claude by anthropic_standin.py answering
+instantly, MongoDB by the in-memory store (MONGO_URI=memory://). One extra run under `python -X importtime`
+breaks the import down per module.
+
+    python benchmark_startup.py                      # 5 runs, report in logs/
+    python benchmark_startup.py --runs 10 --output before.json
+    python benchmark_startup.py --compare before.json --output after.json
+
+The report is JSON with sorted keys, so two reports diff cleanly.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import platform
+import resource
+import statistics
+import subprocess
+from datetime import datetime, timezone
+
+from anthropic_standin import start_standin
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+PATHS = ['/test', '/chat', '/admin/']
+CHAT_MESSAGE = "What kind of projects does Brooks work on?"
+ADMIN_PASSWORD = 'benchmark'
+IMPORT_MARKER = 'benchmark: importing app'
+TOP_MODULES = 25
+
+
+def child_environment(anthropic_url):
+    """Environment for a run: stand-ins for every external service"""
+    env = dict(os.environ)
+    env.update({
+        'ANTHROPIC_API_KEY': 'sk-ant-REDACTED',
+        'ANTHROPIC_BASE_URL': anthropic_url,
+        # utils.memory_store; set so .env cannot point at Atlas
+        'MONGO_URI': 'memory://',
+        'ADMIN_PASSWORD': ADMIN_PASSWORD,
+        'SECRET_KEY': 'benchmark',
+        'AWS_S3_BUCKET': '',
+        'PYTHONDONTWRITEBYTECODE': '1',
+    })
+    # Responses are uncached so /chat actually reaches the stand-in
+    env.setdefault('RESPONSE_CACHE_ENABLED', 'false')
+    return env
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_child(import_only):
+    """One measured run, in this (fresh) process; prints a JSON result"""
+    sys.path.insert(0, PROJECT_ROOT)
+    print(IMPORT_MARKER, file=sys.stderr, flush=True)
+    started = time.perf_counter()
+    import app as app_module
+    result = {'import_s': time.perf_counter() - started, 'import_rss_mb': peak_rss_mb()}
+
+    if not import_only:
+        client = app_module.app.test_client()
+        client.set_cookie('admin_auth', ADMIN_PASSWORD)
+        requests = {
+            '/test': lambda: client.get('/test'),
+            '/chat': lambda: client.post('/chat', json={'user_input': CHAT_MESSAGE}),
+            '/admin/': lambda: client.get('/admin/'),
+        }
+        result['first_request_ms'] = {}
+        result['status'] = {}
+        for path in PATHS:
+            started = time.perf_counter()
+            response = requests[path]()
+            response.get_data()
+            result['first_request_ms'][path] = (time.perf_counter() - started) * 1000
+            result['status'][path] = response.status_code
+            response.close()
+    result['peak_rss_mb'] = peak_rss_mb()
+    # The app prints while importing, so the result goes on a line of its own
+    print('\n' + json.dumps(result), flush=True)
+
+
+def spawn(env, import_only=False, importtime=False):
+    cmd = [sys.executable]
+    if importtime:
+        cmd += ['-X', 'importtime']
+    cmd += [os.path.abspath(__file__), '--child']
+    if import_only:
+        cmd.append('--import-only')
+    proc = subprocess.run(cmd, env=env, cwd=PROJECT_ROOT, capture_output=True, text=True, timeout=300)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Benchmark run failed ({proc.returncode}):\n{proc.stderr[-4000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1]), proc.stderr
+
+
+def parse_importtime(stderr):
+    """
+    Per-module import cost of `import app` from -X importtime output
+
+    Only lines after the child's marker count, so the benchmark's own
+    imports are left out.
+    """
+    modules = []
+    seen_marker = False
+    for line in stderr.splitlines():
+        if line.startswith(IMPORT_MARKER):
+            seen_marker = True
+            continue
+        match = re.match(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)', line)
+        if seen_marker and match:
+            modules.append({'module': match.group(4), 'self_us': int(match.group(1)),
+                            'cumulative_us': int(match.group(2)), 'depth': len(match.group(3)) // 2})
+
+    packages = {}
+    for m in modules:
+        package = m['module'].split('.')[0]
+        packages[package] = packages.get(package, 0) + m['self_us']
+    top_packages = sorted(packages.items(), key=lambda item: -item[1])[:TOP_MODULES]
+    return {
+        'total_ms': round(sum(m['self_us'] for m in modules) / 1000, 1),
+        'module_count': len(modules),
+        'by_package_ms': {name: round(us / 1000, 1) for name, us in top_packages},
+        'slowest_modules_ms': {m['module']: round(m['self_us'] / 1000, 1)
+                               for m in sorted(modules, key=lambda m: -m['self_us'])[:TOP_MODULES]},
+        # What `import app` pulls in directly, with everything beneath it
+        'direct_imports_ms': {m['module']: round(m['cumulative_us'] / 1000, 1)
+                              for m in modules if m['depth'] == 1},
+    }
+
+
+def summarize(values):
+    return {'min': round(min(values), 2), 'median': round(statistics.median(values), 2),
+            'max': round(max(values), 2)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(previous, current):
+    """Print median changes against an earlier report"""
+    def line(label, old, new, unit):
+        if old is None or new is None:
+            return
+        change = f"{(new - old) / old * 100:+.0f}%" if old else ''
+        print(f"  {label:<28} {old:>10.1f} -> {new:>10.1f} {unit}  {change}")
+
+    print(f"\nCompared with {previous.get('commit') or 'previous report'}:")
+    line('import', previous['import_s']['median'] * 1000, current['import_s']['median'] * 1000, 'ms')
+    for path in PATHS:
+        line(f"first {path}", previous['first_request_ms'].get(path, {}).get('median'),
+             current['first_request_ms'][path]['median'], 'ms')
+    line('peak RSS', previous['peak_rss_mb']['median'], current['peak_rss_mb']['median'], 'MB')
+    old_packages = previous.get('import_profile', {}).get('by_package_ms', {})
+    for name, ms in current['import_profile']['by_package_ms'].items():
+        if name in old_packages and abs(ms - old_packages[name]) >= 5:
+            line(f"import {name}", old_packages[name], ms, 'ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold import and first-request latency of app.py")
+    parser.add_argument('--runs', type=int, default=5, help="fresh processes to measure")
+    parser.add_argument('--output', help="report path (default: logs/startup-<commit>.json)")
+    parser.add_argument('--compare', help="earlier report to compare against")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--import-only', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.import_only)
+        return 0
+
+    standin = start_standin()
+    env = child_environment(standin.url)
+    try:
+        samples = []
+        for i in range(args.runs):
+            sample, _ = spawn(env)
+            samples.append(sample)
+            print(f"Run {i + 1}/{args.runs}: import {sample['import_s'] * 1000:.0f} ms, "
+                  + ", ".join(f"{path} {ms:.0f} ms" for path, ms in sample['first_request_ms'].items())
+                  + f", peak RSS {sample['peak_rss_mb']} MB")
+        _, importtime_stderr = spawn(env, import_only=True, importtime=True)
+    finally:
+        standin.shutdown()
+
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'runs': args.runs,
+        'import_s': summarize([s['import_s'] for s in samples]),
+        'import_rss_mb': summarize([s['import_rss_mb'] for s in samples]),
+        'peak_rss_mb': summarize([s['peak_rss_mb'] for s in samples]),
+        'first_request_ms': {path: summarize([s['first_request_ms'][path] for s in samples]) for path in PATHS},
+        'status': samples[-1]['status'],
+        'import_profile': parse_importtime(importtime_stderr),
+    }
+
+    output = args.output or os.path.join(PROJECT_ROOT, 'logs', f"startup-{commit or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+    print(f"\nImport: median {report['import_s']['median'] * 1000:.0f} ms, peak RSS {report['peak_rss_mb']['median']} MB")
+    print("Heaviest packages on import:")
+    for name, ms in list(report['import_profile']['by_package_ms'].items())[:10]:
+        print(f"  {name:<28} {ms:>8.1f} ms")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+    print(f"\nReport written to {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
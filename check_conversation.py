@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Check that long streamed conversations are windowed and summarized.
+
+Holds a streamed /chat conversation with the app, against anthropic_standin.py
+and the in-memory store, with a history budget small enough that early turns
+fall out of the window. Then checks that:
+
+- the stored session history is the window, not the whole conversation
+- every streamed reply made it into the stored history
+- the dropped turns were summarized and later requests to Claude carry the summary
+
+    python check_conversation.py
+    python check_conversation.py --turns 12 --history-tokens 400
+
+Exits non-zero if a check fails.
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import contextlib
+
+from anthropic_standin import start_standin
+from benchmark_startup import PROJECT_ROOT, child_environment
+
+SUMMARY_HEADING = "# Earlier In This Conversation"
+SUMMARY_WAIT = 10
+
+
+def system_text(body):
+    system = body.get('system') or ''
+    if isinstance(system, str):
+        return system
+    return ''.join(block.get('text', '') for block in system)
+
+
+def last_chat_request(standin):
+    """The newest streamed request the stand-in received (summaries are not streamed)"""
+    for body in reversed(standin.received):
+        if body.get('stream'):
+            return body
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check history windowing and summaries on streamed /chat")
+    parser.add_argument('--turns', type=int, default=8, help="streamed turns before the final check")
+    parser.add_argument('--history-tokens', type=int, default=250, help="history budget for past turns")
+    args = parser.parse_args()
+
+    words = "Brooks likes building things by hand and talking about them".split()
+    standin = start_standin(reply=' '.join(words[i % len(words)] for i in range(60)))
+    os.environ.update(child_environment(standin.url))
+    # One visitor sends every turn
+    os.environ['CHAT_RATE_PER_MINUTE'] = '1000000'
+    os.environ['CHAT_RATE_BURST'] = '1000000'
+    sys.path.insert(0, PROJECT_ROOT)
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        from app import app
+        from utils import conversation
+    logging.disable(logging.WARNING)
+    # Whatever the section allowances are, leave only --history-tokens for past turns
+    conversation.INPUT_TOKEN_BUDGET = sum(conversation.SECTION_ALLOWANCES.values()) + args.history_tokens
+
+    failures = []
+
+    def check(ok, message):
+        print(f"{'ok  ' if ok else 'FAIL'} {message}")
+        if not ok:
+            failures.append(message)
+
+    client = app.test_client()
+    try:
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            statuses = []
+            for turn in range(args.turns):
+                response = client.post('/chat', json={'user_input': f"Question {turn}: what else?", 'stream': True})
+                response.get_data()
+                # Closing runs the compaction scheduled for the dropped turns
+                response.close()
+                statuses.append(response.status_code)
+        check(all(status == 200 for status in statuses), f"{args.turns} streamed turns answered: {statuses}")
+
+        with client.session_transaction() as stored:
+            history = list(stored.get('history', []))
+            conversation_id = stored.get('conversation_id')
+            pending = stored.get('pending_stream_turn')
+        check(pending is None, "last streamed reply was saved to the session")
+        check(0 < len(history) < 2 * args.turns,
+              f"stored history is windowed: {len(history)} of {2 * args.turns} messages")
+        roles = [message['role'] for message in history]
+        check(roles == ['user', 'assistant'] * (len(roles) // 2),
+              "stored history alternates user/assistant, ending on a reply")
+        check(bool(history) and history[-2]['content'].startswith(f"Question {args.turns - 1}:"),
+              "stored history ends with the latest turn")
+
+        deadline = time.monotonic() + SUMMARY_WAIT
+        while not conversation.get_summary(conversation_id) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        check(bool(conversation.get_summary(conversation_id)), "dropped turns were summarized")
+
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            response = client.post('/chat', json={'user_input': "One more question?", 'stream': True})
+            response.get_data()
+            response.close()
+        body = last_chat_request(standin)
+        check(body is not None and SUMMARY_HEADING in system_text(body),
+              "the next request to Claude carries the summary section")
+    finally:
+        standin.shutdown()
+
+    print(f"\n{len(failures)} check(s) failed" if failures else "\nAll checks passed")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
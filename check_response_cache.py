@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Check which questions the first-turn response cache treats as the same.
+
+Fills a utils.response_cache.ResponseCache with a few answers, then checks that
+rewordings reuse them and that questions asking something different do not:
+other interrogatives, negations, other numbers or one other content word.
+
+    python check_response_cache.py
+
+Exits non-zero if a check fails.
+"""
+
+import sys
+import logging
+
+from utils.response_cache import ResponseCache
+
+VERSION = 'check'
+
+CACHED = [
+    "Does Brooks like fishing?",
+    "What projects did Brooks work on at his job in 2019?",
+    "What kind of music does Brooks listen to when he runs?",
+    "Who is he?",
+    "What does Brooks do?",
+    "What are Brooks' hobbies?",
+    "What does Brooks do for work?",
+]
+
+# (question, the cached question it should reuse, or None for a miss)
+EXPECTED = [
+    ("does brooks like fishing", "Does Brooks like fishing?"),
+    ("what does the Brooks do please", "What does Brooks do?"),
+    ("Hey, what are Brooks hobbies?", "What are Brooks' hobbies?"),
+    ("So what does Brooks do for work?", "What does Brooks do for work?"),
+    ("Does Brooks not like fishing?", None),
+    ("Doesn't Brooks like fishing?", None),
+    ("What projects did Brooks work on at his job in 2020?", None),
+    ("What kind of music does Brooks listen to when he cooks?", None),
+    ("Where is he?", None),
+    ("Who is Brooks?", None),
+]
+
+
+def main():
+    logging.disable(logging.WARNING)
+    cache = ResponseCache(similarity=0.8)
+    for question in CACHED:
+        cache.put(question, VERSION, question)
+
+    failures = []
+    for question, expected in EXPECTED:
+        answer = cache.get(question, VERSION)
+        ok = answer == expected
+        outcome = f"reuses {answer!r}" if answer else "misses"
+        print(f"{'ok  ' if ok else 'FAIL'} {question!r} {outcome}")
+        if not ok:
+            failures.append(question)
+
+    print(f"\n{len(failures)} check(s) failed" if failures else "\nAll checks passed")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -311,6 +311,84 @@ def generate_database(existing_photos=[]):
     return photos
 
 
+# Module code written around the PHOTOS list
+DATABASE_HEADER = '''import os
+import urllib.parse
+
+from utils.s3_utils import s3_image_url
+from utils.photo_index import PhotoIndex
+from utils.photo_vectors import get_photo_vectors, warm_photo_vectors
+
+# "semantic" ranks photos by TF-IDF similarity (needs NumPy); default is BM25
+SEARCH_MODE = os.environ.get('PHOTO_SEARCH_MODE', 'bm25').lower()
+
+
+def url_encode_dict_keys(photos_list):
+    """URL encode the id and filename keys in each photo dictionary"""
+    for photo in photos_list:
+        # URL encode the id and filename
+        photo["id"] = urllib.parse.quote(photo["id"])
+        photo["filename"] = urllib.parse.quote(photo["filename"])
+    return photos_list
+
+
+def build_photo_urls(photos_list, bucket_name=None):
+    """Map each (URL encoded) filename to its public S3 URL; empty without a bucket"""
+    bucket_name = bucket_name or os.environ.get('AWS_S3_BUCKET')
+    if not bucket_name:
+        return {}
+    return {photo["filename"]: s3_image_url(bucket_name, f"images/{photo['filename']}")
+            for photo in photos_list}
+
+
+'''
+
+DATABASE_FOOTER = '''
+def search_photos(query, limit=3):
+    """
+    Search photos by query string matching against descriptions and tags
+
+    Args:
+        query (str): The search query
+        limit (int): Maximum number of results to return
+
+    Returns:
+        list: Matching photo objects
+    """
+    if SEARCH_MODE == 'semantic':
+        vectors = get_photo_vectors(PHOTOS)
+        if vectors is not None:
+            return vectors.search(query, limit)
+    return PHOTO_INDEX.search(query, limit)
+
+
+def get_photos_by_category(category, limit=3):
+    """Get photos filtered by category"""
+    return [photo for photo in PHOTOS if photo["category"].lower() ==
+            category.lower()][:limit]
+
+
+def get_all_categories():
+    """Get list of all unique categories"""
+    return list(set(photo["category"] for photo in PHOTOS))
+
+
+# Apply URL encoding to all photo IDs and filenames
+PHOTOS = url_encode_dict_keys(PHOTOS)
+
+# BM25 inverted index used by search_photos, built once at import
+PHOTO_INDEX = PhotoIndex(PHOTOS)
+
+# Public S3 URL of every photo, computed once so chat turns do no S3 work
+PHOTO_URLS = build_photo_urls(PHOTOS)
+
+# Semantic search vectors load (or build) in the background from startup;
+# searches use BM25 until they are ready
+if SEARCH_MODE == 'semantic':
+    warm_photo_vectors(PHOTOS)
+'''
+
+
 def write_database_file(photos):
     """Write the database file with the photo information"""
     with open(OUTPUT_FILE, 'w') as f:
@@ -319,6 +397,8 @@ def write_database_file(photos):
             f"# Generated on {
                 datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
 
+        f.write(DATABASE_HEADER)
+
         f.write("PHOTOS = [\n")
 
         for photo in photos:
@@ -344,76 +424,25 @@ def write_database_file(photos):
 
         f.write("]\n\n")
 
-        # Fix for the triple quotes issue - replace these lines in the script:
-
-        # Add search functions
-        f.write('''
-        def search_photos(query, limit=3):
-            """
-            Search photos by query string matching against descriptions and tags
-
-            Args:
-                query (str): The search query
-                limit (int): Maximum number of results to return
-
-            Returns:
-                list: Matching photo objects
-            """
-            query = query.lower()
-            results = []
-
-            # Break the query into individual words for better matching
-            query_terms = query.split()
-
-            # Score each photo based on how well it matches the query
-            scored_photos = []
-            for photo in PHOTOS:
-                score = 0
-
-                # Check description
-                desc_lower = photo["description"].lower()
-                for term in query_terms:
-                    if term in desc_lower:
-                        score += 3  # Higher weight for description matches
-
-                # Check title
-                title_lower = photo["title"].lower()
-                for term in query_terms:
-                    if term in title_lower:
-                        score += 5  # Highest weight for title matches
-
-                # Check tags
-                for tag in photo["tags"]:
-                    for term in query_terms:
-                        if term in tag.lower():
-                            score += 2  # Medium weight for tag matches
-
-                # Check category
-                if any(term in photo["category"].lower() for term in query_terms):
-                    score += 4  # High weight for category matches
-
-                # Add to results if there's any match
-                if score > 0:
-                    scored_photos.append((score, photo))
-
-            # Sort by score (highest first) and take top results
-            scored_photos.sort(reverse=True, key=lambda x: x[0])
-            results = [photo for score, photo in scored_photos[:limit]]
-
-            return results
-
-        def get_photos_by_category(category, limit=3):
-            """Get photos filtered by category"""
-            return [photo for photo in PHOTOS if photo["category"].lower() == category.lower()][:limit]
-
-        def get_all_categories():
-            """Get list of all unique categories"""
-            return list(set(photo["category"] for photo in PHOTOS))
-        ''')
+        # Add search functions; the BM25 index is built when the module loads
+        f.write(DATABASE_FOOTER)
 
     print(f"Generated {OUTPUT_FILE} with {len(photos)} photos")
 
 
+def write_photo_vectors():
+    """Save the TF-IDF matrix used by semantic photo search, if NumPy is installed"""
+    from utils import photo_vectors
+    if photo_vectors.np is None:
+        print("Skipping photo vectors: NumPy is not installed")
+        return
+
+    photos = load_existing_database()
+    matrix, idf = photo_vectors.build_vectors(photos)
+    photo_vectors.save_vectors(photos, matrix, idf)
+    print(f"Saved {len(photos)} photo vectors to {photo_vectors.VECTORS_FILE}")
+
+
 def main():
     print("Starting improved photo database generator...")
 
@@ -442,6 +471,7 @@ def main():
 
     print(f"Found {len(photos)} photos total")
     write_database_file(photos)
+    write_photo_vectors()
 
     print("\nDone! The database has been updated.")
     print("\nTips for further improvement:")
@@ -89,39 +89,11 @@ def setup_mongodb():
         db = client.aboutBrooks
         logger.info("Using 'aboutBrooks' database")
         
-        # Create collections and indexes
-        
-        # Users collection
-        logger.info("Setting up 'users' collection...")
-        db.users.create_index("user_id", unique=True)
-        logger.info("Created unique index on users.user_id")
-        
-        # Platform tokens collection
-        logger.info("Setting up 'platform_tokens' collection...")
-        db.platform_tokens.create_index([("user_id", 1), ("platform", 1)], unique=True)
-        logger.info("Created compound index on platform_tokens.user_id and platform_tokens.platform")
-        
-        # Platform data collections
-        for collection_name in ['youtube_data', 'spotify_data', 'reddit_data', 'discord_data']:
-            logger.info(f"Setting up '{collection_name}' collection...")
-            db[collection_name].create_index("user_id", unique=True)
-            logger.info(f"Created unique index on {collection_name}.user_id")
-        
-        # Chat interactions collection
-        logger.info("Setting up 'chat_interactions' collection...")
-        db.chat_interactions.create_index([("user_id", 1), ("timestamp", -1)])
-        logger.info("Created compound index on chat_interactions.user_id and chat_interactions.timestamp")
-        
-        # Add TTL index for automatic data cleanup
-        logger.info("Setting up TTL indexes for data retention...")
-        
-        # Users inactive for more than 90 days
-        db.users.create_index("last_seen", expireAfterSeconds=7776000)  # 90 days
-        logger.info("Created TTL index on users.last_seen (90 days)")
-        
-        # Chat interactions older than 30 days
-        db.chat_interactions.create_index("timestamp", expireAfterSeconds=2592000)  # 30 days
-        logger.info("Created TTL index on chat_interactions.timestamp (30 days)")
+        # Create collections and indexes through the versioned migrations
+        from utils.migrations import apply_pending, applied_version
+        for m in apply_pending(db):
+            logger.info(f"Applied migration {m.version}: {m.name}")
+        logger.info(f"Schema is at version {applied_version(db)}")
         
         logger.info("MongoDB setup completed successfully!")
         return True
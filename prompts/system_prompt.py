@@ -1,3 +1,10 @@
+import hashlib
+import importlib
+import os
+import re
+import threading
+from typing import NamedTuple
+
 def get_system_prompt(profile):
     """
     Generates a system prompt for Claude based on the personal profile
@@ -145,4 +152,120 @@ No matches? Skip the photo talk.
 You're here to make Brooks a star and spark real bonds. Hook 'em with humor, hold 'em with heart—like a party host who's all charm and all ears!
 """
 
-    return system_prompt
\ No newline at end of file
+    return system_prompt
+
+
+def enrich_profile(profile, investment_philosophy):
+    """
+    Merge the investment philosophy into a copy of the personal profile
+
+    Maps core_principles to the key_principles names that get_system_prompt expects.
+
+    Args:
+        profile: The PERSONAL_PROFILE dictionary
+        investment_philosophy: The INVESTMENT_PHILOSOPHY dictionary
+
+    Returns:
+        dict: A new profile dictionary with an investment_philosophy entry
+    """
+    enriched_profile = profile.copy()
+    inv_phil = investment_philosophy.copy()
+    if "core_principles" in inv_phil:
+        inv_phil["key_principles"] = [p["name"] for p in inv_phil["core_principles"]]
+    enriched_profile["investment_philosophy"] = inv_phil
+    return enriched_profile
+
+
+def normalize_whitespace(text):
+    """Strip trailing spaces and collapse runs of blank lines in a prompt"""
+    lines = [line.rstrip() for line in text.strip().splitlines()]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines))
+
+
+class CompiledPrompt(NamedTuple):
+    """The static part of the system prompt, built once and shared by every request"""
+    text: str
+    version: str
+
+
+def compile_system_prompt(profile):
+    """
+    Build the immutable, whitespace-normalized base prompt for a profile
+
+    Args:
+        profile: Enriched profile dictionary (see enrich_profile)
+
+    Returns:
+        CompiledPrompt: The prompt text and a short content hash of it
+    """
+    text = normalize_whitespace(get_system_prompt(profile))
+    version = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+    return CompiledPrompt(text=text, version=version)
+
+
+# Modules whose contents feed the base prompt
+_PROFILE_MODULES = ("utils.personal_profile", "utils.investment_philosophy")
+
+_base_prompt = None
+_base_prompt_fingerprint = None
+_base_prompt_lock = threading.Lock()
+
+
+def _profile_fingerprint():
+    """Modification times of the profile module files"""
+    fingerprint = []
+    for module_name in _PROFILE_MODULES:
+        module = importlib.import_module(module_name)
+        try:
+            fingerprint.append(os.stat(module.__file__).st_mtime_ns)
+        except (OSError, TypeError):
+            fingerprint.append(None)
+    return tuple(fingerprint)
+
+
+def get_base_prompt():
+    """
+    Get the compiled base system prompt
+
+    The prompt is compiled on first use and only rebuilt when one of the
+    profile modules changes on disk, so a normal request costs one stat per module.
+
+    Returns:
+        CompiledPrompt: The shared base prompt
+    """
+    global _base_prompt, _base_prompt_fingerprint
+
+    fingerprint = _profile_fingerprint()
+    if _base_prompt is not None and fingerprint == _base_prompt_fingerprint:
+        return _base_prompt
+
+    with _base_prompt_lock:
+        if _base_prompt is not None and fingerprint == _base_prompt_fingerprint:
+            return _base_prompt
+
+        personal_profile = importlib.import_module("utils.personal_profile")
+        investment_philosophy = importlib.import_module("utils.investment_philosophy")
+        if _base_prompt is not None:
+            # A profile module was edited since the last build
+            personal_profile = importlib.reload(personal_profile)
+            investment_philosophy = importlib.reload(investment_philosophy)
+
+        profile = enrich_profile(personal_profile.PERSONAL_PROFILE,
+                                 investment_philosophy.INVESTMENT_PHILOSOPHY)
+        _base_prompt = compile_system_prompt(profile)
+        _base_prompt_fingerprint = _profile_fingerprint()
+        return _base_prompt
+
+
+def get_profile():
+    """
+    Get the current personal profile
+
+    Goes through get_base_prompt, so the profile is reloaded together with the
+    prompt and every endpoint sees the same version of it.
+
+    Returns:
+        dict: PERSONAL_PROFILE as of the current base prompt
+    """
+    get_base_prompt()
+    return importlib.import_module("utils.personal_profile").PERSONAL_PROFILE
@@ -482,27 +482,54 @@ document.addEventListener('DOMContentLoaded', function() {
             console.log("Including user data in request:", userData);
         }
         
+        // Partial reply shown while tokens are streaming in
+        let streamingMessage = null;
+        
         // Try the API routes in order with user data - first try the primary /chat endpoint
         fetch('/chat', {
             method: 'POST',
             headers: {
-                'Content-Type': 'application/json'
+                'Content-Type': 'application/json',
+                'Accept': 'text/event-stream, application/json'
             },
             body: JSON.stringify({ 
                 user_input: message,
-                user_data: userData
+                user_data: userData,
+                stream: true
             })
         })
         .then(response => {
+            if (response.status === 429 || response.status === 503) {
+                // Shed by the server: show its message rather than adding load via the fallback
+                console.log(`Chat request shed (${response.status}), retry after ${response.headers.get('Retry-After')}s`);
+                return response.json();
+            }
             if (!response.ok) {
                 console.log(`Main chat endpoint failed with status: ${response.status}. Trying fallback...`);
                 // If main endpoint fails, try the simple-chat endpoint
                 return tryFallbackChat(message);
             }
+            // Short-circuit replies (like the welcome message) still come back as JSON
+            const contentType = response.headers.get('Content-Type') || '';
+            if (contentType.includes('text/event-stream') && response.body) {
+                return readChatStream(response, partialText => {
+                    if (!streamingMessage) {
+                        removeTypingIndicator();
+                        streamingMessage = addStreamingMessage();
+                    }
+                    streamingMessage.querySelector('.message-text').textContent = partialText;
+                    chatMessages.scrollTop = chatMessages.scrollHeight;
+                });
+            }
             return response.json();
         })
         .then(data => {
             removeTypingIndicator();
+            if (streamingMessage) {
+                // Swap the plain-text preview for the fully rendered message (photos, feedback)
+                streamingMessage.remove();
+                streamingMessage = null;
+            }
             if (data && data.response) {
                 addMessage(data.response, 'assistant');
             } else {
@@ -512,6 +539,9 @@ document.addEventListener('DOMContentLoaded', function() {
         .catch(error => {
             console.error('Error:', error);
             removeTypingIndicator();
+            if (streamingMessage) {
+                streamingMessage.remove();
+            }
             addMessage('Sorry, I encountered an error. Please try again or reset the conversation.', 'assistant');
         })
         .finally(() => {
@@ -520,6 +550,69 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
     
+    // Create an empty assistant message that is filled in as tokens stream in
+    function addStreamingMessage() {
+        const messageDiv = document.createElement('div');
+        messageDiv.classList.add('message', 'assistant-message');
+        const textContainer = document.createElement('div');
+        textContainer.className = 'message-text';
+        messageDiv.appendChild(textContainer);
+        chatMessages.appendChild(messageDiv);
+        chatMessages.scrollTop = chatMessages.scrollHeight;
+        return messageDiv;
+    }
+    
+    // Read server-sent events from a streaming /chat response
+    // Calls onDelta with the accumulated text and resolves with { response } when done
+    function readChatStream(response, onDelta) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let fullText = '';
+        let finalResponse = null;
+        
+        function handleEvent(rawEvent) {
+            let eventName = 'message';
+            let data = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event:')) {
+                    eventName = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    data += line.slice(5).trim();
+                }
+            });
+            if (!data) {
+                return;
+            }
+            const payload = JSON.parse(data);
+            if (eventName === 'delta') {
+                fullText += payload.text;
+                onDelta(fullText);
+            } else if (eventName === 'done') {
+                finalResponse = payload.response;
+            }
+        }
+        
+        function pump() {
+            return reader.read().then(({ done, value }) => {
+                if (value) {
+                    buffer += decoder.decode(value, { stream: true });
+                    let boundary;
+                    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                        handleEvent(buffer.slice(0, boundary));
+                        buffer = buffer.slice(boundary + 2);
+                    }
+                }
+                if (done) {
+                    return { response: finalResponse !== null ? finalResponse : fullText };
+                }
+                return pump();
+            });
+        }
+        
+        return pump();
+    }
+    
     // Fallback chat function that uses the simple-chat endpoint
     function tryFallbackChat(message) {
         console.log("Trying fallback chat endpoint...");
@@ -138,11 +138,11 @@ def insert_test_user():
         # Import pymongo and utils
         import pymongo
         from pymongo import MongoClient
-        from utils.db import get_db_client, users, add_user_interest
+        from utils.db import get_client, users, add_user_interest
         
         # Either use function from utils or create new connection
         try:
-            client = get_db_client()
+            client = get_client()
             if not client:
                 raise ValueError("Could not get database client from utils")
         except Exception:
@@ -0,0 +1,202 @@
+# utils/admission.py
+import os
+import math
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Tuple, Optional
+
+from utils import metrics
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Per-visitor token bucket: a sustained rate with room for a short burst
+VISITOR_RATE_PER_MINUTE = float(os.environ.get('CHAT_RATE_PER_MINUTE', 10))
+VISITOR_BURST = float(os.environ.get('CHAT_RATE_BURST', 5))
+MAX_TRACKED_VISITORS = 10000
+
+# Process-wide cap on chat requests waiting on Claude, with a short bounded queue
+MAX_IN_FLIGHT = int(os.environ.get('LLM_MAX_IN_FLIGHT', 8))
+MAX_QUEUED = int(os.environ.get('LLM_MAX_QUEUED', 16))
+QUEUE_TIMEOUT = float(os.environ.get('LLM_QUEUE_TIMEOUT', 5.0))
+# Separate cap on streams asgi.py relays on its event loop; they hold no thread
+STREAM_MAX_IN_FLIGHT = int(os.environ.get('ASGI_LLM_MAX_IN_FLIGHT', 400))
+# Retry-After sent when a request is shed for lack of capacity
+OVERLOAD_RETRY_AFTER = 5
+
+
+class AdmissionRejected(Exception):
+    """A request was shed; maps to an HTTP status with a Retry-After header"""
+
+    def __init__(self, status: int, retry_after: float, reason: str):
+        super().__init__(reason)
+        self.status = status
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.reason = reason
+
+
+class RateLimiter:
+    """
+    Token bucket per key
+
+    Each key gets `burst` tokens, refilled at `rate_per_minute`; a request
+    spends one. Idle buckets beyond max_keys are dropped oldest first, which
+    only ever gives a visitor a fresh (full) bucket.
+    """
+
+    def __init__(self, rate_per_minute: float = VISITOR_RATE_PER_MINUTE, burst: float = VISITOR_BURST,
+                 max_keys: int = MAX_TRACKED_VISITORS):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str) -> Tuple[bool, float]:
+        """
+        Returns:
+            tuple: (allowed, seconds until the next token if not allowed)
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        if allowed:
+            return True, 0.0
+        return False, (1 - tokens) / self.rate if self.rate else float(OVERLOAD_RETRY_AFTER)
+
+
+class ConcurrencyLimiter:
+    """
+    Cap on concurrent work with a bounded wait queue
+
+    acquire() takes a slot if one is free, otherwise waits up to timeout
+    seconds in the queue. When the queue is already full the caller is
+    turned away immediately instead of piling up behind it.
+    """
+
+    def __init__(self, max_in_flight: int = MAX_IN_FLIGHT, max_queued: int = MAX_QUEUED,
+                 timeout: float = QUEUE_TIMEOUT):
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self._in_flight = 0
+        self._queued = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> bool:
+        with self._cond:
+            if self._in_flight < self.max_in_flight:
+                self._in_flight += 1
+                return True
+            if self._queued >= self.max_queued:
+                return False
+            self._queued += 1
+            deadline = time.monotonic() + self.timeout
+            try:
+                while self._in_flight >= self.max_in_flight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+                self._in_flight += 1
+                return True
+            finally:
+                self._queued -= 1
+
+    def release(self) -> None:
+        with self._cond:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._cond.notify()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                'in_flight': self._in_flight,
+                'queued': self._queued,
+                'max_in_flight': self.max_in_flight,
+                'max_queued': self.max_queued
+            }
+
+
+visitor_limiter = RateLimiter()
+llm_slots = ConcurrencyLimiter()
+# Never queued: a stream that finds these full stays on its thread
+stream_slots = ConcurrencyLimiter(max_in_flight=STREAM_MAX_IN_FLIGHT, max_queued=0)
+
+
+class Admission:
+    """A held in-flight slot; release() is safe to call more than once"""
+
+    def __init__(self, limiter: ConcurrencyLimiter):
+        self._limiter = limiter
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self) -> None:
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._limiter.release()
+
+
+def admit(endpoint: str, visitor: str) -> Admission:
+    """
+    Admit a chat request or shed it
+
+    Args:
+        endpoint: Name used for metrics, e.g. 'chat'
+        visitor: get_user_identifier hash of the caller
+
+    Returns:
+        Admission: The slot to release once the response has been sent
+
+    Raises:
+        AdmissionRejected: 429 when the visitor is over their rate, 503 when
+            the process is at capacity
+    """
+    allowed, retry_after = visitor_limiter.acquire(visitor)
+    if not allowed:
+        metrics.increment('chat_shed_total', endpoint=endpoint, reason='rate_limited')
+        raise AdmissionRejected(429, retry_after, 'rate_limited')
+    if not llm_slots.acquire():
+        metrics.increment('chat_shed_total', endpoint=endpoint, reason='overloaded')
+        logger.warning(f"{endpoint}: shedding request, {llm_slots.max_in_flight} calls in flight")
+        raise AdmissionRejected(503, OVERLOAD_RETRY_AFTER, 'overloaded')
+    metrics.increment('chat_admitted_total', endpoint=endpoint)
+    return Admission(llm_slots)
+
+
+def hand_off(admission: Optional[Admission]) -> Optional[Admission]:
+    """
+    Trade a request's llm_slots slot for a stream_slots one, for a stream the event loop takes over
+
+    Returns:
+        Admission: The stream slot, or None when stream_slots is full and the
+            request keeps its thread slot
+    """
+    if not stream_slots.acquire():
+        return None
+    if admission is not None:
+        admission.release()
+    return Admission(stream_slots)
+
+
+def get_admission_stats() -> Dict[str, Any]:
+    """Current load and shed counts per endpoint"""
+    endpoints = {}
+    for entry in metrics.get_counters('chat_admitted_total'):
+        endpoints.setdefault(entry['labels'].get('endpoint'), {})['admitted'] = int(entry['value'])
+    for entry in metrics.get_counters('chat_shed_total'):
+        labels = entry['labels']
+        endpoints.setdefault(labels.get('endpoint'), {})[labels.get('reason')] = int(entry['value'])
+    return {'slots': llm_slots.snapshot(), 'stream_slots': stream_slots.snapshot(), 'endpoints': endpoints}
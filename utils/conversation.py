@@ -0,0 +1,247 @@
+# utils/conversation.py
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Tuple, Optional
+
+from utils.db import store_conversation_summary, get_conversation_summary
+from utils.llm import create_message
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Total input tokens we are willing to send for one chat turn
+INPUT_TOKEN_BUDGET = int(os.environ.get('CHAT_INPUT_TOKEN_BUDGET', 12000))
+
+# Fixed allowances reserved out of the budget for the prompt sections;
+# per-request sections are clipped to their allowance
+SECTION_ALLOWANCES = {
+    'system_prompt': 3000,
+    'photo_context': 600,
+    'user_interests': 300,
+    'social_data': 400,
+    'conversation_summary': 500,
+}
+
+# Rough chars-per-token ratio for English text with Claude's tokenizer
+CHARS_PER_TOKEN = 4
+# Role markers and formatting around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a string without calling the API"""
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    """
+    Token estimate for one history entry, cached on the entry itself
+
+    Session history entries are plain dicts, so the count is stored under
+    'tokens' and survives in the session until the content changes.
+    """
+    content = message.get('content', '')
+    if not isinstance(content, str):
+        content = " ".join(block.get('text', '') for block in content if isinstance(block, dict))
+    cached = message.get('tokens')
+    if cached is not None and message.get('chars') == len(content):
+        return cached
+    tokens = estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+    message['tokens'] = tokens
+    message['chars'] = len(content)
+    return tokens
+
+
+def clip_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut a prompt section down to roughly max_tokens"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    clipped = text[:max_tokens * CHARS_PER_TOKEN]
+    # Prefer to end on a whole line
+    if '\n' in clipped:
+        clipped = clipped[:clipped.rfind('\n')]
+    return clipped + "\n"
+
+
+def history_budget(user_input: str = "", reserved_tokens: int = 0) -> int:
+    """Tokens left for past turns after the fixed allowances and the new message"""
+    fixed = sum(SECTION_ALLOWANCES.values()) + reserved_tokens
+    return max(0, INPUT_TOKEN_BUDGET - fixed - estimate_tokens(user_input) - MESSAGE_OVERHEAD_TOKENS)
+
+
+def window_history(history: List[Dict[str, Any]], max_tokens: int) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Keep the most recent turns that fit in a token budget
+
+    The window always starts on a user message so the conversation sent to
+    the API keeps alternating roles.
+
+    Args:
+        history: Session history entries, oldest first
+        max_tokens: Token budget for the kept turns
+
+    Returns:
+        tuple: (kept entries, dropped older entries)
+    """
+    used = 0
+    start = len(history)
+    for index in range(len(history) - 1, -1, -1):
+        used += message_tokens(history[index])
+        if used > max_tokens:
+            break
+        start = index
+
+    while start < len(history) and history[start].get('role') != 'user':
+        start += 1
+
+    if start:
+        logger.debug(f"History window keeps {len(history) - start} of {len(history)} messages")
+    return history[start:], history[:start]
+
+
+# Rolling summaries of turns that fell out of the window. Summaries are
+# written after the response has gone out, when the cookie session can no
+# longer change, so they live here (and in MongoDB) keyed by conversation.
+SUMMARY_MODEL = os.environ.get('SUMMARY_MODEL', 'claude-3-5-haiku-20241022')
+MAX_CACHED_SUMMARIES = 1000
+
+_summaries = OrderedDict()
+_summaries_lock = threading.Lock()
+_conversation_locks: Dict[str, threading.Lock] = {}
+_summary_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='history-summary')
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a chat between a website visitor and Brooks' AI assistant. "
+    "Fold the new messages into the existing summary. Keep facts the visitor shared about "
+    "themselves, questions they asked and what they were told. Write plain prose, at most "
+    "{max_words} words, with no preamble."
+)
+
+
+def _format_turns(messages: List[Dict[str, Any]]) -> str:
+    lines = []
+    for message in messages:
+        speaker = "Visitor" if message.get('role') == 'user' else "Assistant"
+        lines.append(f"{speaker}: {message.get('content', '')}")
+    return "\n".join(lines)
+
+
+def _fallback_summary(previous: str, messages: List[Dict[str, Any]], max_tokens: int) -> str:
+    """Keep the visitor's own words when the model is unavailable"""
+    asked = [message.get('content', '')[:200] for message in messages if message.get('role') == 'user']
+    text = (previous + "\n" if previous else "") + "Earlier the visitor said: " + " | ".join(asked)
+    # Drop the oldest text first
+    limit = max_tokens * CHARS_PER_TOKEN
+    return text[-limit:] if len(text) > limit else text
+
+
+def summarize_turns(client, previous: str, messages: List[Dict[str, Any]]) -> str:
+    """
+    Fold dropped turns into the previous summary
+
+    Args:
+        client: Anthropic client, or None to use the extractive fallback
+        previous: The summary so far ("" for the first compaction)
+        messages: History entries that just left the window
+
+    Returns:
+        str: The updated summary
+    """
+    max_tokens = SECTION_ALLOWANCES['conversation_summary']
+    if client is None:
+        return _fallback_summary(previous, messages, max_tokens)
+    try:
+        response = create_message(
+            client, 'history_summary',
+            model=SUMMARY_MODEL,
+            system=SUMMARY_INSTRUCTIONS.format(max_words=int(max_tokens * 0.6)),
+            messages=[{
+                "role": "user",
+                "content": f"Existing summary:\n{previous or '(none)'}\n\nNew messages:\n{_format_turns(messages)}"
+            }],
+            max_tokens=max_tokens,
+            temperature=0
+        )
+        text = "".join(getattr(block, 'text', '') for block in response.content).strip()
+        return text or _fallback_summary(previous, messages, max_tokens)
+    except Exception as e:
+        logger.error(f"Error summarizing conversation history: {str(e)}")
+        return _fallback_summary(previous, messages, max_tokens)
+
+
+def _remember(conversation_id: str, entry: Dict[str, Any]) -> None:
+    with _summaries_lock:
+        _summaries[conversation_id] = entry
+        _summaries.move_to_end(conversation_id)
+        while len(_summaries) > MAX_CACHED_SUMMARIES:
+            evicted, _ = _summaries.popitem(last=False)
+            lock = _conversation_locks.get(evicted)
+            if lock is not None and not lock.locked():
+                del _conversation_locks[evicted]
+
+
+def _forget(conversation_id: str) -> None:
+    with _summaries_lock:
+        _summaries.pop(conversation_id, None)
+
+
+def get_summary(conversation_id: Optional[str]) -> str:
+    """The rolling summary for a conversation, from memory or MongoDB"""
+    if not conversation_id:
+        return ""
+    with _summaries_lock:
+        entry = _summaries.get(conversation_id)
+    if entry is None:
+        doc = get_conversation_summary(conversation_id)
+        # Most conversations never get a summary; remember that too so each
+        # turn does not go back to MongoDB to find out again
+        entry = {'summary': '', 'summarized_messages': 0}
+        if doc:
+            entry = {'summary': doc.get('summary', ''), 'summarized_messages': doc.get('summarized_messages', 0)}
+        _remember(conversation_id, entry)
+    return entry['summary']
+
+
+def _compact(client, conversation_id: str, user_id: str, dropped: List[Dict[str, Any]]) -> None:
+    with _summaries_lock:
+        lock = _conversation_locks.setdefault(conversation_id, threading.Lock())
+    # One compaction at a time per conversation so no dropped turns are lost
+    with lock:
+        started = time.time()
+        with _summaries_lock:
+            entry = _summaries.get(conversation_id) or {'summary': '', 'summarized_messages': 0}
+        # Another worker may have compacted this conversation since it was
+        # cached here; build on whichever summary covers more turns
+        doc = get_conversation_summary(conversation_id)
+        if doc and doc.get('summarized_messages', 0) >= entry['summarized_messages']:
+            entry = {'summary': doc.get('summary', ''), 'summarized_messages': doc.get('summarized_messages', 0)}
+        summary = summarize_turns(client, entry['summary'], dropped)
+        entry = {'summary': summary, 'summarized_messages': entry['summarized_messages'] + len(dropped)}
+        if store_conversation_summary(conversation_id, user_id, summary, entry['summarized_messages']):
+            _remember(conversation_id, entry)
+        else:
+            # A newer summary was stored meanwhile (or the write failed); read it next turn
+            _forget(conversation_id)
+        logger.debug(f"Compacted {len(dropped)} messages for {conversation_id[:8]} in {time.time() - started:.2f}s")
+
+
+def schedule_compaction(client, conversation_id: str, user_id: str, dropped: List[Dict[str, Any]]) -> None:
+    """Summarize dropped turns in the background; never blocks the caller"""
+    if not dropped or not conversation_id:
+        return
+    messages = [{'role': message.get('role'), 'content': message.get('content', '')} for message in dropped]
+    _summary_pool.submit(_compact, client, conversation_id, user_id, messages)
+
+
+def summary_section(summary: str) -> str:
+    """Prompt section carrying the rolling summary"""
+    if not summary:
+        return ""
+    summary = clip_to_tokens(summary, SECTION_ALLOWANCES['conversation_summary'])
+    return f"\n\n# Earlier In This Conversation\n{summary}\n"
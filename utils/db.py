@@ -1,120 +1,76 @@
 # utils/db.py
 import os
 import logging
-from pymongo import MongoClient, errors
-from dotenv import load_dotenv
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import DuplicateKeyError
 import datetime
 import hashlib
-import json
+import threading
+import time
+from collections import OrderedDict
 from flask import request
 
+from utils import mongo, migrations, memory_store, metrics
+from utils.lazy import Lazy, LazyProxy
+from utils.write_behind import WriteBehindQueue
+
 # Set up logging
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-# Load environment variables
-load_dotenv()
-
 # Get MongoDB URI from environment variable
-MONGO_URI = os.environ.get('MONGO_URI')
+MONGO_URI = mongo.MONGO_URI
 
-# Database connection handling with error recovery
-def get_db_client():
-    """Get MongoDB client with connection retry logic"""
-    try:
-        # Create a MongoDB client with connection timeout
-        client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
-        # Check connection by listing server info
-        client.server_info()
-        logger.info("Successfully connected to MongoDB Atlas")
-        return client
-    except errors.ServerSelectionTimeoutError:
-        logger.error("Could not connect to MongoDB Atlas - connection timeout")
-        return None
-    except errors.ConfigurationError:
-        logger.error("MongoDB Atlas configuration error - check connection string")
-        return None
-    except Exception as e:
-        logger.error(f"Unexpected MongoDB connection error: {str(e)}")
-        return None
 
-# Create a MongoDB client
-client = get_db_client()
-
-# Initialize database and collections if connection successful
-if client:
-    # Get database
-    db = client.aboutBrooks
-
-    # Collection references
-    users = db.users
-    platform_tokens = db.platform_tokens
-    youtube_data = db.youtube_data
-    spotify_data = db.spotify_data
-    reddit_data = db.reddit_data
-    discord_data = db.discord_data
-    chat_interactions = db.chat_interactions
-    
-    # Create indexes for better query performance
-    try:
-        # Create unique index on user_id for users collection
-        users.create_index("user_id", unique=True)
-        
-        # Compound index for platform tokens
-        platform_tokens.create_index([("user_id", 1), ("platform", 1)], unique=True)
-        
-        # Indexes for platform-specific collections
-        youtube_data.create_index("user_id", unique=True)
-        spotify_data.create_index("user_id", unique=True)
-        reddit_data.create_index("user_id", unique=True)
-        discord_data.create_index("user_id", unique=True)
-        
-        # Index for chat interactions
-        chat_interactions.create_index([("user_id", 1), ("timestamp", -1)])
-        
-        logger.info("MongoDB indexes created successfully")
-    except Exception as e:
-        logger.error(f"Error creating MongoDB indexes: {str(e)}")
-else:
-    # Define dummy collections for graceful degradation
-    # This allows the application to run even if MongoDB is unavailable
-    logger.warning("Using in-memory fallback for database collections")
-    
-    class DummyCollection:
-        """Mock collection that logs operations but doesn't persist data"""
-        def __init__(self, name):
-            self.name = name
-            self.data = []
-        
-        def insert_one(self, document):
-            logger.info(f"[MOCK DB] Would insert into {self.name}: {json.dumps(document, default=str)[:100]}...")
-            return type('obj', (object,), {'inserted_id': 'mock_id'})
-        
-        def find_one(self, query):
-            logger.info(f"[MOCK DB] Would query {self.name}: {json.dumps(query, default=str)}")
-            return None
-        
-        def update_one(self, query, update, upsert=False):
-            logger.info(f"[MOCK DB] Would update in {self.name}: {json.dumps(query, default=str)} → {json.dumps(update, default=str)[:100]}...")
-            return type('obj', (object,), {'modified_count': 0})
-        
-        def create_index(self, keys, **kwargs):
-            if isinstance(keys, list):
-                key_str = ', '.join(f"{k[0]}: {k[1]}" for k in keys)
-            else:
-                key_str = keys
-            logger.info(f"[MOCK DB] Would create index on {self.name}: {key_str}")
-            return 'mock_index'
-    
-    # Create dummy collections
-    db = type('obj', (object,), {})
-    users = DummyCollection('users')
-    platform_tokens = DummyCollection('platform_tokens')
-    youtube_data = DummyCollection('youtube_data')
-    spotify_data = DummyCollection('spotify_data')
-    reddit_data = DummyCollection('reddit_data')
-    discord_data = DummyCollection('discord_data')
-    chat_interactions = DummyCollection('chat_interactions')
+def get_client():
+    """The shared MongoDB client, or None if Atlas could not be reached"""
+    return mongo.get_client()
+
+
+COLLECTION_NAMES = (
+    'users', 'platform_tokens', 'youtube_data', 'spotify_data', 'reddit_data',
+    'discord_data', 'chat_interactions', 'conversation_summaries'
+)
+
+
+def _open_database():
+    """Collections by name: Atlas if reachable, otherwise the in-memory store"""
+    client = get_client()
+    if not client:
+        # Degraded mode: reads, writes and analytics keep working on
+        # process-local data until the process restarts
+        logger.warning("MongoDB is unavailable; keeping data in memory for this process")
+        client = memory_store.get_client()
+
+    database = client[mongo.DATABASE_NAME]
+    if isinstance(client, memory_store.MemoryClient):
+        # A fresh in-memory store has no indexes yet; building them is instant
+        migrations.apply_pending(database)
+    else:
+        # Indexes are created by `python -m utils.migrations apply`; here we
+        # only check (once) that they have been
+        migrations.check_schema()
+    return {name: database[name] for name in COLLECTION_NAMES}
+
+
+_database = Lazy(_open_database)
+
+# The database itself (the in-memory store when Atlas is unreachable)
+db = LazyProxy(lambda: (get_client() or memory_store.get_client())[mongo.DATABASE_NAME])
+
+# Collection references; each connects on first use
+users = LazyProxy(lambda: _database.get()['users'])
+platform_tokens = LazyProxy(lambda: _database.get()['platform_tokens'])
+youtube_data = LazyProxy(lambda: _database.get()['youtube_data'])
+spotify_data = LazyProxy(lambda: _database.get()['spotify_data'])
+reddit_data = LazyProxy(lambda: _database.get()['reddit_data'])
+discord_data = LazyProxy(lambda: _database.get()['discord_data'])
+chat_interactions = LazyProxy(lambda: _database.get()['chat_interactions'])
+conversation_summaries = LazyProxy(lambda: _database.get()['conversation_summaries'])
+
+# Analytics-only writes (visit bumps, chat logs, feedback) are batched in the
+# background so requests never wait on Atlas write latency
+analytics_writes = WriteBehindQueue('analytics')
 
 # User identification functions
 def get_user_identifier(request_obj=None):
@@ -143,39 +99,82 @@ def get_user_identifier(request_obj=None):
     # Generate hash
     return hashlib.sha256(data.encode()).hexdigest()
 
+# Recently seen users, so repeat requests within the window skip the lookup.
+# Their visits are queued on analytics_writes rather than counted here, so
+# nothing is lost if the process is frozen or stopped.
+LAST_SEEN_COALESCE_SECONDS = int(os.environ.get('LAST_SEEN_COALESCE_SECONDS', 300))
+RECENT_USERS_MAX = int(os.environ.get('RECENT_USERS_MAX', 5000))
+_recent_users = OrderedDict()
+_recent_users_lock = threading.Lock()
+
+def _remember_user(user_id, user):
+    """Cache a user document, evicting the least recently seen"""
+    with _recent_users_lock:
+        _recent_users[user_id] = {'user': user, 'synced_at': time.monotonic()}
+        _recent_users.move_to_end(user_id)
+        while len(_recent_users) > RECENT_USERS_MAX:
+            _recent_users.popitem(last=False)
+
+def _cached_user(user_id):
+    """The cached document if it is still inside the coalescing window"""
+    with _recent_users_lock:
+        entry = _recent_users.get(user_id)
+        if entry is None or entry['user'] is None:
+            return None
+        if time.monotonic() - entry['synced_at'] > LAST_SEEN_COALESCE_SECONDS:
+            return None
+        _recent_users.move_to_end(user_id)
+        return entry['user']
+
+def _forget_user_document(user_id):
+    """Drop the cached document after its fields change"""
+    with _recent_users_lock:
+        entry = _recent_users.get(user_id)
+        if entry is not None:
+            entry['user'] = None
+
 def get_or_create_user(request_obj=None):
     """Get existing user or create new one"""
     user_id = get_user_identifier(request_obj)
     
+    # Seen recently: no round trip, the visit is batched by the write-behind queue
+    user = _cached_user(user_id)
+    if user is not None:
+        analytics_writes.enqueue(users, UpdateOne(
+            {'user_id': user_id},
+            {'$max': {'last_seen': datetime.datetime.now()}, '$inc': {'visit_count': 1}}
+        ))
+        return user_id, user
+    
     try:
-        # Try to find existing user
-        user = users.find_one({'user_id': user_id})
+        now = datetime.datetime.now()
+        new_fields = {
+            'user_id': user_id,
+            'first_seen': now,
+            'platforms': [],
+            'interests': [],
+            'referrer': request_obj.referrer if request_obj else None,
+            'is_mobile': _is_mobile_user_agent(request_obj.headers.get('User-Agent', '')) if request_obj else False
+        }
         
-        # If user doesn't exist, create new record
-        if not user:
-            logger.info(f"Creating new user record for {user_id[:8]}...")
-            user = {
-                'user_id': user_id,
-                'first_seen': datetime.datetime.now(),
-                'last_seen': datetime.datetime.now(),
-                'visit_count': 1,
-                'platforms': [],
-                'interests': [],
-                'referrer': request_obj.referrer if request_obj else None,
-                'is_mobile': _is_mobile_user_agent(request_obj.headers.get('User-Agent', '')) if request_obj else False
-            }
-            users.insert_one(user)
-        else:
-            # Update existing user's last seen time and visit count
-            logger.debug(f"Updating existing user record for {user_id[:8]}...")
-            users.update_one(
-                {'user_id': user_id},
-                {
-                    '$set': {'last_seen': datetime.datetime.now()},
-                    '$inc': {'visit_count': 1}
-                }
-            )
+        # One round trip: create the user if needed, bump last seen and visit count
+        user = users.find_one_and_update(
+            {'user_id': user_id},
+            {
+                '$setOnInsert': new_fields,
+                '$set': {'last_seen': now},
+                '$inc': {'visit_count': 1}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        if user is None:
+            # Database unavailable; hand back what the record would contain
+            user = {**new_fields, 'last_seen': now, 'visit_count': 1}
+        elif user.get('visit_count') == 1:
+            logger.info(f"Created new user record for {user_id[:8]}...")
         
+        _remember_user(user_id, user)
         return user_id, user
     except Exception as e:
         logger.error(f"Error in get_or_create_user: {str(e)}")
@@ -191,12 +190,6 @@ def _is_mobile_user_agent(user_agent):
 def store_platform_token(user_id, platform, token_data):
     """Store OAuth tokens securely"""
     try:
-        # Check if token for this platform already exists
-        existing = platform_tokens.find_one({
-            'user_id': user_id,
-            'platform': platform
-        })
-        
         # Prepare token document
         token_doc = {
             'user_id': user_id,
@@ -210,17 +203,18 @@ def store_platform_token(user_id, platform, token_data):
             {'user_id': user_id},
             {'$addToSet': {'platforms': platform}}
         )
+        _forget_user_document(user_id)
         
-        # Insert or update token
-        if existing:
-            platform_tokens.update_one(
-                {'_id': existing['_id']},
-                {'$set': token_doc}
-            )
-            logger.info(f"Updated token for user {user_id[:8]} on platform {platform}")
-        else:
-            platform_tokens.insert_one(token_doc)
+        # Insert or update token in a single upsert
+        result = platform_tokens.update_one(
+            {'user_id': user_id, 'platform': platform},
+            {'$set': token_doc},
+            upsert=True
+        )
+        if getattr(result, 'upserted_id', None) is not None:
             logger.info(f"Stored new token for user {user_id[:8]} on platform {platform}")
+        else:
+            logger.info(f"Updated token for user {user_id[:8]} on platform {platform}")
         
         return True
     except Exception as e:
@@ -243,7 +237,7 @@ def get_platform_token(user_id, platform):
 def get_connected_platforms(user_id):
     """Get list of platforms a user has connected"""
     try:
-        user = users.find_one({'user_id': user_id})
+        user = _cached_user(user_id) or users.find_one({'user_id': user_id}, {'platforms': 1})
         if user and 'platforms' in user:
             return user['platforms']
         return []
@@ -252,52 +246,59 @@ def get_connected_platforms(user_id):
         return []
 
 # User interest tracking
-def add_user_interest(user_id, interest, source_platform=None, confidence=1.0):
-    """Add an interest to user's profile with source and confidence score"""
-    try:
-        # Prepare interest entry
-        interest_entry = {
-            'topic': interest.lower().strip(),
-            'added_at': datetime.datetime.now(),
-            'source': source_platform,
-            'confidence': float(confidence)  # 0.0 to 1.0
-        }
-        
+def _interest_writes(user_id, interest, source_platform, confidence, added_at):
+    """Push a new interest, or raise the confidence of an existing one"""
+    topic = interest.lower().strip()
+    confidence = float(confidence)  # 0.0 to 1.0
+    return [
         # Add to user's interests array if not already present with same topic
-        result = users.update_one(
-            {
-                'user_id': user_id,
-                'interests.topic': {'$ne': interest_entry['topic']}
-            },
-            {'$push': {'interests': interest_entry}}
-        )
-        
+        UpdateOne(
+            {'user_id': user_id, 'interests.topic': {'$ne': topic}},
+            {'$push': {'interests': {
+                'topic': topic,
+                'added_at': added_at,
+                'source': source_platform,
+                'confidence': confidence
+            }}}
+        ),
         # If interest already exists, update its confidence if new confidence is higher
-        if result.modified_count == 0:
-            users.update_one(
-                {
-                    'user_id': user_id,
-                    'interests.topic': interest_entry['topic'],
-                    'interests.confidence': {'$lt': interest_entry['confidence']}
-                },
-                {
-                    '$set': {
-                        'interests.$.confidence': interest_entry['confidence'],
-                        'interests.$.source': source_platform,
-                        'interests.$.added_at': interest_entry['added_at']
-                    }
-                }
-            )
+        UpdateOne(
+            {'user_id': user_id, 'interests': {'$elemMatch': {'topic': topic, 'confidence': {'$lt': confidence}}}},
+            {'$set': {
+                'interests.$.confidence': confidence,
+                'interests.$.source': source_platform,
+                'interests.$.added_at': added_at
+            }}
+        )
+    ]
+
+def add_user_interests(user_id, interests, source_platform=None, confidence=1.0):
+    """Add several interests from one source in a single round trip"""
+    try:
+        if not interests:
+            return True
+        added_at = datetime.datetime.now()
+        writes = []
+        for interest in interests:
+            writes.extend(_interest_writes(user_id, interest, source_platform, confidence, added_at))
         
+        # Ordered, so each push lands before the matching confidence update
+        users.bulk_write(writes, ordered=True)
+        _forget_user_document(user_id)
         return True
     except Exception as e:
-        logger.error(f"Error adding user interest: {str(e)}")
+        logger.error(f"Error adding user interests: {str(e)}")
         return False
 
+def add_user_interest(user_id, interest, source_platform=None, confidence=1.0):
+    """Add an interest to user's profile with source and confidence score"""
+    return add_user_interests(user_id, [interest], source_platform, confidence)
+
 def get_user_interests(user_id, min_confidence=0.2, limit=10):
     """Get user's interests ordered by confidence score"""
     try:
-        user = users.find_one({'user_id': user_id})
+        # The document fetched by get_or_create_user this request is usually still cached
+        user = _cached_user(user_id) or users.find_one({'user_id': user_id}, {'interests': 1})
         if not user or 'interests' not in user:
             return []
         
@@ -315,31 +316,77 @@ def get_user_interests(user_id, min_confidence=0.2, limit=10):
 def log_chat_interaction(user_id, user_message, ai_response):
     """Log a chat interaction between user and AI"""
     try:
-        interaction = {
+        with metrics.timer('chat_stage_seconds', stage='mongo_log'):
+            interaction = {
+                'user_id': user_id,
+                'timestamp': datetime.datetime.now(),
+                'user_message': user_message,
+                'ai_response': ai_response,
+                'message_length': len(user_message),
+                'response_length': len(ai_response)
+            }
+            
+            queued = analytics_writes.insert(chat_interactions, interaction)
+        logger.debug(f"Queued chat interaction for user {user_id[:8]}")
+        return queued
+    except Exception as e:
+        logger.error(f"Error logging chat interaction: {str(e)}")
+        return False
+
+def log_feedback(user_id, message, feedback):
+    """Log thumbs up/down feedback on an AI message"""
+    try:
+        queued = analytics_writes.insert(chat_interactions, {
             'user_id': user_id,
             'timestamp': datetime.datetime.now(),
-            'user_message': user_message,
-            'ai_response': ai_response,
-            'message_length': len(user_message),
-            'response_length': len(ai_response)
-        }
-        
-        chat_interactions.insert_one(interaction)
-        logger.debug(f"Logged chat interaction for user {user_id[:8]}")
+            'message': message,
+            'feedback': feedback,
+            'type': 'feedback'
+        })
+        logger.debug(f"Queued feedback for user {user_id[:8]}")
+        return queued
+    except Exception as e:
+        logger.error(f"Error logging feedback: {str(e)}")
+        return False
+
+# Rolling conversation summaries
+def store_conversation_summary(conversation_id, user_id, summary, summarized_messages):
+    """Save the rolling summary of turns that fell out of the history window
+
+    Never replaces a stored summary that already covers as many messages, so
+    a worker building on an older summary cannot overwrite a newer one.
+    """
+    try:
+        conversation_summaries.update_one(
+            {'conversation_id': conversation_id, 'summarized_messages': {'$lt': summarized_messages}},
+            {'$set': {
+                'user_id': user_id,
+                'summary': summary,
+                'summarized_messages': summarized_messages,
+                'updated_at': datetime.datetime.now()
+            }},
+            upsert=True
+        )
         return True
+    except DuplicateKeyError:
+        # The filter missed because the stored summary is newer, and the
+        # upsert then hit the unique conversation_id index
+        logger.info(f"Kept newer stored summary for conversation {conversation_id[:8]}")
+        return False
     except Exception as e:
-        logger.error(f"Error logging chat interaction: {str(e)}")
+        logger.error(f"Error storing conversation summary: {str(e)}")
         return False
 
+def get_conversation_summary(conversation_id):
+    """Get the stored rolling summary for a conversation, if any"""
+    try:
+        doc = conversation_summaries.find_one({'conversation_id': conversation_id})
+        return doc if doc else None
+    except Exception as e:
+        logger.error(f"Error retrieving conversation summary: {str(e)}")
+        return None
+
 # Database health check
 def check_db_connection():
     """Verify database connection is working"""
-    if client is None:
-        return False
-    
-    try:
-        # Ping the database
-        client.admin.command('ping')
-        return True
-    except Exception:
-        return False
\ No newline at end of file
+    return mongo.ping()
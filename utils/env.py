@@ -0,0 +1,52 @@
+# utils/env.py
+import os
+import logging
+import threading
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+ENV_FILE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.env')
+
+# Result of the first load, None until then
+_loaded = None
+_lock = threading.Lock()
+
+
+def load_environment() -> bool:
+    """
+    Load the project's .env into os.environ, once per process
+
+    Variables already set in the environment win, as with python-dotenv. If
+    python-dotenv is not installed the file is parsed by hand.
+
+    Returns:
+        bool: True if any variables were read from the file
+    """
+    global _loaded
+    with _lock:
+        if _loaded is None:
+            _loaded = _read_env_file()
+        return _loaded
+
+
+def _read_env_file() -> bool:
+    if not os.path.exists(ENV_FILE_PATH):
+        logger.info(f"No .env file at {ENV_FILE_PATH}, using the process environment")
+        return False
+    try:
+        from dotenv import load_dotenv
+        return load_dotenv(dotenv_path=ENV_FILE_PATH)
+    except ImportError:
+        pass
+
+    loaded = False
+    with open(ENV_FILE_PATH, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#') or '=' not in line:
+                continue
+            key, value = line.split('=', 1)
+            os.environ.setdefault(key.strip(), value.strip().strip("'").strip('"'))
+            loaded = True
+    return loaded
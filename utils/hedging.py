@@ -0,0 +1,421 @@
+# utils/hedging.py
+import os
+import time
+import queue
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional
+
+from utils import metrics
+from utils.admission import MAX_IN_FLIGHT
+from utils.llm import SingleFlight, request_key, stream_message, async_stream_message, record_usage
+from utils.conversation import window_history
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+HEDGE_ENABLED = os.environ.get('LLM_HEDGE_ENABLED', 'true').lower() != 'false'
+HEDGE_MODEL = os.environ.get('LLM_HEDGE_MODEL', 'claude-3-5-haiku-20241022')
+# The hedge fires once the primary is slower to its first token than this
+# share of recent primary requests
+HEDGE_PERCENTILE = float(os.environ.get('LLM_HEDGE_PERCENTILE', 95))
+# Used until enough first-token latencies have been observed
+HEDGE_DEFAULT_DELAY = float(os.environ.get('LLM_HEDGE_DEFAULT_DELAY', 4.0))
+HEDGE_MIN_DELAY = float(os.environ.get('LLM_HEDGE_MIN_DELAY', 1.0))
+HEDGE_MAX_DELAY = float(os.environ.get('LLM_HEDGE_MAX_DELAY', 10.0))
+HEDGE_MIN_SAMPLES = 20
+# The hedge gets a trimmed prompt: recent history only and a shorter reply
+HEDGE_HISTORY_TOKENS = int(os.environ.get('LLM_HEDGE_HISTORY_TOKENS', 1500))
+HEDGE_MAX_TOKENS = int(os.environ.get('LLM_HEDGE_MAX_TOKENS', 1500))
+
+# Each admitted call holds up to two workers (primary and hedge), so the pool
+# never makes an admitted request queue; LLM_HEDGE_WORKERS can only raise it
+HEDGE_WORKERS = max(int(os.environ.get('LLM_HEDGE_WORKERS', 0)), 2 * MAX_IN_FLIGHT)
+_hedge_pool = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix='llm-hedge')
+
+STARTED = 'started'
+DELTA = 'delta'
+DONE = 'done'
+ERROR = 'error'
+
+
+class LatencyTracker:
+    """Rolling window of latencies with percentile lookups"""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """The p-th percentile (0-100), or None before HEDGE_MIN_SAMPLES samples"""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        index = min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))
+        return samples[index]
+
+
+primary_first_token = LatencyTracker()
+
+
+def hedge_delay() -> float:
+    """Seconds to wait for the primary's first token before hedging"""
+    observed = primary_first_token.percentile(HEDGE_PERCENTILE)
+    delay = HEDGE_DEFAULT_DELAY if observed is None else observed
+    return min(HEDGE_MAX_DELAY, max(HEDGE_MIN_DELAY, delay))
+
+
+def fallback_request(system, history: List[Dict[str, Any]], user_input: str) -> Dict[str, Any]:
+    """
+    Trimmed Messages API request for the hedge model
+
+    Args:
+        system: System prompt (string or content blocks), sent unchanged
+        history: Session history entries, oldest first
+        user_input: The visitor's message for this turn
+
+    Returns:
+        dict: Keyword arguments for messages.create / messages.stream
+    """
+    recent, _ = window_history(history, HEDGE_HISTORY_TOKENS)
+    messages = [{'role': m['role'], 'content': m['content']} for m in recent]
+    messages.append({'role': 'user', 'content': user_input})
+    return {
+        'model': HEDGE_MODEL,
+        'system': system,
+        'messages': messages,
+        'max_tokens': HEDGE_MAX_TOKENS,
+        'temperature': 0.7
+    }
+
+
+class _Attempt:
+    """One streamed request racing in a worker thread"""
+
+    def __init__(self, role: str, client, params: Dict[str, Any], events: queue.Queue):
+        self.role = role
+        self.client = client
+        self.params = params
+        self.events = events
+        self.cancelled = threading.Event()
+        # Set when a worker picks the attempt up, so pool queueing is not
+        # counted as first-token latency
+        self.started_at = None
+        self.first_token_at = None
+        self._stream = None
+
+    def run(self) -> None:
+        if self.cancelled.is_set():
+            return
+        self.started_at = time.monotonic()
+        self.events.put((self, STARTED, None))
+        try:
+            with stream_message(self.client, **self.params) as stream:
+                self._stream = stream
+                for text in stream.text_stream:
+                    if self.cancelled.is_set():
+                        return
+                    if self.first_token_at is None:
+                        self.first_token_at = time.monotonic()
+                    self.events.put((self, DELTA, text))
+                message = stream.get_final_message()
+            self.events.put((self, DONE, message))
+        except Exception as e:
+            if not self.cancelled.is_set():
+                self.events.put((self, ERROR, e))
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+        stream = self._stream
+        if stream is not None:
+            # Closing the response unblocks a worker waiting on the next chunk
+            try:
+                stream.close()
+            except Exception as e:
+                logger.debug(f"Error closing cancelled {self.role} stream: {str(e)}")
+
+
+class _Race:
+    """
+    Decides the outcome of one primary-vs-hedge race
+
+    The first attempt to reach commit_on (DELTA: its first token, DONE: its
+    full reply) wins and the others are cancelled. The thread and asyncio
+    runners feed it events and act on what it returns.
+    """
+
+    HEDGE = 'hedge'
+    EMIT = 'emit'
+    SKIP = 'skip'
+
+    def __init__(self, endpoint: str, fallback: Optional[Dict[str, Any]], commit_on: str):
+        self.endpoint = endpoint
+        self.fallback = fallback
+        self.commit_on = commit_on
+        self.attempts = []
+        self.winner = None
+        self.failed = 0
+        self.delay = hedge_delay() if fallback is not None else None
+        # Counted from when the primary starts running, set on its STARTED event
+        self.hedge_at = None
+
+    def hedge_unused(self) -> bool:
+        return self.winner is None and self.fallback is not None and len(self.attempts) == 1
+
+    def can_hedge(self) -> bool:
+        """Whether the primary is still waiting for its first token and may be hedged for slowness
+
+        A primary that has started answering is never hedged, even while
+        commit_on=DONE keeps the race open until its reply is complete.
+        """
+        return self.hedge_unused() and self.hedge_at is not None and self.attempts[0].first_token_at is None
+
+    def timeout(self) -> Optional[float]:
+        """Seconds until the hedge is due, or None to wait indefinitely (or until the primary starts)"""
+        if not self.can_hedge():
+            return None
+        return max(0.0, self.hedge_at - time.monotonic())
+
+    def hedging(self, reason: str) -> Dict[str, Any]:
+        """Record that the hedge is being launched and return its request"""
+        logger.info(f"{self.endpoint}: {reason}, hedging to {self.fallback['model']}")
+        metrics.increment('llm_hedged_requests_total', endpoint=self.endpoint)
+        return self.fallback
+
+    def handle(self, attempt, kind: str, payload) -> str:
+        """
+        Returns:
+            str: HEDGE to launch the fallback now, EMIT to pass the event on, SKIP to drop it
+
+        Raises:
+            Exception: The winner's error, or the last error once every attempt failed
+        """
+        if attempt.cancelled.is_set():
+            return self.SKIP
+
+        if kind == STARTED:
+            if attempt is self.attempts[0] and self.delay is not None:
+                self.hedge_at = attempt.started_at + self.delay
+            return self.SKIP
+
+        if kind == ERROR:
+            self.failed += 1
+            if attempt is self.winner:
+                raise payload
+            if self.hedge_unused():
+                # The primary failed outright: hedge now rather than at the deadline
+                return self.HEDGE
+            if self.failed == len(self.attempts):
+                raise payload
+            return self.SKIP
+
+        if self.winner is None and (kind == self.commit_on or kind == DONE):
+            self.winner = attempt
+            for other in self.attempts:
+                if other is not attempt:
+                    other.cancel()
+                    metrics.increment('llm_hedge_cancelled_total', endpoint=self.endpoint, role=other.role)
+            if attempt.role == 'hedge':
+                metrics.increment('llm_hedge_wins_total', endpoint=self.endpoint)
+
+        return self.EMIT if attempt is self.winner else self.SKIP
+
+    def finish(self) -> None:
+        """Record the primary's first-token latency and cancel anything still running"""
+        primary = self.attempts[0]
+        # A primary cancelled while still queued for a worker has nothing to measure
+        if primary.started_at is not None:
+            if primary.first_token_at is not None:
+                primary_first_token.record(primary.first_token_at - primary.started_at)
+            elif primary.cancelled.is_set():
+                # Lost before its first token: at least this slow
+                primary_first_token.record(time.monotonic() - primary.started_at)
+        # Also reached when the caller stops early, e.g. a browser disconnect
+        for attempt in self.attempts:
+            if attempt is not self.winner:
+                attempt.cancel()
+        metrics.increment('llm_hedge_eligible_requests_total', endpoint=self.endpoint)
+
+
+def _race(client, endpoint: str, primary: Dict[str, Any], fallback: Optional[Dict[str, Any]], commit_on: str):
+    """
+    Run the primary request in a worker thread, hedging to the fallback once it is slow
+
+    Only the winner's events are yielded, as (kind, payload) pairs ending with DONE.
+    """
+    events = queue.Queue()
+    race = _Race(endpoint, fallback, commit_on)
+
+    def launch(role, params):
+        attempt = _Attempt(role, client, params, events)
+        race.attempts.append(attempt)
+        _hedge_pool.submit(attempt.run)
+
+    launch('primary', primary)
+    try:
+        while True:
+            try:
+                attempt, kind, payload = events.get(timeout=race.timeout())
+            except queue.Empty:
+                # The first token may have landed just as the wait ran out
+                if race.can_hedge():
+                    launch('hedge', race.hedging(f"no first token after {race.hedge_at - race.attempts[0].started_at:.2f}s"))
+                continue
+
+            action = race.handle(attempt, kind, payload)
+            if action == _Race.HEDGE:
+                launch('hedge', race.hedging("primary failed"))
+            elif action == _Race.EMIT:
+                yield kind, payload
+                if kind == DONE:
+                    return
+    finally:
+        race.finish()
+
+
+def hedged_stream(client, endpoint: str, primary: Dict[str, Any], fallback: Optional[Dict[str, Any]] = None):
+    """
+    Stream a reply, hedging to a faster model when the primary is slow to start
+
+    Once one attempt has produced its first token the reply is committed to
+    it, since text has already gone to the browser.
+
+    Args:
+        client: Anthropic client
+        endpoint: Name used for metrics, e.g. 'chat'
+        primary: Keyword arguments for the primary messages.stream call
+        fallback: Trimmed request for the hedge model, or None to disable hedging
+
+    Yields:
+        str: Text chunks from the winning request
+    """
+    if not HEDGE_ENABLED:
+        fallback = None
+    for kind, payload in _race(client, endpoint, primary, fallback, commit_on=DELTA):
+        if kind == DELTA:
+            yield payload
+        else:
+            record_usage(endpoint, getattr(payload, 'usage', None))
+
+
+_flights = SingleFlight()
+
+
+def hedged_create(client, endpoint: str, primary: Dict[str, Any], fallback: Optional[Dict[str, Any]] = None):
+    """
+    Complete a reply, hedging to a faster model when the primary is slow to start
+
+    After the hedge fires, whichever request finishes first is returned.
+    Identical concurrent requests share one race, as in create_message.
+
+    Returns:
+        Message: The winning response
+    """
+    if not HEDGE_ENABLED:
+        fallback = None
+
+    def race():
+        for kind, payload in _race(client, endpoint, primary, fallback, commit_on=DONE):
+            if kind == DONE:
+                return payload
+
+    response, shared = _flights.do(request_key(primary), race)
+    if shared:
+        metrics.increment('llm_coalesced_requests_total', endpoint=endpoint)
+    else:
+        metrics.increment('llm_upstream_requests_total', endpoint=endpoint)
+        record_usage(endpoint, getattr(response, 'usage', None))
+    return response
+
+
+class _AsyncAttempt:
+    """One streamed request racing as a task on the event loop"""
+
+    def __init__(self, role: str, client, params: Dict[str, Any], events: asyncio.Queue):
+        self.role = role
+        self.client = client
+        self.params = params
+        self.events = events
+        self.cancelled = threading.Event()
+        self.started_at = None
+        self.first_token_at = None
+        self.task = asyncio.ensure_future(self.run())
+
+    async def run(self) -> None:
+        self.started_at = time.monotonic()
+        self.events.put_nowait((self, STARTED, None))
+        try:
+            async with async_stream_message(self.client, **self.params) as stream:
+                async for text in stream.text_stream:
+                    if self.first_token_at is None:
+                        self.first_token_at = time.monotonic()
+                    self.events.put_nowait((self, DELTA, text))
+                message = await stream.get_final_message()
+            self.events.put_nowait((self, DONE, message))
+        except Exception as e:
+            self.events.put_nowait((self, ERROR, e))
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+        self.task.cancel()
+
+
+async def async_hedged_stream(client, endpoint: str, primary: Dict[str, Any],
+                              fallback: Optional[Dict[str, Any]] = None):
+    """
+    hedged_stream for an AsyncAnthropic client, without holding a thread per request
+
+    Yields:
+        str: Text chunks from the winning request
+    """
+    if not HEDGE_ENABLED:
+        fallback = None
+    events = asyncio.Queue()
+    race = _Race(endpoint, fallback, DELTA)
+    race.attempts.append(_AsyncAttempt('primary', client, primary, events))
+    try:
+        while True:
+            try:
+                attempt, kind, payload = await asyncio.wait_for(events.get(), race.timeout())
+            except asyncio.TimeoutError:
+                if race.can_hedge():
+                    hedge = race.hedging(f"no first token after {race.hedge_at - race.attempts[0].started_at:.2f}s")
+                    race.attempts.append(_AsyncAttempt('hedge', client, hedge, events))
+                continue
+
+            action = race.handle(attempt, kind, payload)
+            if action == _Race.HEDGE:
+                race.attempts.append(_AsyncAttempt('hedge', client, race.hedging("primary failed"), events))
+            elif action == _Race.EMIT:
+                if kind == DONE:
+                    record_usage(endpoint, getattr(payload, 'usage', None))
+                    return
+                yield payload
+    finally:
+        race.finish()
+
+
+def get_hedging_stats() -> Dict[str, Dict[str, Any]]:
+    """Hedge and hedge-win rates per endpoint, plus the current hedge delay"""
+    stats = {}
+    for entry in metrics.get_counters('llm_hedge_eligible_requests_total'):
+        endpoint = entry['labels'].get('endpoint')
+        total = int(entry['value'])
+        hedged = int(metrics.get_counter('llm_hedged_requests_total', endpoint=endpoint))
+        wins = int(metrics.get_counter('llm_hedge_wins_total', endpoint=endpoint))
+        stats[endpoint] = {
+            'requests': total,
+            'hedged': hedged,
+            'hedge_wins': wins,
+            'hedge_rate': round(hedged / total, 3) if total else 0.0,
+            'hedge_win_rate': round(wins / hedged, 3) if hedged else 0.0
+        }
+    return {'delay_seconds': round(hedge_delay(), 2), 'endpoints': stats}
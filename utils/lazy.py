@@ -0,0 +1,56 @@
+# utils/lazy.py
+import threading
+from typing import Any, Callable
+
+
+class Lazy:
+    """
+    A value created on first use, exactly once, behind a lock
+
+    Used for network clients and heavy modules so a cold start only pays for
+    what the first request actually touches. The factory's result is kept even
+    when it is None (e.g. a database that could not be reached).
+    """
+
+    _UNSET = object()
+
+    def __init__(self, factory: Callable[[], Any]):
+        self._factory = factory
+        self._value = self._UNSET
+        self._lock = threading.Lock()
+
+    def get(self) -> Any:
+        value = self._value
+        if value is not self._UNSET:
+            return value
+        with self._lock:
+            if self._value is self._UNSET:
+                self._value = self._factory()
+            return self._value
+
+    @property
+    def initialized(self) -> bool:
+        return self._value is not self._UNSET
+
+
+class LazyProxy:
+    """
+    Stand-in for an object that is only created when it is first used
+
+    Attribute access resolves the target; item access returns another proxy,
+    so client['db']['collection'] stays lazy all the way down.
+    """
+
+    def __init__(self, factory: Callable[[], Any]):
+        object.__setattr__(self, '_lazy', Lazy(factory))
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._lazy.get(), name)
+
+    def __getitem__(self, key: Any) -> 'LazyProxy':
+        return LazyProxy(lambda: self._lazy.get()[key])
+
+    def __repr__(self) -> str:
+        if not self._lazy.initialized:
+            return '<LazyProxy (not created yet)>'
+        return f'<LazyProxy {self._lazy.get()!r}>'
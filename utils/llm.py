@@ -0,0 +1,320 @@
+# utils/llm.py
+import os
+import json
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from typing import Dict, List, Any, Callable, Tuple
+
+from utils import metrics
+from utils.resilience import CircuitBreaker, RetryBudget, call_with_retries, async_call_with_retries
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Prompt-caching breakpoint understood by the Messages API
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# Token counters recorded from response.usage for every Claude call
+USAGE_FIELDS = {
+    'input_tokens': 'llm_input_tokens_total',
+    'output_tokens': 'llm_output_tokens_total',
+    'cache_read_input_tokens': 'llm_cache_read_tokens_total',
+    'cache_creation_input_tokens': 'llm_cache_write_tokens_total',
+}
+
+
+def cached_system_prompt(static_text: str, dynamic_text: str = "") -> List[Dict[str, Any]]:
+    """
+    Build the system prompt as content blocks with a cache breakpoint after the static prefix
+
+    Args:
+        static_text: The shared persona prompt, identical for every visitor
+        dynamic_text: Per-request sections (photos, interests, social data)
+
+    Returns:
+        list: System content blocks for messages.create(system=...)
+    """
+    blocks = [{"type": "text", "text": static_text, "cache_control": CACHE_CONTROL}]
+    if dynamic_text and dynamic_text.strip():
+        blocks.append({"type": "text", "text": dynamic_text})
+    return blocks
+
+
+def with_history_breakpoint(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Mark the end of the conversation as a cache breakpoint
+
+    The next turn re-sends this exact prefix, so it is read from the cache
+    instead of being processed again. Single-message conversations are
+    returned unchanged since they are too short to be worth caching.
+
+    Args:
+        messages: Message dicts with string or block content
+
+    Returns:
+        list: A copy of the messages with cache_control on the last one
+    """
+    if len(messages) < 2:
+        return messages
+
+    last = messages[-1]
+    content = last["content"]
+    if isinstance(content, str):
+        blocks = [{"type": "text", "text": content}]
+    else:
+        blocks = [dict(block) for block in content]
+    blocks[-1]["cache_control"] = CACHE_CONTROL
+
+    return messages[:-1] + [{"role": last["role"], "content": blocks}]
+
+
+def record_usage(endpoint: str, usage) -> None:
+    """Record token usage (including cache reads/writes) for one Claude response"""
+    if usage is None:
+        return
+    metrics.increment('llm_requests_total', endpoint=endpoint)
+    for field, counter in USAGE_FIELDS.items():
+        metrics.increment(counter, getattr(usage, field, None) or 0, endpoint=endpoint)
+    logger.debug(
+        f"{endpoint} usage: input={usage.input_tokens} "
+        f"cache_read={getattr(usage, 'cache_read_input_tokens', None) or 0} "
+        f"cache_write={getattr(usage, 'cache_creation_input_tokens', None) or 0}"
+    )
+
+
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Prompt-cache hit rates per endpoint
+
+    hit_rate is the share of prompt tokens served from the cache.
+
+    Returns:
+        dict: Token totals and hit rate keyed by endpoint name
+    """
+    stats = {}
+    for entry in metrics.get_counters('llm_requests_total'):
+        endpoint = entry['labels'].get('endpoint')
+        totals = {
+            field: int(metrics.get_counter(counter, endpoint=endpoint))
+            for field, counter in USAGE_FIELDS.items()
+        }
+        prompt_tokens = (totals['input_tokens'] + totals['cache_read_input_tokens']
+                         + totals['cache_creation_input_tokens'])
+        stats[endpoint] = {
+            'requests': int(entry['value']),
+            **totals,
+            'hit_rate': round(totals['cache_read_input_tokens'] / prompt_tokens, 3) if prompt_tokens else 0.0
+        }
+    return stats
+
+
+# Shared by every Claude call in the process: fail fast while upstream is unhealthy
+anthropic_breaker = CircuitBreaker(
+    'anthropic',
+    failure_threshold=int(os.environ.get('LLM_BREAKER_FAILURES', 5)),
+    reset_timeout=float(os.environ.get('LLM_BREAKER_RESET_SECONDS', 30))
+)
+retry_budget = RetryBudget(ratio=float(os.environ.get('LLM_RETRY_BUDGET_RATIO', 0.2)))
+LLM_MAX_ATTEMPTS = int(os.environ.get('LLM_MAX_ATTEMPTS', 3))
+
+# Per-call timeout: time to first token plus generation at a conservative rate
+LLM_TIMEOUT_BASE_SECONDS = 10.0
+LLM_TIMEOUT_TOKENS_PER_SECOND = 40.0
+LLM_TIMEOUT_MAX_SECONDS = 120.0
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+def timeout_for(max_tokens) -> float:
+    """Seconds to allow a call that may generate up to max_tokens"""
+    seconds = LLM_TIMEOUT_BASE_SECONDS + (max_tokens or 1024) / LLM_TIMEOUT_TOKENS_PER_SECOND
+    return min(seconds, LLM_TIMEOUT_MAX_SECONDS)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Transient upstream failures: timeouts, dropped connections, overload and 5xx"""
+    # Only reached after a client has made a call, so anthropic is already loaded
+    import anthropic
+    if isinstance(error, anthropic.APIConnectionError):
+        return True
+    if isinstance(error, anthropic.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES or error.status_code >= 500
+    return False
+
+
+def _resilient_client(client, max_tokens):
+    # Retries are ours (budgeted, breaker-aware), so the SDK's own are turned off
+    return client.with_options(max_retries=0, timeout=timeout_for(max_tokens))
+
+
+def get_resilience_stats() -> Dict[str, Any]:
+    """Breaker and retry budget state for health checks"""
+    return {
+        'circuit': anthropic_breaker.snapshot(),
+        'retry_budget': retry_budget.snapshot()
+    }
+
+
+class SingleFlight:
+    """
+    Run one call per key at a time and share its outcome with concurrent callers
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is running wait for it and get the same result or
+    exception (a RuntimeError if the leader was interrupted). Nothing is kept
+    once the call finishes.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Returns:
+            tuple: (result, shared) where shared is True for callers that waited on a leader
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {'done': threading.Event(), 'result': None, 'error': None}
+                self._calls[key] = call
+
+        if not leader:
+            call['done'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result'], True
+
+        try:
+            call['result'] = fn()
+            return call['result'], False
+        except Exception as e:
+            call['error'] = e
+            raise
+        except BaseException as e:
+            # The leader itself was interrupted (GeneratorExit, KeyboardInterrupt):
+            # waiters get no result, so they must not see a successful None
+            call['error'] = RuntimeError(f"Shared call was interrupted ({type(e).__name__})")
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call['done'].set()
+
+
+_flights = SingleFlight()
+
+
+def request_key(params: Dict[str, Any]) -> str:
+    """Stable hash of a Messages API request payload"""
+    payload = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def create_message(client, endpoint: str, **params):
+    """
+    messages.create with identical concurrent requests coalesced into one call
+
+    Requests match when model, system prompt, messages and sampling params are
+    all equal. Usage is recorded once, for the upstream call. The upstream
+    call goes through the Anthropic circuit breaker, with budgeted retries
+    and a timeout sized to max_tokens.
+
+    Args:
+        client: Anthropic client
+        endpoint: Name used for metrics, e.g. 'chat'
+        **params: Keyword arguments for messages.create
+
+    Returns:
+        Message: The (possibly shared) API response
+    """
+    def call():
+        resilient = _resilient_client(client, params.get('max_tokens'))
+        return call_with_retries(lambda: resilient.messages.create(**params), anthropic_breaker,
+                                 retry_budget, is_retryable, max_attempts=LLM_MAX_ATTEMPTS)
+
+    response, shared = _flights.do(request_key(params), call)
+    if shared:
+        metrics.increment('llm_coalesced_requests_total', endpoint=endpoint)
+        logger.debug(f"{endpoint}: shared an in-flight identical request")
+    else:
+        metrics.increment('llm_upstream_requests_total', endpoint=endpoint)
+        record_usage(endpoint, getattr(response, 'usage', None))
+    return response
+
+
+@contextmanager
+def stream_message(client, **params):
+    """
+    messages.stream behind the circuit breaker
+
+    Opening the stream is retried like create_message; once tokens have
+    started to flow a failure is recorded against the breaker and re-raised.
+
+    Yields:
+        MessageStream: The open stream
+    """
+    resilient = _resilient_client(client, params.get('max_tokens'))
+
+    def open_stream():
+        manager = resilient.messages.stream(**params)
+        return manager, manager.__enter__()
+
+    manager, stream = call_with_retries(open_stream, anthropic_breaker, retry_budget,
+                                        is_retryable, max_attempts=LLM_MAX_ATTEMPTS)
+    try:
+        yield stream
+    except Exception as e:
+        if is_retryable(e):
+            anthropic_breaker.record_failure()
+        manager.__exit__(type(e), e, e.__traceback__)
+        raise
+    else:
+        manager.__exit__(None, None, None)
+
+
+@asynccontextmanager
+async def async_stream_message(client, **params):
+    """
+    stream_message for an AsyncAnthropic client
+
+    Yields:
+        AsyncMessageStream: The open stream
+    """
+    resilient = _resilient_client(client, params.get('max_tokens'))
+
+    async def open_stream():
+        manager = resilient.messages.stream(**params)
+        return manager, await manager.__aenter__()
+
+    manager, stream = await async_call_with_retries(open_stream, anthropic_breaker, retry_budget,
+                                                    is_retryable, max_attempts=LLM_MAX_ATTEMPTS)
+    try:
+        yield stream
+    except BaseException as e:
+        # Also closes the upstream request when the task is cancelled
+        if isinstance(e, Exception) and is_retryable(e):
+            anthropic_breaker.record_failure()
+        await manager.__aexit__(type(e), e, e.__traceback__)
+        raise
+    else:
+        await manager.__aexit__(None, None, None)
+
+
+def get_coalescing_stats() -> Dict[str, Dict[str, Any]]:
+    """Upstream vs coalesced request counts per endpoint"""
+    stats = {}
+    for entry in metrics.get_counters('llm_upstream_requests_total'):
+        endpoint = entry['labels'].get('endpoint')
+        coalesced = int(metrics.get_counter('llm_coalesced_requests_total', endpoint=endpoint))
+        total = int(entry['value']) + coalesced
+        stats[endpoint] = {
+            'upstream': int(entry['value']),
+            'coalesced': coalesced,
+            'coalesced_rate': round(coalesced / total, 3) if total else 0.0
+        }
+    return stats
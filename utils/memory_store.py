@@ -0,0 +1,1007 @@
+# utils/memory_store.py
+"""
+In-memory stand-in for the parts of MongoDB this app uses
+
+Used when Atlas is unreachable, so the site keeps working on process-local
+data, and as a fast store for benchmarks (MONGO_URI=memory://). It supports
+the pymongo calls made in utils/ and app.py:
+
+- queries: equality, $eq $ne $gt $gte $lt $lte $in $nin $exists $size
+  $elemMatch $regex $all $not $and $or $nor, dotted paths through arrays
+- updates: $set $setOnInsert $unset $inc $min $max $push $addToSet $pull
+  $currentDate, the positional `$`, upserts and replacements
+- aggregation: $match $unwind $group $project $addFields $sort $skip $limit
+  $count, with the expressions the analytics pipelines use
+- indexes: hash lookups on equality, unique constraints and TTL expiry
+
+Anything else raises NotImplementedError rather than silently misbehaving.
+"""
+import re
+import time
+import copy
+import logging
+import datetime
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteError
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# How often writes sweep out documents past a TTL index's expiry
+TTL_SWEEP_SECONDS = 60
+
+
+# Query matching
+
+def _resolve(value, parts: List[str]) -> List[Any]:
+    """Values at a dotted path, fanning out over arrays as MongoDB does"""
+    if not parts:
+        return [value]
+    if isinstance(value, dict):
+        return _resolve(value[parts[0]], parts[1:]) if parts[0] in value else []
+    if isinstance(value, list):
+        found = []
+        if parts[0].isdigit() and int(parts[0]) < len(value):
+            found.extend(_resolve(value[int(parts[0])], parts[1:]))
+        for item in value:
+            if isinstance(item, dict):
+                found.extend(_resolve(item, parts))
+        return found
+    return []
+
+
+def _expand(values: List[Any]) -> Iterable[Any]:
+    """Each value, plus the elements of array values"""
+    for value in values:
+        yield value
+        if isinstance(value, list):
+            yield from value
+
+
+def _is_operator(condition) -> bool:
+    return isinstance(condition, dict) and bool(condition) and all(k.startswith('$') for k in condition)
+
+
+def _equals(values: List[Any], target) -> bool:
+    if target is None:
+        # null matches missing fields too
+        return not values or any(v is None for v in _expand(values))
+    return any(v == target for v in _expand(values))
+
+
+def _compare(value, target, op: str) -> bool:
+    if value is None or isinstance(value, (dict, list)):
+        return False
+    try:
+        if op == '$gt':
+            return value > target
+        if op == '$gte':
+            return value >= target
+        if op == '$lt':
+            return value < target
+        return value <= target
+    except TypeError:
+        # Different BSON types never compare in a query
+        return False
+
+
+def _elem_matches(element, condition) -> bool:
+    if _is_operator(condition):
+        return _match_field([element], condition)
+    return isinstance(element, dict) and matches(element, condition)
+
+
+def _match_field(values: List[Any], condition) -> bool:
+    if not _is_operator(condition):
+        return _equals(values, condition)
+    for op, arg in condition.items():
+        if op == '$eq':
+            ok = _equals(values, arg)
+        elif op == '$ne':
+            ok = not _equals(values, arg)
+        elif op in ('$gt', '$gte', '$lt', '$lte'):
+            ok = any(_compare(v, arg, op) for v in _expand(values))
+        elif op == '$in':
+            ok = any(_equals(values, a) for a in arg)
+        elif op == '$nin':
+            ok = not any(_equals(values, a) for a in arg)
+        elif op == '$all':
+            ok = all(_equals(values, a) for a in arg)
+        elif op == '$exists':
+            ok = bool(values) == bool(arg)
+        elif op == '$size':
+            ok = any(isinstance(v, list) and len(v) == arg for v in values)
+        elif op == '$elemMatch':
+            ok = any(isinstance(v, list) and any(_elem_matches(e, arg) for e in v) for v in values)
+        elif op == '$not':
+            ok = not _match_field(values, arg)
+        elif op == '$regex':
+            pattern = re.compile(arg, _regex_flags(condition.get('$options', ''))) if isinstance(arg, str) else arg
+            ok = any(isinstance(v, str) and pattern.search(v) for v in _expand(values))
+        elif op == '$options':
+            ok = True
+        else:
+            raise NotImplementedError(f"Query operator {op} is not supported by the in-memory store")
+        if not ok:
+            return False
+    return True
+
+
+def _regex_flags(options: str) -> int:
+    flags = 0
+    for option, flag in (('i', re.IGNORECASE), ('m', re.MULTILINE), ('s', re.DOTALL), ('x', re.VERBOSE)):
+        if option in options:
+            flags |= flag
+    return flags
+
+
+def matches(document: Dict[str, Any], query: Optional[Dict[str, Any]]) -> bool:
+    """Whether a document satisfies a MongoDB query filter"""
+    for key, condition in (query or {}).items():
+        if key == '$and':
+            ok = all(matches(document, q) for q in condition)
+        elif key == '$or':
+            ok = any(matches(document, q) for q in condition)
+        elif key == '$nor':
+            ok = not any(matches(document, q) for q in condition)
+        elif key.startswith('$'):
+            raise NotImplementedError(f"Query operator {key} is not supported by the in-memory store")
+        else:
+            ok = _match_field(_resolve(document, key.split('.')), condition)
+        if not ok:
+            return False
+    return True
+
+
+# Paths and updates
+
+_MISSING = object()
+
+
+def _get_path(document, path: str, default=_MISSING):
+    current = document
+    for part in path.split('.'):
+        if isinstance(current, dict) and part in current:
+            current = current[part]
+        elif isinstance(current, list) and part.isdigit() and int(part) < len(current):
+            current = current[int(part)]
+        else:
+            return default
+    return current
+
+
+def _set_path(document, path: str, value) -> None:
+    parts = path.split('.')
+    current = document
+    for part in parts[:-1]:
+        if isinstance(current, list):
+            current = current[int(part)]
+        else:
+            current = current.setdefault(part, {})
+    if isinstance(current, list):
+        index = int(parts[-1])
+        current.extend([None] * (index + 1 - len(current)))
+        current[index] = value
+    else:
+        current[parts[-1]] = value
+
+
+def _unset_path(document, path: str) -> None:
+    parent_path, _, last = path.rpartition('.')
+    parent = _get_path(document, parent_path, None) if parent_path else document
+    if isinstance(parent, dict):
+        parent.pop(last, None)
+    elif isinstance(parent, list) and last.isdigit() and int(last) < len(parent):
+        parent[int(last)] = None
+
+
+def _positional_index(document, prefix: str, query: Dict[str, Any]) -> Optional[int]:
+    """Index of the first element of the array at prefix matched by the query"""
+    array = _get_path(document, prefix, None)
+    if not isinstance(array, list):
+        return None
+    conditions = [(key[len(prefix) + 1:], condition) for key, condition in query.items()
+                  if key == prefix or key.startswith(prefix + '.')]
+    if not conditions:
+        return None
+    for index, element in enumerate(array):
+        for subpath, condition in conditions:
+            if not subpath:
+                ok = (_elem_matches(element, condition['$elemMatch'])
+                      if isinstance(condition, dict) and '$elemMatch' in condition
+                      else _match_field([element], condition))
+            else:
+                ok = isinstance(element, dict) and _match_field(_resolve(element, subpath.split('.')), condition)
+            if not ok:
+                break
+        else:
+            return index
+    return None
+
+
+def _resolve_positional(document, path: str, query: Dict[str, Any]) -> str:
+    if '.$' not in path:
+        return path
+    prefix, rest = path.split('.$', 1)
+    index = _positional_index(document, prefix, query)
+    if index is None:
+        raise WriteError("The positional operator did not find the match needed from the query.", 2)
+    return f"{prefix}.{index}{rest}"
+
+
+def _array_at(document, path: str) -> list:
+    array = _get_path(document, path, None)
+    if array is None:
+        array = []
+        _set_path(document, path, array)
+    if not isinstance(array, list):
+        raise WriteError(f"Cannot apply array update to non-array field '{path}'", 2)
+    return array
+
+
+def _each(value) -> list:
+    return value['$each'] if isinstance(value, dict) and '$each' in value else [value]
+
+
+def _apply_update(document: Dict[str, Any], update: Dict[str, Any], query: Dict[str, Any],
+                  inserting: bool) -> Dict[str, Any]:
+    """Apply an update document in place, or return the replacement document"""
+    if not any(key.startswith('$') for key in update):
+        replacement = copy.deepcopy(update)
+        replacement['_id'] = document.get('_id', replacement.get('_id'))
+        return replacement
+    # The positional `$` refers to the element the query matched before any change
+    original = (copy.deepcopy(document) if any('.$' in path for fields in update.values() for path in fields)
+                else document)
+    for op, fields in update.items():
+        if op == '$setOnInsert' and not inserting:
+            continue
+        for path, value in fields.items():
+            path = _resolve_positional(original, path, query)
+            if op in ('$set', '$setOnInsert'):
+                _set_path(document, path, copy.deepcopy(value))
+            elif op == '$unset':
+                _unset_path(document, path)
+            elif op == '$inc':
+                _set_path(document, path, _get_path(document, path, 0) + value)
+            elif op in ('$min', '$max'):
+                current = _get_path(document, path, _MISSING)
+                if current is _MISSING or (value < current if op == '$min' else value > current):
+                    _set_path(document, path, copy.deepcopy(value))
+            elif op == '$push':
+                _array_at(document, path).extend(copy.deepcopy(_each(value)))
+            elif op == '$addToSet':
+                array = _array_at(document, path)
+                for item in _each(value):
+                    if item not in array:
+                        array.append(copy.deepcopy(item))
+            elif op == '$pull':
+                array = _array_at(document, path)
+                array[:] = [e for e in array
+                            if not (_elem_matches(e, value) if isinstance(value, dict) else e == value)]
+            elif op == '$currentDate':
+                _set_path(document, path, datetime.datetime.now())
+            else:
+                raise NotImplementedError(f"Update operator {op} is not supported by the in-memory store")
+    return document
+
+
+def _upsert_seed(query: Dict[str, Any]) -> Dict[str, Any]:
+    """The fields an upsert copies from its filter's equality conditions"""
+    seed = {}
+    for key, condition in query.items():
+        if key.startswith('$'):
+            continue
+        if _is_operator(condition):
+            if '$eq' in condition:
+                _set_path(seed, key, copy.deepcopy(condition['$eq']))
+        else:
+            _set_path(seed, key, copy.deepcopy(condition))
+    return seed
+
+
+# Sorting and projection
+
+def _sort_rank(value) -> Tuple:
+    """Sort key following MongoDB's ordering of BSON types"""
+    if value is None or value is _MISSING:
+        return (0,)
+    if isinstance(value, bool):
+        return (7, value)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    if isinstance(value, str):
+        return (2, value)
+    if isinstance(value, (dict, list)):
+        return (3 if isinstance(value, dict) else 4, repr(value))
+    if isinstance(value, ObjectId):
+        return (6, str(value))
+    if isinstance(value, datetime.datetime):
+        return (8, value.timestamp())
+    return (9, repr(value))
+
+
+def _sort(documents: List[Dict[str, Any]], keys: List[Tuple[str, int]]) -> List[Dict[str, Any]]:
+    # Stable sorts from the least significant key up
+    for field, direction in reversed(keys):
+        documents = sorted(documents, key=lambda d: _sort_rank(_get_path(d, field, None)), reverse=direction < 0)
+    return documents
+
+
+def _sort_spec(key_or_list, direction=None) -> List[Tuple[str, int]]:
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction or ASCENDING)]
+    if isinstance(key_or_list, dict):
+        return list(key_or_list.items())
+    return list(key_or_list)
+
+
+def _project(document: Dict[str, Any], projection) -> Dict[str, Any]:
+    """Apply a find() projection (top-level fields for inclusions)"""
+    if not projection:
+        return copy.deepcopy(document)
+    if isinstance(projection, (list, tuple)):
+        projection = {field: 1 for field in projection}
+    fields = {k: v for k, v in projection.items() if k != '_id'}
+    if fields and all(fields.values()):
+        result = {}
+        for field in fields:
+            top = field.split('.')[0]
+            if top in document:
+                result[top] = copy.deepcopy(document[top])
+    else:
+        result = copy.deepcopy(document)
+        for field in fields:
+            _unset_path(result, field)
+    if projection.get('_id', 1) and '_id' in document:
+        result = {'_id': document['_id'], **result}
+    else:
+        result.pop('_id', None)
+    return result
+
+
+# Aggregation
+
+def _field_value(document, path: str):
+    found = _resolve(document, path.split('.'))
+    if not found:
+        return None
+    return found[0] if len(found) == 1 else found
+
+
+def _evaluate(expression, document):
+    """Evaluate an aggregation expression against one document"""
+    if isinstance(expression, str) and expression.startswith('$'):
+        return _field_value(document, expression[1:])
+    if isinstance(expression, list):
+        return [_evaluate(e, document) for e in expression]
+    if not isinstance(expression, dict):
+        return expression
+    if not _is_operator(expression):
+        return {key: _evaluate(value, document) for key, value in expression.items()}
+
+    (op, arg), = expression.items()
+    if op == '$literal':
+        return arg
+    if op == '$dateFromParts':
+        parts = {key: _evaluate(value, document) for key, value in arg.items()}
+        return datetime.datetime(parts['year'], parts.get('month', 1), parts.get('day', 1),
+                                 parts.get('hour', 0), parts.get('minute', 0), parts.get('second', 0),
+                                 parts.get('millisecond', 0) * 1000)
+    if op in ('$year', '$month', '$dayOfMonth', '$hour', '$dayOfWeek'):
+        value = _evaluate(arg['date'] if isinstance(arg, dict) and 'date' in arg else arg, document)
+        if value is None:
+            return None
+        if op == '$dayOfWeek':
+            # Sunday is 1
+            return value.isoweekday() % 7 + 1
+        return getattr(value, {'$year': 'year', '$month': 'month', '$dayOfMonth': 'day', '$hour': 'hour'}[op])
+
+    args = [_evaluate(a, document) for a in (arg if isinstance(arg, list) else [arg])]
+    if op == '$size':
+        if not isinstance(args[0], list):
+            raise WriteError("The argument to $size must be an array", 17124)
+        return len(args[0])
+    if op == '$ifNull':
+        return next((a for a in args if a is not None), None)
+    if op == '$add':
+        return sum(args)
+    if op == '$subtract':
+        return args[0] - args[1]
+    if op == '$multiply':
+        result = 1
+        for a in args:
+            result *= a
+        return result
+    if op == '$divide':
+        return args[0] / args[1]
+    if op == '$concat':
+        return None if any(a is None for a in args) else ''.join(args)
+    if op == '$toLower':
+        return (args[0] or '').lower()
+    if op == '$toUpper':
+        return (args[0] or '').upper()
+    if op == '$cond':
+        condition, then, otherwise = (args if isinstance(arg, list) else
+                                      [_evaluate(arg[k], document) for k in ('if', 'then', 'else')])
+        return then if condition else otherwise
+    if op in ('$eq', '$ne', '$gt', '$gte', '$lt', '$lte'):
+        if op == '$eq':
+            return args[0] == args[1]
+        if op == '$ne':
+            return args[0] != args[1]
+        return _compare(args[0], args[1], op)
+    raise NotImplementedError(f"Expression operator {op} is not supported by the in-memory store")
+
+
+def _freeze(value):
+    """Hashable form of a group key or set member"""
+    if isinstance(value, dict):
+        return tuple((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return ('__list__',) + tuple(_freeze(v) for v in value)
+    return value
+
+
+def _group(documents, spec):
+    groups = OrderedDict()
+    accumulators = [(field, *next(iter(acc.items()))) for field, acc in spec.items() if field != '_id']
+    for document in documents:
+        key = _evaluate(spec['_id'], document)
+        group = groups.setdefault(_freeze(key), {'_id': key, 'values': {field: [] for field, _, _ in accumulators}})
+        for field, op, arg in accumulators:
+            group['values'][field].append(_evaluate(arg, document) if op != '$count' else 1)
+
+    results = []
+    for group in groups.values():
+        result = {'_id': group['_id']}
+        for field, op, _ in accumulators:
+            values = group['values'][field]
+            numbers = [v for v in values if isinstance(v, (int, float)) and not isinstance(v, bool)]
+            present = [v for v in values if v is not None]
+            if op in ('$sum', '$count'):
+                result[field] = sum(numbers)
+            elif op == '$avg':
+                result[field] = sum(numbers) / len(numbers) if numbers else None
+            elif op == '$min':
+                result[field] = min(present, key=_sort_rank) if present else None
+            elif op == '$max':
+                result[field] = max(present, key=_sort_rank) if present else None
+            elif op == '$first':
+                result[field] = values[0] if values else None
+            elif op == '$last':
+                result[field] = values[-1] if values else None
+            elif op == '$push':
+                result[field] = values
+            elif op == '$addToSet':
+                unique = OrderedDict()
+                for v in values:
+                    if v is not None:
+                        unique.setdefault(_freeze(v), v)
+                result[field] = list(unique.values())
+            else:
+                raise NotImplementedError(f"Accumulator {op} is not supported by the in-memory store")
+        results.append(result)
+    return results
+
+
+def _unwind(documents, spec):
+    if isinstance(spec, str):
+        spec = {'path': spec}
+    path = spec['path'].lstrip('$')
+    preserve = spec.get('preserveNullAndEmptyArrays', False)
+    index_field = spec.get('includeArrayIndex')
+    for document in documents:
+        value = _get_path(document, path, None)
+        if isinstance(value, list) and value:
+            for index, item in enumerate(value):
+                unwound = copy.deepcopy(document) if '.' in path else dict(document)
+                _set_path(unwound, path, item)
+                if index_field:
+                    unwound[index_field] = index
+                yield unwound
+        elif preserve or (value is not None and not isinstance(value, list)):
+            if index_field:
+                document = dict(document, **{index_field: None})
+            yield document
+
+
+def _project_stage(documents, spec, add_fields=False):
+    exclusions = [k for k, v in spec.items() if v in (0, False)]
+    inclusion_mode = not add_fields and any(k != '_id' for k in spec if k not in exclusions)
+    for document in documents:
+        if inclusion_mode:
+            result = {'_id': document['_id']} if '_id' in document and spec.get('_id', 1) else {}
+        else:
+            result = copy.deepcopy(document)
+        for key, value in spec.items():
+            if value in (0, False):
+                _unset_path(result, key)
+            elif value in (1, True):
+                if key != '_id':
+                    found = _get_path(document, key)
+                    if found is not _MISSING:
+                        _set_path(result, key, copy.deepcopy(found))
+            else:
+                _set_path(result, key, _evaluate(value, document))
+        yield result
+
+
+def run_pipeline(documents: Iterable[Dict[str, Any]], pipeline: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Run an aggregation pipeline over documents (which it may modify)"""
+    for stage in pipeline:
+        (name, spec), = stage.items()
+        if name == '$match':
+            documents = [d for d in documents if matches(d, spec)]
+        elif name == '$unwind':
+            documents = list(_unwind(documents, spec))
+        elif name == '$group':
+            documents = _group(documents, spec)
+        elif name == '$project':
+            documents = list(_project_stage(documents, spec))
+        elif name in ('$addFields', '$set'):
+            documents = list(_project_stage(documents, spec, add_fields=True))
+        elif name == '$sort':
+            documents = _sort(list(documents), _sort_spec(spec))
+        elif name == '$skip':
+            documents = list(documents)[spec:]
+        elif name == '$limit':
+            documents = list(documents)[:spec]
+        elif name == '$count':
+            documents = [{spec: len(list(documents))}]
+        else:
+            raise NotImplementedError(f"Pipeline stage {name} is not supported by the in-memory store")
+    return list(documents)
+
+
+# Collections
+
+class _HashIndex:
+    """Exact-match index: key tuple -> document ids"""
+
+    def __init__(self, name: str, fields: List[str], unique: bool, expire_after: Optional[float]):
+        self.name = name
+        self.fields = fields
+        self.unique = unique
+        self.expire_after = expire_after
+        self.entries: Dict[Tuple, set] = {}
+        # Documents whose key holds an array or sub-document are always scanned
+        self.unkeyed: set = set()
+
+    def key(self, document) -> Optional[Tuple]:
+        key = []
+        for field in self.fields:
+            found = _resolve(document, field.split('.'))
+            if len(found) > 1 or (found and isinstance(found[0], (list, dict))):
+                return None
+            key.append(found[0] if found else None)
+        return tuple(key)
+
+    def lookup_key(self, query: Dict[str, Any]) -> Optional[Tuple]:
+        """The key a query pins down by equality on every field, if it does"""
+        key = []
+        for field in self.fields:
+            if field not in query:
+                return None
+            condition = query[field]
+            if _is_operator(condition):
+                if set(condition) != {'$eq'}:
+                    return None
+                condition = condition['$eq']
+            if isinstance(condition, (list, dict)):
+                return None
+            key.append(condition)
+        return tuple(key)
+
+    def add(self, doc_id, document) -> None:
+        key = self.key(document)
+        if key is None:
+            self.unkeyed.add(doc_id)
+        else:
+            self.entries.setdefault(key, set()).add(doc_id)
+
+    def remove(self, doc_id, document) -> None:
+        key = self.key(document)
+        if key is None:
+            self.unkeyed.discard(doc_id)
+        elif key in self.entries:
+            self.entries[key].discard(doc_id)
+            if not self.entries[key]:
+                del self.entries[key]
+
+    def conflicts(self, doc_id, document) -> bool:
+        if not self.unique:
+            return False
+        key = self.key(document)
+        return key is not None and bool(self.entries.get(key, set()) - {doc_id})
+
+
+class MemoryCursor:
+    """The subset of pymongo's Cursor used here: sort, skip, limit and iteration"""
+
+    def __init__(self, documents: List[Dict[str, Any]], projection=None):
+        self._documents = documents
+        self._projection = projection
+        self._sort_keys: List[Tuple[str, int]] = []
+        self._skip = 0
+        self._limit = 0
+        self._iterator = None
+
+    def sort(self, key_or_list, direction=None) -> 'MemoryCursor':
+        self._sort_keys = _sort_spec(key_or_list, direction)
+        return self
+
+    def skip(self, count: int) -> 'MemoryCursor':
+        self._skip = count
+        return self
+
+    def limit(self, count: int) -> 'MemoryCursor':
+        self._limit = count
+        return self
+
+    def _results(self):
+        documents = _sort(self._documents, self._sort_keys) if self._sort_keys else self._documents
+        documents = documents[self._skip:]
+        if self._limit:
+            documents = documents[:self._limit]
+        return (_project(d, self._projection) for d in documents)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._iterator is None:
+            self._iterator = self._results()
+        return next(self._iterator)
+
+
+class MemoryCollection:
+    """A thread-safe, process-local collection with pymongo's method signatures"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._documents: Dict[Any, Dict[str, Any]] = OrderedDict()
+        self._indexes: Dict[str, _HashIndex] = {}
+        self._lock = threading.RLock()
+        self._swept_at = time.monotonic()
+
+    # Indexes
+
+    def create_index(self, keys, unique: bool = False, expireAfterSeconds: Optional[float] = None,
+                     name: Optional[str] = None, **kwargs) -> str:
+        fields = [keys] if isinstance(keys, str) else [k[0] if isinstance(k, (list, tuple)) else k for k in keys]
+        name = name or '_'.join(f"{field}_1" for field in fields)
+        with self._lock:
+            if name not in self._indexes:
+                index = _HashIndex(name, fields, unique, expireAfterSeconds)
+                for doc_id, document in self._documents.items():
+                    if index.conflicts(doc_id, document):
+                        raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: {name}",
+                                                11000)
+                    index.add(doc_id, document)
+                self._indexes[name] = index
+        return name
+
+    def index_information(self) -> Dict[str, Any]:
+        with self._lock:
+            info = {'_id_': {'key': [('_id', 1)]}}
+            for index in self._indexes.values():
+                info[index.name] = {'key': [(f, 1) for f in index.fields], 'unique': index.unique}
+                if index.expire_after is not None:
+                    info[index.name]['expireAfterSeconds'] = index.expire_after
+            return info
+
+    def _check_unique(self, doc_id, document) -> None:
+        for index in self._indexes.values():
+            if index.conflicts(doc_id, document):
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: {index.name}",
+                                        11000)
+
+    def _store(self, doc_id, document, previous=None) -> None:
+        for index in self._indexes.values():
+            if previous is not None:
+                index.remove(doc_id, previous)
+            index.add(doc_id, document)
+        self._documents[doc_id] = document
+
+    def _unstore(self, doc_id) -> None:
+        document = self._documents.pop(doc_id)
+        for index in self._indexes.values():
+            index.remove(doc_id, document)
+
+    def _candidates(self, query: Optional[Dict[str, Any]]) -> Iterable[Any]:
+        """Ids worth testing against the query, narrowed by an index when possible"""
+        if query and '_id' in query and not _is_operator(query['_id']):
+            return [query['_id']] if query['_id'] in self._documents else []
+        for index in self._indexes.values():
+            key = index.lookup_key(query or {})
+            if key is not None:
+                ids = index.entries.get(key, set()) | index.unkeyed
+                return [doc_id for doc_id in self._documents if doc_id in ids] if len(ids) > 1 else list(ids)
+        return list(self._documents)
+
+    def _matching(self, query: Optional[Dict[str, Any]], limit: int = 0) -> List[Any]:
+        found = []
+        for doc_id in self._candidates(query):
+            if matches(self._documents[doc_id], query):
+                found.append(doc_id)
+                if limit and len(found) >= limit:
+                    break
+        return found
+
+    def _expire(self) -> None:
+        """Drop documents past a TTL index's expiry, at most once per TTL_SWEEP_SECONDS"""
+        if time.monotonic() - self._swept_at < TTL_SWEEP_SECONDS:
+            return
+        self._swept_at = time.monotonic()
+        for index in self._indexes.values():
+            if index.expire_after is None:
+                continue
+            field = index.fields[0]
+            expired = []
+            for doc_id, document in self._documents.items():
+                value = _get_path(document, field, None)
+                if isinstance(value, datetime.datetime):
+                    now = datetime.datetime.now(value.tzinfo) if value.tzinfo else datetime.datetime.now()
+                    if (now - value).total_seconds() > index.expire_after:
+                        expired.append(doc_id)
+            for doc_id in expired:
+                self._unstore(doc_id)
+
+    # Reads
+
+    def find(self, filter: Optional[Dict[str, Any]] = None, projection=None, sort=None, skip: int = 0,
+             limit: int = 0) -> MemoryCursor:
+        with self._lock:
+            documents = [copy.deepcopy(self._documents[i]) for i in self._matching(filter)]
+        cursor = MemoryCursor(documents, projection).skip(skip).limit(limit)
+        return cursor.sort(sort) if sort else cursor
+
+    def find_one(self, filter: Optional[Dict[str, Any]] = None, projection=None, sort=None):
+        if sort:
+            return next(self.find(filter, projection, sort=sort, limit=1), None)
+        with self._lock:
+            found = self._matching(filter, limit=1)
+            return _project(self._documents[found[0]], projection) if found else None
+
+    def count_documents(self, filter: Dict[str, Any], skip: int = 0, limit: int = 0, **kwargs) -> int:
+        with self._lock:
+            count = max(0, len(self._matching(filter)) - skip)
+        return min(count, limit) if limit else count
+
+    def estimated_document_count(self, **kwargs) -> int:
+        return len(self._documents)
+
+    def distinct(self, key: str, filter: Optional[Dict[str, Any]] = None) -> List[Any]:
+        values = OrderedDict()
+        with self._lock:
+            for doc_id in self._matching(filter):
+                for value in _expand(_resolve(self._documents[doc_id], key.split('.'))):
+                    if not isinstance(value, list):
+                        values.setdefault(_freeze(value), value)
+        return list(values.values())
+
+    def aggregate(self, pipeline: List[Dict[str, Any]], **kwargs) -> Iterable[Dict[str, Any]]:
+        with self._lock:
+            documents = [copy.deepcopy(d) for d in self._documents.values()]
+        return iter(run_pipeline(documents, pipeline))
+
+    # Writes
+
+    def insert_one(self, document: Dict[str, Any], **kwargs) -> InsertOneResult:
+        # Like pymongo, the caller's document gets its _id
+        document.setdefault('_id', ObjectId())
+        stored = copy.deepcopy(document)
+        with self._lock:
+            self._expire()
+            if stored['_id'] in self._documents:
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: _id_", 11000)
+            self._check_unique(stored['_id'], stored)
+            self._store(stored['_id'], stored)
+        return InsertOneResult(stored['_id'], True)
+
+    def insert_many(self, documents: List[Dict[str, Any]], ordered: bool = True, **kwargs) -> InsertManyResult:
+        inserted, errors = [], []
+        for index, document in enumerate(documents):
+            try:
+                inserted.append(self.insert_one(document).inserted_id)
+            except DuplicateKeyError as e:
+                errors.append({'index': index, 'code': 11000, 'errmsg': str(e), 'op': document})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({'writeErrors': errors, 'writeConcernErrors': [], 'nInserted': len(inserted),
+                                  'nUpserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0, 'upserted': []})
+        return InsertManyResult(inserted, True)
+
+    def _update(self, filter: Dict[str, Any], update: Dict[str, Any], upsert: bool, multi: bool,
+                replace: bool = False) -> Tuple[int, int, Any, List[Any]]:
+        """Returns (matched, modified, upserted id, ids of the updated documents)"""
+        if replace == any(key.startswith('$') for key in update):
+            raise ValueError("replacement documents cannot contain update operators" if replace else
+                             "update only works with $ operators")
+        with self._lock:
+            self._expire()
+            found = self._matching(filter, limit=0 if multi else 1)
+            modified = 0
+            for doc_id in found:
+                previous = self._documents[doc_id]
+                document = _apply_update(copy.deepcopy(previous), update, filter, inserting=False)
+                if document != previous:
+                    self._check_unique(doc_id, document)
+                    self._store(doc_id, document, previous)
+                    modified += 1
+            if found or not upsert:
+                return len(found), modified, None, found
+
+            document = _apply_update(_upsert_seed(filter), update, filter, inserting=True)
+            document.setdefault('_id', ObjectId())
+            if document['_id'] in self._documents:
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} index: _id_", 11000)
+            self._check_unique(document['_id'], document)
+            self._store(document['_id'], document)
+            return 0, 0, document['_id'], [document['_id']]
+
+    @staticmethod
+    def _update_result(matched, modified, upserted_id) -> UpdateResult:
+        raw = {'n': matched + (1 if upserted_id is not None else 0), 'nModified': modified, 'ok': 1.0}
+        if upserted_id is not None:
+            raw['upserted'] = upserted_id
+        return UpdateResult(raw, True)
+
+    def update_one(self, filter: Dict[str, Any], update: Dict[str, Any], upsert: bool = False,
+                   **kwargs) -> UpdateResult:
+        return self._update_result(*self._update(filter, update, upsert, multi=False)[:3])
+
+    def update_many(self, filter: Dict[str, Any], update: Dict[str, Any], upsert: bool = False,
+                    **kwargs) -> UpdateResult:
+        return self._update_result(*self._update(filter, update, upsert, multi=True)[:3])
+
+    def replace_one(self, filter: Dict[str, Any], replacement: Dict[str, Any], upsert: bool = False,
+                    **kwargs) -> UpdateResult:
+        return self._update_result(*self._update(filter, replacement, upsert, multi=False, replace=True)[:3])
+
+    def find_one_and_update(self, filter: Dict[str, Any], update: Dict[str, Any], projection=None, sort=None,
+                            upsert: bool = False, return_document: bool = False, **kwargs):
+        with self._lock:
+            if sort:
+                first = self.find_one(filter, {'_id': 1}, sort=sort)
+                filter = {'_id': first['_id']} if first else filter
+            found = self._matching(filter, limit=1)
+            before = copy.deepcopy(self._documents[found[0]]) if found else None
+            _, _, _, ids = self._update(filter, update, upsert, multi=False)
+            # ReturnDocument.AFTER is True
+            if return_document:
+                return _project(self._documents[ids[0]], projection) if ids else None
+            return _project(before, projection) if before is not None else None
+
+    def delete_one(self, filter: Dict[str, Any], **kwargs) -> DeleteResult:
+        with self._lock:
+            found = self._matching(filter, limit=1)
+            for doc_id in found:
+                self._unstore(doc_id)
+        return DeleteResult({'n': len(found), 'ok': 1.0}, True)
+
+    def delete_many(self, filter: Dict[str, Any], **kwargs) -> DeleteResult:
+        with self._lock:
+            found = self._matching(filter)
+            for doc_id in found:
+                self._unstore(doc_id)
+        return DeleteResult({'n': len(found), 'ok': 1.0}, True)
+
+    def bulk_write(self, requests: List[Any], ordered: bool = True, **kwargs) -> BulkWriteResult:
+        """Apply pymongo InsertOne/UpdateOne/UpdateMany/ReplaceOne/DeleteOne/DeleteMany requests"""
+        totals = {'nInserted': 0, 'nUpserted': 0, 'nMatched': 0, 'nModified': 0, 'nRemoved': 0, 'upserted': []}
+        errors = []
+        for index, request in enumerate(requests):
+            kind = type(request).__name__
+            try:
+                if kind == 'InsertOne':
+                    self.insert_one(request._doc)
+                    totals['nInserted'] += 1
+                elif kind in ('UpdateOne', 'UpdateMany', 'ReplaceOne'):
+                    matched, modified, upserted_id, _ = self._update(
+                        request._filter, request._doc, request._upsert, multi=kind == 'UpdateMany',
+                        replace=kind == 'ReplaceOne')
+                    totals['nMatched'] += matched
+                    totals['nModified'] += modified
+                    if upserted_id is not None:
+                        totals['nUpserted'] += 1
+                        totals['upserted'].append({'index': index, '_id': upserted_id})
+                elif kind in ('DeleteOne', 'DeleteMany'):
+                    delete = self.delete_one if kind == 'DeleteOne' else self.delete_many
+                    totals['nRemoved'] += delete(request._filter).deleted_count
+                else:
+                    raise NotImplementedError(f"Bulk request {kind} is not supported by the in-memory store")
+            except (DuplicateKeyError, WriteError) as e:
+                errors.append({'index': index, 'code': e.code or 2, 'errmsg': str(e), 'op': repr(request)})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError(dict(totals, writeErrors=errors, writeConcernErrors=[]))
+        return BulkWriteResult(totals, True)
+
+    def drop(self) -> None:
+        with self._lock:
+            self._documents.clear()
+            self._indexes.clear()
+
+
+class MemoryDatabase:
+    """Collections by name, created on first access like pymongo's Database"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._collections: Dict[str, MemoryCollection] = {}
+        self._lock = threading.Lock()
+
+    def get_collection(self, name: str) -> MemoryCollection:
+        with self._lock:
+            if name not in self._collections:
+                self._collections[name] = MemoryCollection(name)
+            return self._collections[name]
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        return self.get_collection(name)
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self.get_collection(name)
+
+    def list_collection_names(self) -> List[str]:
+        with self._lock:
+            return list(self._collections)
+
+    def drop_collection(self, name: str) -> None:
+        with self._lock:
+            self._collections.pop(name, None)
+
+    def command(self, command, *args, **kwargs) -> Dict[str, Any]:
+        if command == 'ping':
+            return {'ok': 1.0}
+        raise NotImplementedError(f"Command {command} is not supported by the in-memory store")
+
+
+class MemoryClient:
+    """Databases by name; stands in for MongoClient"""
+
+    def __init__(self):
+        self._databases: Dict[str, MemoryDatabase] = {}
+        self._lock = threading.Lock()
+
+    def get_database(self, name: str) -> MemoryDatabase:
+        with self._lock:
+            if name not in self._databases:
+                self._databases[name] = MemoryDatabase(name)
+            return self._databases[name]
+
+    def __getitem__(self, name: str) -> MemoryDatabase:
+        return self.get_database(name)
+
+    def __getattr__(self, name: str) -> MemoryDatabase:
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self.get_database(name)
+
+    def list_database_names(self) -> List[str]:
+        with self._lock:
+            return list(self._databases)
+
+    def close(self) -> None:
+        pass
+
+
+# One store per process, shared by utils.db and the session interface
+_client = MemoryClient()
+
+
+def get_client() -> MemoryClient:
+    """The process-wide in-memory client"""
+    return _client
@@ -0,0 +1,146 @@
+# utils/metrics.py
+import time
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Any
+
+# Upper bounds in seconds for latency histograms; +Inf is implied
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Counter values keyed by (metric name, sorted label pairs)
+_counters = defaultdict(float)
+# Histograms keyed the same way: [per-bucket counts, sum, count]
+_histograms = {}
+_lock = threading.Lock()
+
+
+def _key(name: str, labels: Dict[str, Any]):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def increment(name: str, value: float = 1, **labels) -> None:
+    """Add to a named counter, e.g. increment('llm_requests_total', endpoint='chat')"""
+    if not value:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] += value
+
+
+def get_counter(name: str, **labels) -> float:
+    """Current value of a single counter (0 if it was never incremented)"""
+    with _lock:
+        return _counters.get(_key(name, labels), 0)
+
+
+def get_counters(name: str) -> List[Dict[str, Any]]:
+    """All label combinations recorded for a counter"""
+    with _lock:
+        items = [(labels, value) for (metric, labels), value in _counters.items() if metric == name]
+    return [{'labels': dict(labels), 'value': value} for labels, value in items]
+
+
+def observe(name: str, seconds: float, **labels) -> None:
+    """Record one duration in a histogram, e.g. observe('chat_stage_seconds', 0.2, stage='llm')"""
+    key = _key(name, labels)
+    index = bisect_left(DEFAULT_BUCKETS, seconds)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * (len(DEFAULT_BUCKETS) + 1), 0.0, 0]
+        histogram[0][index] += 1
+        histogram[1] += seconds
+        histogram[2] += 1
+
+
+@contextmanager
+def timer(name: str, **labels):
+    """Time the enclosed block into a histogram, whether or not it raises"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+class StageTimer:
+    """
+    Time one stage that other separately timed stages interrupt
+
+    The stage is observed once, by observe(), without the time spent inside
+    paused() blocks.
+    """
+
+    def __init__(self, name: str, **labels):
+        self.name = name
+        self.labels = labels
+        self.elapsed = 0.0
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def paused(self):
+        self.elapsed += time.perf_counter() - self._started
+        try:
+            yield
+        finally:
+            self._started = time.perf_counter()
+
+    def observe(self) -> None:
+        observe(self.name, self.elapsed + time.perf_counter() - self._started, **self.labels)
+
+
+def get_histograms(name: str) -> List[Dict[str, Any]]:
+    """All label combinations recorded for a histogram, with cumulative bucket counts"""
+    with _lock:
+        items = [(labels, list(h[0]), h[1], h[2]) for (metric, labels), h in _histograms.items() if metric == name]
+    results = []
+    for labels, counts, total, count in items:
+        cumulative, running = [], 0
+        for bound, bucket_count in zip(DEFAULT_BUCKETS + (float('inf'),), counts):
+            running += bucket_count
+            cumulative.append((bound, running))
+        results.append({'labels': dict(labels), 'buckets': cumulative, 'sum': total, 'count': count})
+    return results
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ''
+    pairs = []
+    for k, v in labels:
+        v = str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{k}="{v}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def render_prometheus() -> str:
+    """Every counter and histogram in the Prometheus text exposition format"""
+    with _lock:
+        counters = sorted(_counters.items())
+        histogram_names = sorted({metric for metric, _ in _histograms})
+
+    lines = []
+    current = None
+    for (name, labels), value in counters:
+        if name != current:
+            lines.append(f"# TYPE {name} counter")
+            current = name
+        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    for name in histogram_names:
+        lines.append(f"# TYPE {name} histogram")
+        for histogram in sorted(get_histograms(name), key=lambda h: sorted(h['labels'].items())):
+            labels = sorted(histogram['labels'].items())
+            for bound, count in histogram['buckets']:
+                lines.append(f"{name}_bucket{_format_labels(labels + [('le', _format_value(bound))])} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(histogram['sum'])}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,188 @@
+# utils/migrations.py
+"""
+Versioned MongoDB schema migrations
+
+Migrations are applied ahead of time from the command line, never on the
+request path:
+
+    python -m utils.migrations status
+    python -m utils.migrations apply
+
+Each applied migration is recorded in the schema_migrations collection. The
+app only reads the latest recorded version, once per process, and logs a
+warning if it is behind SCHEMA_VERSION.
+"""
+import sys
+import time
+import logging
+import argparse
+import datetime
+from typing import Callable, Dict, List, Any, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from utils import mongo
+from utils.lazy import Lazy
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_COLLECTION = 'schema_migrations'
+
+
+class Migration:
+    def __init__(self, version: int, name: str, apply: Callable):
+        self.version = version
+        self.name = name
+        self.apply = apply
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, name: str):
+    """Register fn(db) as the migration to schema `version`"""
+    def decorator(fn):
+        if any(m.version == version for m in MIGRATIONS):
+            raise ValueError(f"Duplicate migration version {version}")
+        MIGRATIONS.append(Migration(version, name, fn))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return fn
+    return decorator
+
+
+@migration(1, "Core indexes")
+def _core_indexes(db):
+    db.users.create_index("user_id", unique=True)
+    db.platform_tokens.create_index([("user_id", 1), ("platform", 1)], unique=True)
+    for name in ('youtube_data', 'spotify_data', 'reddit_data', 'discord_data'):
+        db[name].create_index("user_id", unique=True)
+    db.chat_interactions.create_index([("user_id", 1), ("timestamp", -1)])
+    # Rolling summaries are looked up by conversation
+    db.conversation_summaries.create_index("conversation_id", unique=True)
+
+
+@migration(2, "Retention TTL indexes")
+def _retention_indexes(db):
+    # Users inactive for more than 90 days
+    db.users.create_index("last_seen", expireAfterSeconds=90 * 24 * 60 * 60)
+    # Chat interactions older than 30 days
+    db.chat_interactions.create_index("timestamp", expireAfterSeconds=30 * 24 * 60 * 60)
+
+
+@migration(3, "Analytics indexes")
+def _analytics_indexes(db):
+    # Feedback counts on the dashboard filter chat_interactions by type and answer
+    db.chat_interactions.create_index([("type", 1), ("feedback", 1)])
+    # Platform and interest breakdowns match on these before unwinding
+    db.users.create_index("platforms")
+    db.users.create_index("interests.confidence")
+
+
+@migration(4, "Session lookup index")
+def _session_index(db):
+    # Flask-Session reads and upserts the sessions collection by id on every request
+    db.sessions.create_index("id")
+
+
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+def applied_version(db) -> int:
+    """Latest migration recorded in the database (0 if none)"""
+    latest = db[MIGRATIONS_COLLECTION].find_one({}, sort=[('_id', -1)], projection={'_id': 1})
+    return latest['_id'] if latest else 0
+
+
+def pending(db) -> List[Migration]:
+    current = applied_version(db)
+    return [m for m in MIGRATIONS if m.version > current]
+
+
+def apply_pending(db, target: Optional[int] = None) -> List[Migration]:
+    """
+    Apply migrations newer than the recorded version, in order
+
+    Index builds are idempotent, so a migration interrupted before it was
+    recorded is simply run again next time.
+
+    Args:
+        db: pymongo Database
+        target: Stop after this version (default: latest)
+
+    Returns:
+        list: The migrations that were applied
+    """
+    applied = []
+    for m in pending(db):
+        if target is not None and m.version > target:
+            break
+        logger.info(f"Applying migration {m.version}: {m.name}")
+        started = time.monotonic()
+        m.apply(db)
+        try:
+            db[MIGRATIONS_COLLECTION].insert_one({
+                '_id': m.version,
+                'name': m.name,
+                'applied_at': datetime.datetime.now(datetime.timezone.utc),
+                'duration_ms': int((time.monotonic() - started) * 1000)
+            })
+        except DuplicateKeyError:
+            logger.info(f"Migration {m.version} was recorded concurrently")
+        applied.append(m)
+    return applied
+
+
+def _check(db) -> Dict[str, Any]:
+    try:
+        current = applied_version(db)
+    except Exception as e:
+        logger.error(f"Could not read schema version: {str(e)}")
+        return {'applied_version': None, 'expected_version': SCHEMA_VERSION, 'up_to_date': False}
+    if current < SCHEMA_VERSION:
+        logger.warning(f"MongoDB schema is at version {current}, expected {SCHEMA_VERSION}; "
+                       f"run `python -m utils.migrations apply`")
+    return {'applied_version': current, 'expected_version': SCHEMA_VERSION,
+            'up_to_date': current >= SCHEMA_VERSION}
+
+
+# The startup check: one read of schema_migrations per process
+_status = Lazy(lambda: _check(mongo.get_database()))
+
+
+def check_schema() -> Dict[str, Any]:
+    """Compare the recorded version with SCHEMA_VERSION (cached after the first call)"""
+    return _status.get()
+
+
+def get_schema_status() -> Optional[Dict[str, Any]]:
+    """The cached startup check, or None if the database has not been opened yet"""
+    return _status.get() if _status.initialized else None
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="MongoDB schema migrations")
+    parser.add_argument('command', choices=['status', 'apply'])
+    parser.add_argument('--to', type=int, default=None, help="apply up to this version")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    db = mongo.get_database()
+    if db is None:
+        logger.error("MongoDB is unavailable; check MONGO_URI")
+        return 1
+
+    if args.command == 'status':
+        current = applied_version(db)
+        print(f"Schema version {current} of {SCHEMA_VERSION}")
+        for m in MIGRATIONS:
+            print(f"  [{'x' if m.version <= current else ' '}] {m.version}: {m.name}")
+        return 0
+
+    applied = apply_pending(db, args.to)
+    print(f"Applied {len(applied)} migration(s); schema version is now {applied_version(db)}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
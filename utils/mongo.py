@@ -0,0 +1,98 @@
+# utils/mongo.py
+import os
+import logging
+from typing import Any, Dict, Optional
+
+from pymongo import MongoClient
+from pymongo.server_api import ServerApi
+
+from utils import memory_store
+from utils.env import load_environment
+from utils.lazy import Lazy
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+load_environment()
+
+MONGO_URI = os.environ.get('MONGO_URI')
+DATABASE_NAME = os.environ.get('MONGO_DATABASE', 'aboutBrooks')
+
+# Pool settings shared by everything in the process. A Vercel function serves
+# one request at a time, so the pool can stay small.
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 20))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 0))
+# Close connections idle this long, so frozen serverless instances do not hold them
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', 60000))
+# How long a request waits for a free pooled connection before failing
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 2000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000))
+
+
+def client_options() -> Dict[str, Any]:
+    """Keyword arguments for MongoClient with the process-wide pool settings"""
+    return {
+        'server_api': ServerApi('1'),
+        'maxPoolSize': MONGO_MAX_POOL_SIZE,
+        'minPoolSize': MONGO_MIN_POOL_SIZE,
+        'maxIdleTimeMS': MONGO_MAX_IDLE_TIME_MS,
+        'waitQueueTimeoutMS': MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        'serverSelectionTimeoutMS': MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        'appname': 'aboutBrooks',
+    }
+
+
+def _connect() -> Optional[MongoClient]:
+    if MONGO_URI and MONGO_URI.startswith('memory://'):
+        # Benchmarks and local runs without Atlas; data lives as long as the process
+        logger.warning("MONGO_URI is memory://; using the in-memory store")
+        return memory_store.get_client()
+    if not MONGO_URI:
+        logger.error("MONGO_URI is not set; MongoDB is unavailable")
+        return None
+    client = None
+    try:
+        client = MongoClient(MONGO_URI, **client_options())
+        # Check connection by pinging the deployment
+        client.admin.command('ping')
+        logger.info("Successfully connected to MongoDB Atlas")
+        return client
+    except Exception as e:
+        logger.error(f"Could not connect to MongoDB Atlas: {str(e)}")
+        if client is not None:
+            # Stop its monitor threads; nothing will use it
+            client.close()
+        return None
+
+
+# The one client (and connection pool) for the whole process, created on first use
+_client = Lazy(_connect)
+
+
+def get_client() -> Optional[MongoClient]:
+    """The shared MongoDB client (a MemoryClient for memory://), or None if Atlas could not be reached"""
+    return _client.get()
+
+
+def get_database(name: str = DATABASE_NAME):
+    """Database handle on the shared client, or None if Atlas is unreachable"""
+    client = get_client()
+    return client[name] if client is not None else None
+
+
+def get_collection(name: str, database: str = DATABASE_NAME):
+    """Collection handle on the shared client, or None if Atlas is unreachable"""
+    db = get_database(database)
+    return db[name] if db is not None else None
+
+
+def ping() -> bool:
+    """Whether the shared client can reach the deployment right now"""
+    client = get_client()
+    if client is None:
+        return False
+    try:
+        client.admin.command('ping')
+        return True
+    except Exception:
+        return False
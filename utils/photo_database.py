@@ -1,8 +1,16 @@
 # Photo database with descriptions and metadata
 # Generated on 2025-03-09 22:00:30
 
+import os
 import urllib.parse
 
+from utils.s3_utils import s3_image_url
+from utils.photo_index import PhotoIndex
+from utils.photo_vectors import get_photo_vectors, warm_photo_vectors
+
+# "semantic" ranks photos by TF-IDF similarity (needs NumPy); default is BM25
+SEARCH_MODE = os.environ.get('PHOTO_SEARCH_MODE', 'bm25').lower()
+
 
 def url_encode_dict_keys(photos_list):
     """URL encode the id and filename keys in each photo dictionary"""
@@ -13,6 +21,15 @@ def url_encode_dict_keys(photos_list):
     return photos_list
 
 
+def build_photo_urls(photos_list, bucket_name=None):
+    """Map each (URL encoded) filename to its public S3 URL; empty without a bucket"""
+    bucket_name = bucket_name or os.environ.get('AWS_S3_BUCKET')
+    if not bucket_name:
+        return {}
+    return {photo["filename"]: s3_image_url(bucket_name, f"images/{photo['filename']}")
+            for photo in photos_list}
+
+
 PHOTOS = [
     {
         "id": "Blueman Group",
@@ -460,48 +477,11 @@ def search_photos(query, limit=3):
     Returns:
         list: Matching photo objects
     """
-    query = query.lower()
-    results = []
-
-    # Break the query into individual words for better matching
-    query_terms = query.split()
-
-    # Score each photo based on how well it matches the query
-    scored_photos = []
-    for photo in PHOTOS:
-        score = 0
-
-        # Check description
-        desc_lower = photo["description"].lower()
-        for term in query_terms:
-            if term in desc_lower:
-                score += 3  # Higher weight for description matches
-
-        # Check title
-        title_lower = photo["title"].lower()
-        for term in query_terms:
-            if term in title_lower:
-                score += 5  # Highest weight for title matches
-
-        # Check tags
-        for tag in photo["tags"]:
-            for term in query_terms:
-                if term in tag.lower():
-                    score += 2  # Medium weight for tag matches
-
-        # Check category
-        if any(term in photo["category"].lower() for term in query_terms):
-            score += 4  # High weight for category matches
-
-        # Add to results if there's any match
-        if score > 0:
-            scored_photos.append((score, photo))
-
-    # Sort by score (highest first) and take top results
-    scored_photos.sort(reverse=True, key=lambda x: x[0])
-    results = [photo for score, photo in scored_photos[:limit]]
-
-    return results
+    if SEARCH_MODE == 'semantic':
+        vectors = get_photo_vectors(PHOTOS)
+        if vectors is not None:
+            return vectors.search(query, limit)
+    return PHOTO_INDEX.search(query, limit)
 
 
 def get_photos_by_category(category, limit=3):
@@ -517,3 +497,14 @@ def get_all_categories():
 
 # Apply URL encoding to all photo IDs and filenames
 PHOTOS = url_encode_dict_keys(PHOTOS)
+
+# BM25 inverted index used by search_photos, built once at import
+PHOTO_INDEX = PhotoIndex(PHOTOS)
+
+# Public S3 URL of every photo, computed once so chat turns do no S3 work
+PHOTO_URLS = build_photo_urls(PHOTOS)
+
+# Semantic search vectors load (or build) in the background from startup;
+# searches use BM25 until they are ready
+if SEARCH_MODE == 'semantic':
+    warm_photo_vectors(PHOTOS)
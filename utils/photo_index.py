@@ -0,0 +1,122 @@
+# utils/photo_index.py
+import math
+import re
+from collections import defaultdict, Counter
+from typing import Dict, List, Any, Tuple
+
+# Field weights, in the same order of importance as the original substring scan
+FIELD_WEIGHTS = {
+    'title': 5.0,
+    'category': 4.0,
+    'description': 3.0,
+    'tags': 2.0,
+}
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Query terms that only occur inside longer words ("fish" in "sailfish") still
+# match, at this fraction of an exact match
+PARTIAL_MATCH_WEIGHT = 0.5
+MIN_PARTIAL_LENGTH = 3
+
+STOPWORDS = frozenset("""
+a about after all also am an and any are as at be been but by can could did do does
+for from had has have he her him his how i if in into is it its just me my no not of
+on or our she so some than that the their them then there these they this to too up
+us was we were what when where which who why will with would you your
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_MAX_CACHED_EXPANSIONS = 2048
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stopwords removed"""
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+def _field_text(photo: Dict[str, Any], field: str) -> str:
+    if field == 'tags':
+        return " ".join(photo.get('tags', []))
+    return photo.get(field, "") or ""
+
+
+class PhotoIndex:
+    """
+    Inverted index over photo title, category, description and tags
+
+    Documents are scored with BM25F: per-field term frequencies are
+    length-normalised, weighted by FIELD_WEIGHTS and combined before the
+    BM25 saturation curve is applied.
+    """
+
+    def __init__(self, photos: List[Dict[str, Any]]):
+        self.photos = photos
+        self.postings: Dict[str, Dict[int, Dict[str, int]]] = defaultdict(dict)
+        field_lengths = {field: [] for field in FIELD_WEIGHTS}
+
+        for doc_id, photo in enumerate(photos):
+            for field in FIELD_WEIGHTS:
+                tokens = tokenize(_field_text(photo, field))
+                field_lengths[field].append(len(tokens))
+                for term, count in Counter(tokens).items():
+                    self.postings[term].setdefault(doc_id, {})[field] = count
+
+        self.postings = dict(self.postings)
+        self.field_lengths = field_lengths
+        self.avg_field_length = {
+            field: (sum(lengths) / len(lengths)) if lengths and sum(lengths) else 1.0
+            for field, lengths in field_lengths.items()
+        }
+        count = len(photos)
+        self.idf = {
+            term: math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+        self._expansions: Dict[str, List[Tuple[str, float]]] = {}
+
+    def _expand(self, term: str) -> List[Tuple[str, float]]:
+        """Index terms matched by a query term, with the weight of each match"""
+        cached = self._expansions.get(term)
+        if cached is not None:
+            return cached
+
+        matches = [(term, 1.0)] if term in self.postings else []
+        if len(term) >= MIN_PARTIAL_LENGTH:
+            matches.extend((indexed, PARTIAL_MATCH_WEIGHT) for indexed in self.postings
+                           if indexed != term and term in indexed)
+
+        if len(self._expansions) >= _MAX_CACHED_EXPANSIONS:
+            self._expansions.clear()
+        self._expansions[term] = matches
+        return matches
+
+    def _term_score(self, term: str, doc_id: int, fields: Dict[str, int]) -> float:
+        weighted_tf = 0.0
+        for field, count in fields.items():
+            norm = 1 - B + B * self.field_lengths[field][doc_id] / self.avg_field_length[field]
+            weighted_tf += FIELD_WEIGHTS[field] * count / norm
+        return self.idf[term] * weighted_tf * (K1 + 1) / (weighted_tf + K1)
+
+    def search(self, query: str, limit: int = 3) -> List[Dict[str, Any]]:
+        """
+        Rank photos against a free-text query
+
+        Args:
+            query: The search query
+            limit: Maximum number of results to return
+
+        Returns:
+            list: Matching photo objects, best first
+        """
+        scores: Dict[int, float] = defaultdict(float)
+        for query_term in set(tokenize(query)):
+            for term, weight in self._expand(query_term):
+                for doc_id, fields in self.postings[term].items():
+                    scores[doc_id] += weight * self._term_score(term, doc_id, fields)
+
+        # Ties keep catalogue order
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [self.photos[doc_id] for doc_id, _ in ranked[:limit]]
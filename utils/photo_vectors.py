@@ -0,0 +1,211 @@
+# utils/photo_vectors.py
+"""
+Optional TF-IDF retrieval for the photo catalogue
+
+Photos are embedded as hashed character n-gram TF-IDF vectors, so a query
+for "fishing" still lands on "Sailfish". The matrix is saved to
+PHOTO_VECTORS_DIR (utils/ locally, the temp directory on serverless, where the
+source tree is read-only) and memory-mapped by a background thread started
+when utils/photo_database.py loads; it is rebuilt whenever the catalogue
+changes. Until it is ready, and without NumPy, search falls back to BM25.
+
+Build the saved matrix ahead of time (e.g. at deploy) with: python -m utils.photo_vectors
+"""
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+import zlib
+from collections import Counter
+from typing import Dict, List, Any, Optional
+
+from utils.photo_index import tokenize
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Hashed feature space; large enough that n-gram collisions are rare
+VECTOR_DIMS = 2048
+NGRAM_SIZES = (3, 4, 5)
+
+# Cosine similarity below which a photo is not considered a match
+MIN_SIMILARITY = 0.15
+
+_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+_SERVERLESS = os.environ.get('VERCEL') == '1' or os.environ.get('SERVERLESS') == '1'
+VECTORS_DIR = os.environ.get('PHOTO_VECTORS_DIR') or (
+    os.path.join(tempfile.gettempdir(), 'about-brooks') if _SERVERLESS else _BASE_DIR)
+VECTORS_FILE = os.path.join(VECTORS_DIR, 'photo_vectors.npy')
+META_FILE = os.path.join(VECTORS_DIR, 'photo_vectors.json')
+
+_vectors = None
+# Catalogue whose vectors are loading (or failed to load) in the background
+_warming = None
+_vectors_lock = threading.Lock()
+
+
+def _features(text: str) -> Counter:
+    """Hashed word and character n-gram counts"""
+    counts = Counter()
+    for word in tokenize(text):
+        counts[zlib.crc32(word.encode()) % VECTOR_DIMS] += 1
+        padded = f" {word} "
+        for size in NGRAM_SIZES:
+            for start in range(len(padded) - size + 1):
+                counts[zlib.crc32(padded[start:start + size].encode()) % VECTOR_DIMS] += 1
+    return counts
+
+
+def photo_text(photo: Dict[str, Any]) -> str:
+    return " ".join([photo.get('title', ''), photo.get('description', ''),
+                     " ".join(photo.get('tags', [])), photo.get('category', '')])
+
+
+def catalogue_fingerprint(photos: List[Dict[str, Any]]) -> str:
+    """Changes whenever the searchable text of any photo (or the feature setup) changes"""
+    payload = json.dumps([VECTOR_DIMS, NGRAM_SIZES, [photo_text(photo) for photo in photos]])
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def _vectorize(counts: Counter, idf):
+    vector = np.zeros(VECTOR_DIMS, dtype=np.float32)
+    for feature, count in counts.items():
+        vector[feature] = 1.0 + np.log(count)
+    vector *= idf
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def build_vectors(photos: List[Dict[str, Any]]):
+    """
+    Compute the L2-normalised TF-IDF matrix for a catalogue
+
+    Returns:
+        tuple: (matrix of shape (photos, VECTOR_DIMS), idf vector)
+    """
+    doc_features = [_features(photo_text(photo)) for photo in photos]
+    doc_freq = np.zeros(VECTOR_DIMS, dtype=np.float32)
+    for counts in doc_features:
+        doc_freq[list(counts)] += 1
+    idf = (np.log((1 + len(photos)) / (1 + doc_freq)) + 1).astype(np.float32)
+
+    matrix = np.zeros((len(photos), VECTOR_DIMS), dtype=np.float32)
+    for row, counts in enumerate(doc_features):
+        matrix[row] = _vectorize(counts, idf)
+    return matrix, idf
+
+
+def save_vectors(photos: List[Dict[str, Any]], matrix, idf) -> None:
+    os.makedirs(VECTORS_DIR, exist_ok=True)
+    np.save(VECTORS_FILE, matrix)
+    with open(META_FILE, 'w') as f:
+        json.dump({'fingerprint': catalogue_fingerprint(photos), 'idf': idf.tolist()}, f)
+
+
+class PhotoVectors:
+    """Cosine-similarity search over a precomputed TF-IDF matrix"""
+
+    def __init__(self, photos: List[Dict[str, Any]], matrix, idf):
+        self.photos = photos
+        self.matrix = matrix
+        self.idf = idf
+
+    def search(self, query: str, limit: int = 3) -> List[Dict[str, Any]]:
+        """
+        Rank photos by similarity to a free-text query
+
+        Args:
+            query: The search query
+            limit: Maximum number of results to return
+
+        Returns:
+            list: Matching photo objects, best first
+        """
+        counts = _features(query)
+        if not counts or limit <= 0 or not len(self.photos):
+            return []
+        scores = self.matrix @ _vectorize(counts, self.idf)
+
+        limit = min(limit, len(scores))
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [self.photos[i] for i in top if scores[i] >= MIN_SIMILARITY]
+
+
+def _load(photos: List[Dict[str, Any]]) -> PhotoVectors:
+    fingerprint = catalogue_fingerprint(photos)
+    try:
+        with open(META_FILE) as f:
+            meta = json.load(f)
+        if meta.get('fingerprint') == fingerprint:
+            matrix = np.load(VECTORS_FILE, mmap_mode='r')
+            if matrix.shape == (len(photos), VECTOR_DIMS):
+                return PhotoVectors(photos, matrix, np.asarray(meta['idf'], dtype=np.float32))
+    except (OSError, ValueError, KeyError):
+        pass
+
+    logger.info(f"Building photo vectors for {len(photos)} photos")
+    matrix, idf = build_vectors(photos)
+    try:
+        save_vectors(photos, matrix, idf)
+    except OSError as e:
+        # Read-only deployments keep the in-memory copy
+        logger.warning(f"Could not save photo vectors: {str(e)}")
+    return PhotoVectors(photos, matrix, idf)
+
+
+def _warm(photos: List[Dict[str, Any]]) -> None:
+    global _vectors
+    try:
+        vectors = _load(photos)
+    except Exception as e:
+        # Left marked as warming, so search stays on BM25 instead of retrying
+        logger.error(f"Error loading photo vectors: {str(e)}")
+        return
+    with _vectors_lock:
+        _vectors = vectors
+
+
+def warm_photo_vectors(photos: List[Dict[str, Any]]) -> None:
+    """Load (or build and save) the catalogue's vector index on a background thread"""
+    global _warming
+    if np is None:
+        return
+    with _vectors_lock:
+        if _warming is photos or (_vectors is not None and _vectors.photos is photos):
+            return
+        _warming = photos
+    threading.Thread(target=_warm, args=(photos,), name='photo-vectors', daemon=True).start()
+
+
+def get_photo_vectors(photos: List[Dict[str, Any]]) -> Optional[PhotoVectors]:
+    """
+    The vector index for the catalogue, if it is ready
+
+    Never builds on the caller's thread: a catalogue nobody warmed starts
+    warming now and this call returns None.
+
+    Returns:
+        PhotoVectors or None while loading, or when NumPy is not installed
+    """
+    vectors = _vectors
+    if vectors is not None and vectors.photos is photos:
+        return vectors
+    warm_photo_vectors(photos)
+    return None
+
+
+if __name__ == '__main__':
+    if np is None:
+        raise SystemExit("NumPy is required to build photo vectors: pip install numpy")
+    from utils.photo_database import PHOTOS
+    matrix, idf = build_vectors(PHOTOS)
+    save_vectors(PHOTOS, matrix, idf)
+    print(f"Saved {matrix.shape[0]} photo vectors to {VECTORS_FILE}")
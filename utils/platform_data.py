@@ -7,7 +7,7 @@ from typing import Dict, List, Any, Optional, Union
 # Import database functions
 from utils.db import (
     youtube_data, spotify_data, reddit_data, discord_data,
-    add_user_interest, get_platform_token
+    add_user_interests, get_platform_token
 )
 
 # Set up logging
@@ -56,20 +56,12 @@ def process_youtube_data(user_id: str, api_data: Dict[str, Any]) -> bool:
             'raw_data_sample': str(api_data)[:1000] if api_data else None  # Store sample for debugging
         }
         
-        # Insert or update
-        existing = youtube_data.find_one({'user_id': user_id})
-        if existing:
-            youtube_data.update_one(
-                {'_id': existing['_id']},
-                {'$set': youtube_doc}
-            )
-        else:
-            youtube_data.insert_one(youtube_doc)
+        # Insert or update in one round trip
+        youtube_data.update_one({'user_id': user_id}, {'$set': youtube_doc}, upsert=True)
         
         # Add interests to user profile
-        for interest in interests:
-            confidence = 0.7  # Medium-high confidence
-            add_user_interest(user_id, interest, 'youtube', confidence)
+        confidence = 0.7  # Medium-high confidence
+        add_user_interests(user_id, interests, 'youtube', confidence)
         
         logger.info(f"Processed YouTube data for user {user_id[:8]} - Found {len(interests)} interests")
         return True
@@ -149,20 +141,12 @@ def process_spotify_data(user_id: str, api_data: Dict[str, Any]) -> bool:
             'raw_data_sample': str(api_data)[:1000] if api_data else None  # Store sample for debugging
         }
         
-        # Insert or update
-        existing = spotify_data.find_one({'user_id': user_id})
-        if existing:
-            spotify_data.update_one(
-                {'_id': existing['_id']},
-                {'$set': spotify_doc}
-            )
-        else:
-            spotify_data.insert_one(spotify_doc)
+        # Insert or update in one round trip
+        spotify_data.update_one({'user_id': user_id}, {'$set': spotify_doc}, upsert=True)
         
         # Add interests to user profile
-        for interest in music_interests:
-            confidence = 0.8  # High confidence from music tastes
-            add_user_interest(user_id, interest, 'spotify', confidence)
+        confidence = 0.8  # High confidence from music tastes
+        add_user_interests(user_id, music_interests, 'spotify', confidence)
         
         logger.info(f"Processed Spotify data for user {user_id[:8]} - Found {len(music_interests)} interests")
         return True
@@ -242,20 +226,12 @@ def process_reddit_data(user_id: str, api_data: Dict[str, Any]) -> bool:
             'raw_data_sample': str(api_data)[:1000] if api_data else None  # Store sample for debugging
         }
         
-        # Insert or update
-        existing = reddit_data.find_one({'user_id': user_id})
-        if existing:
-            reddit_data.update_one(
-                {'_id': existing['_id']},
-                {'$set': reddit_doc}
-            )
-        else:
-            reddit_data.insert_one(reddit_doc)
+        # Insert or update in one round trip
+        reddit_data.update_one({'user_id': user_id}, {'$set': reddit_doc}, upsert=True)
         
         # Add interests to user profile
-        for interest in reddit_interests:
-            confidence = 0.9  # Very high confidence from Reddit subscriptions
-            add_user_interest(user_id, interest, 'reddit', confidence)
+        confidence = 0.9  # Very high confidence from Reddit subscriptions
+        add_user_interests(user_id, reddit_interests, 'reddit', confidence)
         
         logger.info(f"Processed Reddit data for user {user_id[:8]} - Found {len(reddit_interests)} interests")
         return True
@@ -326,20 +302,12 @@ def process_discord_data(user_id: str, api_data: Dict[str, Any]) -> bool:
             'raw_data_sample': str(api_data)[:1000] if api_data else None  # Store sample for debugging
         }
         
-        # Insert or update
-        existing = discord_data.find_one({'user_id': user_id})
-        if existing:
-            discord_data.update_one(
-                {'_id': existing['_id']},
-                {'$set': discord_doc}
-            )
-        else:
-            discord_data.insert_one(discord_doc)
+        # Insert or update in one round trip
+        discord_data.update_one({'user_id': user_id}, {'$set': discord_doc}, upsert=True)
         
         # Add interests to user profile
-        for interest in discord_interests:
-            confidence = 0.75  # High confidence from Discord communities
-            add_user_interest(user_id, interest, 'discord', confidence)
+        confidence = 0.75  # High confidence from Discord communities
+        add_user_interests(user_id, discord_interests, 'discord', confidence)
         
         logger.info(f"Processed Discord data for user {user_id[:8]} - Found {len(discord_interests)} interests")
         return True
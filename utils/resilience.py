@@ -0,0 +1,200 @@
+# utils/resilience.py
+import time
+import asyncio
+import random
+import logging
+import threading
+from typing import Dict, Any
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Stop calling a dependency after repeated failures
+
+    The breaker opens after failure_threshold consecutive failures. While open,
+    allow_request() returns False until reset_timeout seconds have passed; then
+    one trial call is let through (half open). A success closes the breaker,
+    a failure opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow_request(self) -> bool:
+        """Whether a call may be made right now"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+            # Half open: only one trial call at a time
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"Circuit '{self.name}' closed")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def release_trial(self) -> None:
+        """End a call that neither succeeded nor failed, e.g. one cancelled by a lost hedge race"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(f"Circuit '{self.name}' opened after {self._failures} failures")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current state for health and admin endpoints"""
+        state = self.state
+        with self._lock:
+            retry_in = 0.0
+            if state == self.OPEN:
+                retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+            return {
+                'state': state,
+                'consecutive_failures': self._failures,
+                'retry_in_seconds': round(retry_in, 1)
+            }
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose breaker is open"""
+
+
+class RetryBudget:
+    """
+    Cap retries at a fraction of recent traffic, shared by all callers
+
+    Every first attempt deposits `ratio` tokens (up to `max_tokens`); every
+    retry spends one. When upstream is failing for everyone, retries dry up
+    instead of multiplying the load.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_tokens: float = 3.0, max_tokens: float = 20.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = min_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'available_retries': round(self._tokens, 2), 'ratio': self.ratio}
+
+
+def call_with_retries(fn, breaker: CircuitBreaker, budget: RetryBudget, is_retryable,
+                      max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0):
+    """
+    Call fn() behind a circuit breaker with jittered exponential backoff
+
+    Only errors for which is_retryable(error) is True count against the
+    breaker and are retried, and each retry must be paid for from the budget.
+
+    Raises:
+        CircuitOpenError: If the breaker is open
+        Exception: The last error from fn()
+    """
+    budget.deposit()
+    attempt = 0
+    while True:
+        if not breaker.allow_request():
+            raise CircuitOpenError(f"Circuit '{breaker.name}' is open")
+        try:
+            result = fn()
+        except Exception as e:
+            if not is_retryable(e):
+                # The dependency answered; the request itself was bad
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            attempt += 1
+            if attempt >= max_attempts or not budget.withdraw():
+                raise
+            # Full jitter keeps retrying clients from synchronising
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            logger.warning(f"Retrying {breaker.name} call in {delay:.2f}s after: {str(e)}")
+            time.sleep(delay)
+            continue
+        except BaseException:
+            # Interrupted, not answered: free a half-open trial without judging the dependency
+            breaker.release_trial()
+            raise
+        breaker.record_success()
+        return result
+
+
+async def async_call_with_retries(fn, breaker: CircuitBreaker, budget: RetryBudget, is_retryable,
+                                  max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0):
+    """call_with_retries for a coroutine function; backoff sleeps without holding a thread"""
+    budget.deposit()
+    attempt = 0
+    while True:
+        if not breaker.allow_request():
+            raise CircuitOpenError(f"Circuit '{breaker.name}' is open")
+        try:
+            result = await fn()
+        except Exception as e:
+            if not is_retryable(e):
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            attempt += 1
+            if attempt >= max_attempts or not budget.withdraw():
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            logger.warning(f"Retrying {breaker.name} call in {delay:.2f}s after: {str(e)}")
+            await asyncio.sleep(delay)
+            continue
+        except BaseException:
+            # Cancelled (a hedge that lost its race): free a half-open trial without judging the dependency
+            breaker.release_trial()
+            raise
+        breaker.record_success()
+        return result
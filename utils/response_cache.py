@@ -0,0 +1,175 @@
+# utils/response_cache.py
+import os
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+from utils import metrics
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() != 'false'
+RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 6 * 60 * 60))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 500))
+# Jaccard overlap of question words needed to reuse the answer to a differently worded question
+RESPONSE_CACHE_SIMILARITY = float(os.environ.get('RESPONSE_CACHE_SIMILARITY', 0.8))
+# Shorter questions only ever match exactly
+MIN_SIMILAR_WORDS = 2
+
+# Words that never change what a question asks. Unlike search stopwords this
+# keeps interrogatives and pronouns: "Who is he?" and "Where is he?" differ
+# only in them
+_FILLER_WORDS = frozenset({"a", "an", "the", "please"})
+# The only words a reworded question may add or drop and still share an answer
+_PHRASING_WORDS = frozenset({
+    "can", "could", "would", "you", "tell", "me", "about", "so", "just", "really", "hey", "hi", "hello",
+})
+# Questions with any of these, or with a number, only ever match exactly: the
+# words around them decide the answer ("likes fishing" vs "not likes fishing")
+_NEGATIONS = frozenset({
+    "not", "no", "never", "nor", "none", "nothing", "dont", "doesnt", "didnt", "isnt", "arent",
+    "wasnt", "werent", "wont", "cant", "cannot", "hasnt", "havent", "hadnt", "shouldnt", "wouldnt",
+})
+
+_CONTRACTIONS = {
+    "what's": "what is", "who's": "who is", "where's": "where is", "how's": "how is",
+    "he's": "he is", "it's": "it is", "whats": "what is", "hes": "he is",
+}
+_PUNCTUATION_RE = re.compile(r"[^\w\s']")
+
+
+def normalize_question(text: str) -> str:
+    """Lowercase, expand common contractions and drop punctuation and extra spaces"""
+    words = _PUNCTUATION_RE.sub(" ", text.lower()).split()
+    return " ".join(_CONTRACTIONS.get(word, word) for word in words).replace("'", "")
+
+
+def question_words(normalized: str) -> frozenset:
+    """The words of a normalized question that similarity is judged on"""
+    return frozenset(word for word in normalized.split() if word not in _FILLER_WORDS)
+
+
+def _exact_only(words: frozenset) -> bool:
+    return any(word in _NEGATIONS or any(char.isdigit() for char in word) for word in words)
+
+
+def _comparable(words: frozenset, other: frozenset) -> bool:
+    """
+    Whether two questions may share an answer at all
+
+    Too-short questions and questions with negations or numbers never match
+    fuzzily, and the words that differ must all be phrasing: "Who is he?" and
+    "Where is he?", or "... in 2019" and "... in 2020", do not match.
+    """
+    if len(words) < MIN_SIMILAR_WORDS or len(other) < MIN_SIMILAR_WORDS:
+        return False
+    if _exact_only(words) or _exact_only(other):
+        return False
+    return all(word in _PHRASING_WORDS for word in words ^ other)
+
+
+class ResponseCache:
+    """
+    TTL + LRU cache of answers to opening questions
+
+    Entries are keyed by prompt version and normalized question. A lookup that
+    misses the exact key falls back to the most similar cached question for
+    the same prompt version, by word overlap between questions that differ
+    only in phrasing words.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, ttl: int = RESPONSE_CACHE_TTL,
+                 similarity: float = RESPONSE_CACHE_SIMILARITY):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _expired(self, entry: Dict[str, Any], now: float) -> bool:
+        return now - entry['created_at'] > self.ttl
+
+    def get(self, question: str, version: str) -> Optional[str]:
+        """
+        Cached answer for a question under a prompt version
+
+        Args:
+            question: The visitor's first message
+            version: Hash of everything else that shapes the answer
+
+        Returns:
+            str or None: The cached response text
+        """
+        normalized = normalize_question(question)
+        now = time.time()
+        with self._lock:
+            key = (version, normalized)
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                del self._entries[key]
+                entry = None
+            match = 'exact'
+
+            if entry is None and self.similarity < 1:
+                words = question_words(normalized)
+                best, best_score = None, 0.0
+                for (entry_version, _), candidate in self._entries.items():
+                    if entry_version != version or not _comparable(words, candidate['words']):
+                        continue
+                    score = len(words & candidate['words']) / len(words | candidate['words'])
+                    if score > best_score and not self._expired(candidate, now):
+                        best, best_score = candidate, score
+                if best is not None and best_score >= self.similarity:
+                    entry, match = best, 'similar'
+
+            if entry is None:
+                metrics.increment('response_cache_requests_total', result='miss')
+                return None
+            self._entries.move_to_end(entry['key'])
+
+        metrics.increment('response_cache_requests_total', result=f'hit_{match}')
+        return entry['response']
+
+    def put(self, question: str, version: str, response: str) -> None:
+        normalized = normalize_question(question)
+        key = (version, normalized)
+        with self._lock:
+            self._entries[key] = {
+                'key': key,
+                'response': response,
+                'words': question_words(normalized),
+                'created_at': time.time()
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def record_bypass(reason: str) -> None:
+    """Count a first turn that skipped the cache, e.g. because it is personalized"""
+    metrics.increment('response_cache_requests_total', result=f'bypass_{reason}')
+
+
+# Shared cache for first-turn /chat answers
+first_turn_cache = ResponseCache()
+
+
+def get_response_cache_stats() -> Dict[str, Any]:
+    """Hit rate of the first-turn cache; bypassed turns are not counted as lookups"""
+    counts = {entry['labels']['result']: int(entry['value'])
+              for entry in metrics.get_counters('response_cache_requests_total')}
+    hits = counts.get('hit_exact', 0) + counts.get('hit_similar', 0)
+    lookups = hits + counts.get('miss', 0)
+    return {
+        'enabled': RESPONSE_CACHE_ENABLED,
+        'entries': len(first_turn_cache),
+        'counts': counts,
+        'hit_rate': round(hits / lookups, 3) if lookups else 0.0
+    }
@@ -1,30 +1,115 @@
 import os
-import boto3
-from botocore.exceptions import NoCredentialsError, ClientError
+import time
+import threading
 import logging
 
+from utils.resilience import CircuitBreaker
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# boto3 clients are thread-safe, so one is shared by the whole process. boto3
+# itself is only imported when the first client is created (it is slow to import).
+_s3_client = None
+_s3_client_lock = threading.Lock()
+
+# Seconds between background reachability checks of the photo bucket
+S3_PROBE_INTERVAL = float(os.environ.get('S3_PROBE_INTERVAL', 60))
+
+# Opens after repeated probe failures so a dead bucket is not hammered
+s3_breaker = CircuitBreaker('s3', failure_threshold=3, reset_timeout=S3_PROBE_INTERVAL * 5)
+
+# Last probe result, read by request handlers without any network I/O
+_s3_status = {'bucket': None, 'available': False, 'checked_at': None, 'error': None}
+_s3_probe_thread = None
+_s3_probe_lock = threading.Lock()
+
 def get_s3_client():
     """
-    Create and return an S3 client using environment variables.
+    Return the shared S3 client, creating it from environment variables on first use.
     
     Returns:
         boto3.client: The S3 client or None if creation fails
     """
+    global _s3_client
+    if _s3_client is not None:
+        return _s3_client
+    with _s3_client_lock:
+        if _s3_client is None:
+            try:
+                import boto3
+                _s3_client = boto3.client(
+                    's3',
+                    aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
+                    aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY'),
+                    region_name=os.environ.get('AWS_REGION', 'us-east-1')
+                )
+            except Exception as e:
+                logger.error(f"Error creating S3 client: {str(e)}")
+                return None
+        return _s3_client
+
+def probe_s3(bucket_name):
+    """
+    Check that the bucket is reachable and record the result.
+    
+    Args:
+        bucket_name (str): S3 bucket name
+        
+    Returns:
+        bool: True if the bucket answered
+    """
+    if not s3_breaker.allow_request():
+        return False
     try:
-        s3_client = boto3.client(
-            's3',
-            aws_access_key_id=os.environ.get('AWS_ACCESS_KEY_ID'),
-            aws_secret_access_key=os.environ.get('AWS_SECRET_ACCESS_KEY'),
-            region_name=os.environ.get('AWS_REGION', 'us-east-1')
-        )
-        return s3_client
+        s3_client = get_s3_client()
+        if not s3_client:
+            raise RuntimeError("S3 client unavailable")
+        s3_client.list_objects_v2(Bucket=bucket_name, MaxKeys=1)
+        s3_breaker.record_success()
+        _s3_status.update(bucket=bucket_name, available=True, checked_at=time.time(), error=None)
+        return True
     except Exception as e:
-        logger.error(f"Error creating S3 client: {str(e)}")
-        return None
+        s3_breaker.record_failure()
+        _s3_status.update(bucket=bucket_name, available=False, checked_at=time.time(), error=str(e))
+        logger.warning(f"S3 probe failed for {bucket_name}: {str(e)}")
+        return False
+
+def _probe_loop(bucket_name):
+    while True:
+        probe_s3(bucket_name)
+        time.sleep(S3_PROBE_INTERVAL)
+
+def is_s3_available(bucket_name):
+    """
+    Cached reachability of the bucket; never touches the network.
+    
+    The first call starts a background probe thread, so the bucket reads as
+    unavailable until that probe has succeeded once.
+    
+    Args:
+        bucket_name (str): S3 bucket name
+        
+    Returns:
+        bool: True if the last probe of this bucket succeeded
+    """
+    global _s3_probe_thread
+    if not bucket_name:
+        return False
+    if _s3_probe_thread is None:
+        with _s3_probe_lock:
+            if _s3_probe_thread is None:
+                _s3_probe_thread = threading.Thread(
+                    target=_probe_loop, args=(bucket_name,), name='s3-probe', daemon=True)
+                _s3_probe_thread.start()
+    if s3_breaker.state == CircuitBreaker.OPEN:
+        return False
+    return _s3_status['available'] and _s3_status['bucket'] == bucket_name
+
+def get_s3_status():
+    """Last probe result and breaker state, for health endpoints"""
+    return {**_s3_status, 'breaker': s3_breaker.snapshot()}
 
 def s3_image_url(bucket_name, image_key):
     """
@@ -63,6 +148,8 @@ def upload_file_to_s3(file_path, bucket_name, object_name=None, make_public=Fals
     if not s3_client:
         return False
     
+    from botocore.exceptions import NoCredentialsError, ClientError
+
     try:
         # For ACL-disabled buckets, don't use ACL parameter
         extra_args = {
@@ -132,6 +219,8 @@ def list_bucket_contents(bucket_name, prefix=""):
     if not s3_client:
         return None
     
+    from botocore.exceptions import ClientError
+
     try:
         # List objects in the bucket
         response = s3_client.list_objects_v2(Bucket=bucket_name, Prefix=prefix)
@@ -0,0 +1,144 @@
+# utils/write_behind.py
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+from collections import defaultdict
+from typing import Any, Dict
+
+from pymongo import InsertOne
+
+from utils import metrics
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Queue and batching limits, overridable from the environment
+WRITE_QUEUE_SIZE = int(os.environ.get('WRITE_QUEUE_SIZE', 5000))
+WRITE_BATCH_SIZE = int(os.environ.get('WRITE_BATCH_SIZE', 200))
+WRITE_FLUSH_INTERVAL = float(os.environ.get('WRITE_FLUSH_INTERVAL', 1.0))
+# How long a request may wait for room in a full queue before the write is dropped
+WRITE_ENQUEUE_TIMEOUT = float(os.environ.get('WRITE_ENQUEUE_TIMEOUT', 0.25))
+# Upper bound on the final drain at interpreter exit
+WRITE_DRAIN_TIMEOUT = float(os.environ.get('WRITE_DRAIN_TIMEOUT', 10.0))
+
+
+class WriteBehindQueue:
+    """
+    Bounded queue of MongoDB writes flushed in batches by a background thread
+
+    Writes are pymongo request objects (InsertOne, UpdateOne, ...) grouped by
+    collection. The flusher sends them with insert_many when a batch is all
+    inserts and bulk_write otherwise, whenever WRITE_BATCH_SIZE operations are
+    waiting or WRITE_FLUSH_INTERVAL has passed. A full queue blocks callers for
+    up to WRITE_ENQUEUE_TIMEOUT and then drops the write.
+    """
+
+    def __init__(self, name: str, maxsize: int = WRITE_QUEUE_SIZE,
+                 batch_size: int = WRITE_BATCH_SIZE, flush_interval: float = WRITE_FLUSH_INTERVAL):
+        self.name = name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._stopping = threading.Event()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f'write-behind-{self.name}', daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    def insert(self, collection, document: Dict[str, Any]) -> bool:
+        """Queue an insert of one document"""
+        return self.enqueue(collection, InsertOne(document), document)
+
+    def enqueue(self, collection, operation, document=None) -> bool:
+        """
+        Queue one write for the background flusher
+
+        Args:
+            collection: Target pymongo collection
+            operation: A pymongo write request, e.g. UpdateOne(filter, update)
+            document: The inserted document when operation is an InsertOne
+
+        Returns:
+            bool: False if the queue stayed full and the write was dropped
+        """
+        if self._stopping.is_set():
+            self._write(collection, [(operation, document)])
+            return True
+        self._ensure_started()
+        try:
+            self._queue.put((collection, operation, document), timeout=WRITE_ENQUEUE_TIMEOUT)
+        except queue.Full:
+            metrics.increment('write_behind_dropped_total', queue=self.name)
+            logger.error(f"Write-behind queue '{self.name}' full; dropped write to {getattr(collection, 'name', collection)}")
+            return False
+        metrics.increment('write_behind_enqueued_total', queue=self.name)
+        return True
+
+    def _take_batch(self):
+        """Wait for the first write, then collect more until the batch is full or the interval passes"""
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0 or self._stopping.is_set():
+                timeout = 0
+            try:
+                batch.append(self._queue.get(timeout=timeout) if timeout else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, collection, operations) -> None:
+        try:
+            with metrics.timer('write_behind_flush_seconds', queue=self.name):
+                if all(document is not None for _, document in operations):
+                    collection.insert_many([document for _, document in operations], ordered=False)
+                else:
+                    collection.bulk_write([operation for operation, _ in operations], ordered=False)
+            metrics.increment('write_behind_flushed_total', len(operations), queue=self.name)
+        except Exception as e:
+            metrics.increment('write_behind_errors_total', len(operations), queue=self.name)
+            logger.error(f"Write-behind flush to {getattr(collection, 'name', collection)} failed: {str(e)}")
+
+    def _flush(self, batch) -> None:
+        by_collection: Dict[Any, list] = defaultdict(list)
+        collections = {}
+        for collection, operation, document in batch:
+            collections[id(collection)] = collection
+            by_collection[id(collection)].append((operation, document))
+        for key, operations in by_collection.items():
+            self._write(collections[key], operations)
+        for _ in batch:
+            self._queue.task_done()
+
+    def _run(self) -> None:
+        while not (self._stopping.is_set() and self._queue.empty()):
+            batch = self._take_batch()
+            if batch:
+                self._flush(batch)
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def close(self, timeout: float = WRITE_DRAIN_TIMEOUT) -> None:
+        """Stop accepting queued writes and flush what is left"""
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self.pending():
+            logger.warning(f"Write-behind queue '{self.name}' closed with {self.pending()} unflushed writes")